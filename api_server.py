@@ -0,0 +1,468 @@
+"""
+Headless HTTP/JSON server in front of one AttendanceService, for thin kiosk clients.
+
+    python -m checkmein serve --port 8765 [--batch-rows 64 --batch-ms 20]
+
+One process holds the data in memory for every kiosk on campus. Requests are
+handled on a single asyncio event loop (stdlib only):
+
+  - reads (classes, history, stats, trend data) are answered straight from
+    the in-memory service, concurrently with everything else;
+  - mutations (marking, bulk marking, picking up other writers' changes) go
+    through one queue and are applied in arrival order on one writer
+    thread, so they never interleave, and lock waits on other kiosks or a
+    full reload never hold up the loop;
+  - slow work (writing workbooks, drawing charts) is collected on the loop
+    and finished in a thread pool, so check-ins keep flowing meanwhile.
+
+With --pipeline, /api/mark answers as soon as the check-in is queued and
+cached, and a CheckinPipeline writer thread writes check-ins in batches
+(see checkin_pipeline.py).
+
+Endpoints (JSON in and out; send the login token as "Authorization: Bearer <token>"):
+
+    POST /api/login          {"username", "password"}  -> {"token", "role"}
+    POST /api/logout
+    GET  /api/classes                                   -> {"classes": {name: lecturer}}
+    POST /api/mark           {"class_name", "status"?, "student"?}
+    POST /api/mark_bulk      {"class_name", "statuses": {student: status}, "date"?}
+    GET  /api/roster?class=NAME                         -> {"students": [...], "marks": {student: status}} (today)
+    GET  /api/attendance?date=YYYY-MM-DD                -> {"attendance": {class: {student: status}}}
+    GET  /api/history?student=NAME                      -> {"history": [records]}
+    GET  /api/stats?class=NAME                          -> {"stats": {status: count}}
+    GET  /api/trend?class=NAME&days=14                  -> {"dates": [...], "rates": [...]}
+    GET  /api/trend.png?class=NAME&days=14              -> PNG
+    GET  /api/export/class?name=NAME                    -> .xlsx (or .csv) file
+    GET  /api/export/student?name=NAME                  -> .xlsx (or .csv) file
+    GET  /api/health                                    -> {"ok": true}
+    GET  /api/diagnostics                               -> instrumentation.snapshot() (admin)
+                                                           and "pipeline": CheckinPipeline.stats(),
+                                                           "query_cache": AttendanceService.memo_stats()
+
+Students may only mark and read their own attendance; lecturers and admins
+may act on any student. Every JSON reply has "ok"; errors carry "error".
+"""
+import asyncio
+import json
+import os
+import secrets
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import instrumentation
+from checkin_pipeline import EXIT_TIMEOUT_SECONDS, CheckinPipeline
+from services import AttendanceService
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+STAFF_ROLES = ("lecturer", "admin")
+VALID_STATUSES = ("Present", "Late", "Absent", "Excused")
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Response:
+    def __init__(self, body, status=200, content_type="application/json", filename=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.filename = filename
+
+
+def _json(status=200, **fields):
+    fields.setdefault("ok", status == 200)
+    return Response(json.dumps(fields, default=str).encode("utf-8"), status)
+
+
+class ApiServer:
+    def __init__(self, service=None, backend=None, refresh_seconds=2.0, workers=2, pipeline=None):
+        """
+        service: an AttendanceService (default: a new one on `backend`).
+        refresh_seconds: how often to pick up rows other processes appended (0 = never).
+        workers: threads for exports and chart drawing.
+        pipeline: None to write each check-in before answering, or a dict of CheckinPipeline
+                  options (e.g. {"max_pending": 10000}) to acknowledge from a queue.
+        """
+        self.service = service or AttendanceService(backend=backend)
+        # touch attendance now so the first request doesn't pay for the load
+        self.service.attendance_records
+        self.pipeline = CheckinPipeline(self.service, **pipeline) if pipeline is not None else None
+        self.refresh_seconds = refresh_seconds
+        self.sessions = {}  # token -> username
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="checkmein-api")
+        # every mutation runs here, one at a time; the loop only awaits the result
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkmein-writer")
+        self._writes = None
+        self._tasks = []
+        self._connections = {}  # handler task -> stream writer
+        self._server = None
+        self.routes = {
+            ("POST", "/api/login"): self.login,
+            ("POST", "/api/logout"): self.logout,
+            ("GET", "/api/health"): self.health,
+            ("GET", "/api/classes"): self.classes,
+            ("POST", "/api/mark"): self.mark,
+            ("POST", "/api/mark_bulk"): self.mark_bulk,
+            ("GET", "/api/roster"): self.roster,
+            ("GET", "/api/attendance"): self.attendance,
+            ("GET", "/api/history"): self.history,
+            ("GET", "/api/stats"): self.stats,
+            ("GET", "/api/trend"): self.trend,
+            ("GET", "/api/trend.png"): self.trend_png,
+            ("GET", "/api/export/class"): self.export_class,
+            ("GET", "/api/export/student"): self.export_student,
+            ("GET", "/api/diagnostics"): self.diagnostics,
+        }
+
+    # lifecycle
+    async def start(self, host="127.0.0.1", port=8765):
+        self._writes = asyncio.Queue()
+        self._tasks.append(asyncio.ensure_future(self._writer()))
+        if self.refresh_seconds:
+            self._tasks.append(asyncio.ensure_future(self._refresher()))
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # idle keep-alive connections end when their socket closes
+            for conn in list(self._connections.values()):
+                conn.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        # let queued mutations finish before the writer goes away
+        if self._writes is not None:
+            await self._writes.join()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self.pipeline is not None:
+            # bounded like the exit handler: a stuck disk must not keep the server from stopping
+            self.pipeline.close(EXIT_TIMEOUT_SECONDS)
+        self.service.flush()
+        self._write_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        # start the next server from what is in memory now
+        self.service.save_checkpoint()
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        host, port = await self.start(host, port)
+        print(f"Serving CheckMeIN API on http://{host}:{port}", flush=True)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    # single writer
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args, fut = await self._writes.get()
+            try:
+                if not fut.cancelled():
+                    result = await loop.run_in_executor(self._write_executor, fn, *args)
+                    if not fut.cancelled():
+                        fut.set_result(result)
+            except Exception as e:
+                if not fut.cancelled():
+                    fut.set_exception(e)
+            finally:
+                self._writes.task_done()
+
+    def write(self, fn, *args):
+        """Queue a mutation for the writer thread; returns a future with fn's result."""
+        fut = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait((fn, args, fut))
+        return fut
+
+    async def _refresher(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.write(self.service.refresh)
+            except Exception:
+                pass
+
+    async def _run_in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # HTTP plumbing
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, _json(413, error="Headers too large"), keep_alive=False)
+                    return
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                try:
+                    method, target, headers = self._parse_head(head)
+                    length = int(headers.get("content-length") or 0)
+                    if length > MAX_BODY_BYTES:
+                        raise ApiError(413, "Request body too large")
+                    body = await reader.readexactly(length) if length else b""
+                except ApiError as e:
+                    await self._send(writer, _json(e.status, error=e.message), keep_alive=False)
+                    return
+                except ValueError:
+                    await self._send(writer, _json(400, error="Malformed request"), keep_alive=False)
+                    return
+                response = await self._dispatch(method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._send(writer, response, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    @staticmethod
+    def _parse_head(head):
+        if len(head) > MAX_HEADER_BYTES:
+            raise ApiError(413, "Headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _version = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _m, path in self.routes):
+                return _json(405, error="Method not allowed")
+            return _json(404, error="Not found")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise ValueError
+        except ValueError:
+            return _json(400, error="Body must be a JSON object")
+        request = {"query": query, "data": data, "headers": headers}
+        try:
+            return await handler(request)
+        except ApiError as e:
+            return _json(e.status, error=e.message)
+        except Exception as e:
+            return _json(500, error=f"Server error: {e}")
+
+    @staticmethod
+    async def _send(writer, response, keep_alive=True):
+        head = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'OK')}",
+                f"Content-Type: {response.content_type}",
+                f"Content-Length: {len(response.body)}",
+                "Connection: " + ("keep-alive" if keep_alive else "close")]
+        if response.filename:
+            head.append(f'Content-Disposition: attachment; filename="{response.filename}"')
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.body)
+        await writer.drain()
+
+    # auth helpers
+    def _user(self, request):
+        """Return (username, role) for the request's token, or raise 401."""
+        auth = request["headers"].get("authorization", "")
+        token = auth[7:] if auth.lower().startswith("bearer ") else ""
+        username = self.sessions.get(token)
+        info = self.service.users.get(username) if username else None
+        if info is None:
+            raise ApiError(401, "Log in first")
+        return username, info.get("role", "")
+
+    def _staff(self, request):
+        username, role = self._user(request)
+        if role not in STAFF_ROLES:
+            raise ApiError(403, "Lecturers and admins only")
+        return username, role
+
+    def _student_for(self, request, student):
+        """Students act on themselves only; staff must name the student."""
+        username, role = self._user(request)
+        if role in STAFF_ROLES:
+            if not student:
+                raise ApiError(400, "student is required")
+            return student, role
+        if student and student != username:
+            raise ApiError(403, "Students can only access their own attendance")
+        return username, role
+
+    @staticmethod
+    def _required(fields, name):
+        value = fields.get(name)
+        if not value or not isinstance(value, str):
+            raise ApiError(400, f"{name} is required")
+        return value
+
+    def _known_class(self, class_name):
+        if class_name not in self.service.classes_map:
+            raise ApiError(404, f"Class '{class_name}' not found")
+        return class_name
+
+    @staticmethod
+    def _days(query):
+        try:
+            days = int(query.get("days") or 14)
+        except ValueError:
+            raise ApiError(400, "days must be a number")
+        if not 1 <= days <= 366:
+            raise ApiError(400, "days must be between 1 and 366")
+        return days
+
+    # handlers
+    async def health(self, request):
+        return _json(ok=True)
+
+    async def login(self, request):
+        data = request["data"]
+        username = str(data.get("username") or "").strip()
+        password = str(data.get("password") or "").strip()
+        info = self.service.users.get(username)
+        if info is None or info.get("password") != password:
+            return _json(401, error="Invalid username or password")
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = username
+        return _json(token=token, role=info.get("role", ""))
+
+    async def logout(self, request):
+        auth = request["headers"].get("authorization", "")
+        self.sessions.pop(auth[7:], None)
+        return _json()
+
+    async def classes(self, request):
+        self._user(request)
+        return _json(classes=dict(self.service.classes_map))
+
+    async def mark(self, request):
+        data = request["data"]
+        class_name = self._known_class(self._required(data, "class_name"))
+        student, role = self._student_for(request, data.get("student"))
+        status = data.get("status") or "Present"
+        if role not in STAFF_ROLES and status != "Present":
+            raise ApiError(403, "Students can only mark themselves Present")
+        if status not in VALID_STATUSES:
+            raise ApiError(400, f"status must be one of {', '.join(VALID_STATUSES)}")
+        if self.pipeline is not None:
+            # queued like any mutation (it changes the cache), but answers without waiting for disk
+            ok, msg = await self.write(self.pipeline.submit, class_name, student, status)
+        else:
+            ok, msg = await self.write(self.service.mark_attendance, class_name, student, status)
+        return _json(ok=ok, message=msg)
+
+    async def mark_bulk(self, request):
+        self._staff(request)
+        data = request["data"]
+        class_name = self._known_class(self._required(data, "class_name"))
+        statuses = data.get("statuses")
+        if not isinstance(statuses, dict) or any(s not in VALID_STATUSES for s in statuses.values()):
+            raise ApiError(400, "statuses must map student usernames to a valid status")
+        day = data.get("date")
+        if day is not None and not isinstance(day, str):
+            raise ApiError(400, "date must be a 'YYYY-MM-DD' string")
+        ok, msg = await self.write(self.service.mark_attendance_bulk, class_name, statuses, day)
+        return _json(ok=ok, message=msg)
+
+    async def roster(self, request):
+        self._staff(request)
+        class_name = self._known_class(self._required(request["query"], "class"))
+        marks = self.service.get_attendance_map_for_date().get(class_name, {})
+        return _json(students=self.service.roster(class_name), marks=marks)
+
+    async def attendance(self, request):
+        self._staff(request)
+        return _json(attendance=self.service.get_attendance_map_for_date(request["query"].get("date")))
+
+    async def history(self, request):
+        student, _role = self._student_for(request, request["query"].get("student"))
+        return _json(history=[dict(r) for r in self.service.get_student_history(student)])
+
+    async def stats(self, request):
+        self._staff(request)
+        class_name = self._known_class(self._required(request["query"], "class"))
+        return _json(stats=self.service.get_class_attendance_stats(class_name))
+
+    async def trend(self, request):
+        self._staff(request)
+        query = request["query"]
+        class_name = self._known_class(self._required(query, "class"))
+        history = self.service.get_attendance_history_for_class(class_name, days=self._days(query))
+        return _json(dates=[d.isoformat() for d in history], rates=list(history.values()))
+
+    async def trend_png(self, request):
+        self._staff(request)
+        query = request["query"]
+        class_name = self._known_class(self._required(query, "class"))
+        ok, render = self.service.trend_chart_renderer(class_name, self._days(query))
+        if not ok:
+            return _json(404, error=render)
+        png = await self._run_in_thread(render)
+        return Response(png, content_type="image/png")
+
+    async def export_class(self, request):
+        self._staff(request)
+        class_name = self._known_class(self._required(request["query"], "name"))
+        return await self._export(self.service.class_stats_exporter, class_name, "attendance")
+
+    async def export_student(self, request):
+        student, _role = self._student_for(request, request["query"].get("name"))
+        return await self._export(self.service.student_history_exporter, student, "history")
+
+    async def _export(self, exporter, name, suffix):
+        folder = tempfile.mkdtemp(prefix="checkmein-export-")
+        filename = "".join(c if c.isalnum() or c in "-_." else "_" for c in name) + f"_{suffix}.xlsx"
+        # rows are collected here on the loop; the workbook is written on a worker thread
+        ok, write = exporter(name, os.path.join(folder, filename))
+        if not ok:
+            os.rmdir(folder)
+            return _json(404, error=write)
+        try:
+            ok, path = await self._run_in_thread(write)
+            if not ok:
+                return _json(500, error=path)
+            with open(path, "rb") as f:
+                body = f.read()
+            os.remove(path)
+        finally:
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+        if path.endswith(".csv"):
+            return Response(body, content_type="text/csv", filename=os.path.basename(path))
+        return Response(body, filename=os.path.basename(path),
+                        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+    async def diagnostics(self, request):
+        _username, role = self._user(request)
+        if role != "admin":
+            raise ApiError(403, "Admins only")
+        pipeline = self.pipeline.stats() if self.pipeline is not None else None
+        return _json(diagnostics=instrumentation.snapshot(), pipeline=pipeline, query_cache=self.service.memo_stats())
+
+
+def serve(host="127.0.0.1", port=8765, backend=None, refresh_seconds=2.0, pipeline=None):
+    """Run the server until interrupted."""
+    server = ApiServer(backend=backend, refresh_seconds=refresh_seconds, pipeline=pipeline)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,360 @@
+"""
+Compact column store for attendance rows.
+
+Instead of one dict of five strings per row, class and student names are
+interned to integer ids, dates are kept as day ordinals, statuses as small
+codes and time_in as seconds since midnight, each in its own array.array
+column. Rows can still be read like the old dicts through AttendanceRow,
+so code written against load_attendance_records() keeps working.
+
+A date or time that isn't in the usual form (hand-edited files, old exports)
+is kept as written: each distinct string gets its own negative id in the
+column, so it reads back unchanged and never shares an index key with
+another row's.
+"""
+from array import array
+from collections.abc import Mapping
+from datetime import date
+
+FIELDS = ("date", "class_name", "student_username", "status", "time_in")
+
+NO_DATE = 0     # ordinal used for rows whose date is empty (below it: ids of dates kept as text)
+NO_TIME = -1    # seconds value used for rows without a time_in (below it: ids of times kept as text)
+
+
+def _pack_key(day, class_id, student_id):
+    # single int key for the (date, class, student) index; ids must stay below 2**21
+    return (day << 42) | (class_id << 21) | student_id
+
+
+class AttendanceRow(Mapping):
+    """Read-only dict-like view of one stored row (status can be assigned)."""
+
+    __slots__ = ("_store", "_i")
+
+    def __init__(self, store, i):
+        self._store = store
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._store.get_field(self._i, key)
+
+    def __setitem__(self, key, value):
+        if key != "status":
+            raise KeyError(f"Only status can be changed, not {key!r}")
+        self._store.set_status(self._i, value)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"AttendanceRow({dict(self)!r})"
+
+
+class AttendanceStore:
+    def __init__(self):
+        # interning tables: name -> id and id -> name
+        self.class_names = []
+        self.class_ids_by_name = {}
+        self.student_names = []
+        self.student_ids_by_name = {}
+        self.status_names = []
+        self.status_ids_by_name = {}
+
+        # one array per column
+        self.days = array("i")
+        self.class_ids = array("I")
+        self.student_ids = array("I")
+        self.statuses = array("H")
+        self.times = array("i")
+
+        # (date, class, student) -> row id, and day -> row ids in insertion order
+        self._key_index = {}
+        self._rows_by_day = {}
+        # student id -> row ids; built on first rows_for_student() call (only history lookups need it)
+        self._rows_by_student = None
+
+        # rollups kept in step with every append/set_status:
+        # class id -> day -> {status code: count}, and class id -> {status code: count}
+        self._daily_counts = {}
+        self._class_counts = {}
+
+        # caches for date string <-> ordinal conversion (dates kept as text have ids below NO_DATE)
+        self._day_by_str = {"": NO_DATE}
+        self._str_by_day = {NO_DATE: ""}
+        self._text_dates = 0
+        # times kept as text, and their ids (NO_TIME - 1 - position in the list)
+        self._raw_times = []
+        self._raw_time_ids = {}
+
+    @classmethod
+    def from_records(cls, records):
+        store = cls()
+        store.extend(records)
+        return store
+
+    def __len__(self):
+        return len(self.days)
+
+    def __bool__(self):
+        return len(self.days) > 0
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.days)
+        if not 0 <= i < len(self.days):
+            raise IndexError("attendance row out of range")
+        return AttendanceRow(self, i)
+
+    def __iter__(self):
+        for i in range(len(self.days)):
+            yield AttendanceRow(self, i)
+
+    # conversions
+    def day_of(self, date_str):
+        """
+        Return the day ordinal for a 'YYYY-MM-DD' string, NO_DATE for "", the id of a date kept
+        as text, or None for other text no row has.
+        """
+        day = self._day_by_str.get(date_str)
+        if day is None:
+            try:
+                d = date.fromisoformat(date_str)
+            except (TypeError, ValueError):
+                return None
+            if d.isoformat() != date_str:
+                return None  # e.g. '20240301': a date, but it would not read back as written
+            day = self._day_by_str[date_str] = d.toordinal()
+        return day
+
+    def _stored_day(self, date_str):
+        # day_of(), giving text that isn't a date an id of its own
+        day = self.day_of(date_str)
+        if day is None:
+            self._text_dates += 1
+            day = NO_DATE - self._text_dates
+            self._day_by_str[date_str] = day
+            self._str_by_day[day] = date_str
+        return day
+
+    def date_str(self, day):
+        s = self._str_by_day.get(day)
+        if s is None:
+            s = date.fromordinal(day).isoformat()
+            self._str_by_day[day] = s
+        return s
+
+    def _time_to_seconds(self, time_in):
+        if not time_in:
+            return NO_TIME
+        try:
+            h, m, s = time_in.split(":")
+            seconds = int(h) * 3600 + int(m) * 60 + int(s)
+        except (AttributeError, ValueError):
+            seconds = None
+        if seconds is None or not 0 <= seconds < 86400 or self._seconds_to_time(seconds) != time_in:
+            # not 'HH:MM:SS': keep the text so it reads back as written
+            seconds = self._raw_time_ids.get(time_in)
+            if seconds is None:
+                seconds = self._raw_time_ids[time_in] = NO_TIME - 1 - len(self._raw_times)
+                self._raw_times.append(time_in)
+        return seconds
+
+    def _seconds_to_time(self, seconds):
+        if seconds == NO_TIME:
+            return ""
+        if seconds < NO_TIME:
+            return self._raw_times[NO_TIME - 1 - seconds]
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+    @staticmethod
+    def _intern(name, names, ids):
+        i = ids.get(name)
+        if i is None:
+            i = len(names)
+            names.append(name)
+            ids[name] = i
+        return i
+
+    def class_id(self, class_name):
+        """Return the interned id for a class, or None if it has no rows."""
+        return self.class_ids_by_name.get(class_name)
+
+    def student_id(self, student_username):
+        return self.student_ids_by_name.get(student_username)
+
+    # reading
+    def get_field(self, i, key):
+        if key == "date":
+            return self.date_str(self.days[i])
+        if key == "class_name":
+            return self.class_names[self.class_ids[i]]
+        if key == "student_username":
+            return self.student_names[self.student_ids[i]]
+        if key == "status":
+            return self.status_names[self.statuses[i]]
+        if key == "time_in":
+            return self._seconds_to_time(self.times[i])
+        raise KeyError(key)
+
+    def row(self, i):
+        """Return row i as a plain dict (same shape as load_attendance_records)."""
+        return {key: self.get_field(i, key) for key in FIELDS}
+
+    def find(self, date_str, class_name, student_username):
+        """Return the row id for (date, class, student), or None. Later rows win."""
+        cid = self.class_ids_by_name.get(class_name)
+        sid = self.student_ids_by_name.get(student_username)
+        day = self.day_of(date_str)
+        if cid is None or sid is None or day is None:
+            return None
+        return self._key_index.get(_pack_key(day, cid, sid))
+
+    def daily_counts(self, class_id):
+        """Return {day ordinal: {status code: count}} for a class (live dict, do not modify)."""
+        return self._daily_counts.get(class_id, {})
+
+    def class_counts(self, class_id):
+        """Return {status code: count} over all days for a class (live dict, do not modify)."""
+        return self._class_counts.get(class_id, {})
+
+    def _count(self, cid, day, code, delta):
+        by_code = self._daily_counts.setdefault(cid, {}).setdefault(day, {})
+        by_code[code] = by_code.get(code, 0) + delta
+        totals = self._class_counts.setdefault(cid, {})
+        totals[code] = totals.get(code, 0) + delta
+
+    def rows_for_date(self, date_str):
+        """Return the row ids recorded on a date, in insertion order."""
+        return self._rows_by_day.get(self.day_of(date_str), ())
+
+    def rows_for_student(self, student_username):
+        """Return the row ids recorded for a student, in insertion order."""
+        sid = self.student_ids_by_name.get(student_username)
+        if sid is None:
+            return ()
+        if self._rows_by_student is None:
+            by_student = {}
+            for i, s in enumerate(self.student_ids):
+                rows = by_student.get(s)
+                if rows is None:
+                    rows = by_student[s] = array("I")
+                rows.append(i)
+            self._rows_by_student = by_student
+        return self._rows_by_student.get(sid, ())
+
+    # writing
+    def append(self, date_str, class_name, student_username, status, time_in):
+        day = self._stored_day(date_str)
+        cid = self._intern(class_name, self.class_names, self.class_ids_by_name)
+        sid = self._intern(student_username, self.student_names, self.student_ids_by_name)
+        i = len(self.days)
+        self.days.append(day)
+        self.class_ids.append(cid)
+        self.student_ids.append(sid)
+        code = self._intern(status, self.status_names, self.status_ids_by_name)
+        self.statuses.append(code)
+        self.times.append(self._time_to_seconds(time_in))
+        self._count(cid, day, code, 1)
+        self._key_index[_pack_key(day, cid, sid)] = i
+        by_day = self._rows_by_day.get(day)
+        if by_day is None:
+            by_day = self._rows_by_day[day] = array("I")
+        by_day.append(i)
+        if self._rows_by_student is not None:
+            by_student = self._rows_by_student.get(sid)
+            if by_student is None:
+                by_student = self._rows_by_student[sid] = array("I")
+            by_student.append(i)
+        return i
+
+    def extend(self, records):
+        """Append rows from an iterable of dicts (e.g. database.iter_attendance_records())."""
+        # same as calling append() per row, with lookups hoisted out of the loop for bulk loads
+        day_of, intern, to_seconds = self._stored_day, self._intern, self._time_to_seconds
+        class_names, class_ids_by_name = self.class_names, self.class_ids_by_name
+        student_names, student_ids_by_name = self.student_names, self.student_ids_by_name
+        status_names, status_ids_by_name = self.status_names, self.status_ids_by_name
+        key_index, rows_by_day = self._key_index, self._rows_by_day
+        count = self._count
+        times_cache = {}
+        # rebuilt on next use rather than maintained row by row during bulk loads
+        self._rows_by_student = None
+        i = len(self.days)
+        for r in records:
+            day = day_of(r.get("date") or "")
+            class_name = r.get("class_name") or ""
+            cid = class_ids_by_name.get(class_name)
+            if cid is None:
+                cid = intern(class_name, class_names, class_ids_by_name)
+            student = r.get("student_username") or ""
+            sid = student_ids_by_name.get(student)
+            if sid is None:
+                sid = intern(student, student_names, student_ids_by_name)
+            status = r.get("status") or ""
+            code = status_ids_by_name.get(status)
+            if code is None:
+                code = intern(status, status_names, status_ids_by_name)
+            time_in = r.get("time_in") or ""
+            seconds = times_cache.get(time_in)
+            if seconds is None:
+                seconds = times_cache[time_in] = to_seconds(time_in)
+            self.days.append(day)
+            self.class_ids.append(cid)
+            self.student_ids.append(sid)
+            self.statuses.append(code)
+            self.times.append(seconds)
+            key_index[(day << 42) | (cid << 21) | sid] = i
+            by_day = rows_by_day.get(day)
+            if by_day is None:
+                by_day = rows_by_day[day] = array("I")
+            by_day.append(i)
+            count(cid, day, code, 1)
+            i += 1
+
+    def set_status(self, i, status):
+        code = self._intern(status, self.status_names, self.status_ids_by_name)
+        old = self.statuses[i]
+        if code == old:
+            return
+        self.statuses[i] = code
+        self._count(self.class_ids[i], self.days[i], old, -1)
+        self._count(self.class_ids[i], self.days[i], code, 1)
+
+    def remove(self, i):
+        """
+        Drop row i, e.g. a check-in that was cached before its write and then never reached
+        disk. The last row takes over id i, so ids held from before the call are stale.
+        """
+        last = len(self.days) - 1
+        if not 0 <= i <= last:
+            raise IndexError("attendance row out of range")
+        day, cid, sid = self.days[i], self.class_ids[i], self.student_ids[i]
+        self._count(cid, day, self.statuses[i], -1)
+        key = _pack_key(day, cid, sid)
+        if self._key_index.get(key) == i:
+            del self._key_index[key]
+        by_day = self._rows_by_day[day]
+        by_day.remove(i)
+        if not by_day:
+            del self._rows_by_day[day]
+        if self._rows_by_student is not None:
+            self._rows_by_student[sid].remove(i)
+        if i != last:
+            # move the last row into the gap so the columns stay dense
+            day, cid, sid = self.days[last], self.class_ids[last], self.student_ids[last]
+            self.days[i], self.class_ids[i], self.student_ids[i] = day, cid, sid
+            self.statuses[i], self.times[i] = self.statuses[last], self.times[last]
+            key = _pack_key(day, cid, sid)
+            if self._key_index.get(key) == last:
+                self._key_index[key] = i
+            by_day = self._rows_by_day[day]
+            by_day[by_day.index(last)] = i
+            if self._rows_by_student is not None:
+                by_student = self._rows_by_student[sid]
+                by_student[by_student.index(last)] = i
+        for column in (self.days, self.class_ids, self.student_ids, self.statuses, self.times):
+            column.pop()
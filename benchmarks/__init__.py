@@ -0,0 +1 @@
+"""Benchmarks and stress tests for CheckMeIN (run from the repository root, e.g. python -m benchmarks.suite run)."""
@@ -0,0 +1,199 @@
+"""
+Load generator for the JSON API server (api_server.py).
+
+Starts `python -m checkmein serve` on a synthetic data folder in a separate
+process, then opens many keep-alive connections that behave like kiosks:
+each logs in as its own student and alternates check-ins (a new class each
+time) with reading its history, while a few lecturer connections read class
+stats and trend data. Prints requests per second and latency per endpoint.
+
+    python benchmarks/bench_api.py [--clients 50] [--requests 200] [--rows 200000]
+    python benchmarks/bench_api.py --url 127.0.0.1:8765   # an already running server on datagen data
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks import datagen
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection speaking JSON."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.token = None
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write((head + "\r\n").encode() + body)
+        await self.writer.drain()
+        raw = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(raw.split(b" ", 2)[1])
+        length = 0
+        for line in raw.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        payload = await self.reader.readexactly(length) if length else b""
+        return status, payload
+
+    async def login(self, username, password):
+        status, payload = await self.request("POST", "/api/login", {"username": username, "password": password})
+        if status != 200:
+            raise RuntimeError(f"login failed for {username}: {payload!r}")
+        self.token = json.loads(payload)["token"]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def student_kiosk(host, port, student, classes, n, timings):
+    client = Client(host, port)
+    await client.connect()
+    await client.login(student, "student123")
+    try:
+        for i in range(n):
+            if i % 2 == 0:
+                op = "mark"
+                args = ("POST", "/api/mark", {"class_name": classes[(i // 2) % len(classes)]})
+            else:
+                op = "history"
+                args = ("GET", "/api/history", None)
+            t0 = time.perf_counter()
+            status, _ = await client.request(*args)
+            timings.setdefault(op, []).append(time.perf_counter() - t0)
+            if status != 200:
+                timings.setdefault("errors", []).append(status)
+    finally:
+        client.close()
+
+
+async def lecturer_console(host, port, lecturer, classes, n, timings):
+    client = Client(host, port)
+    await client.connect()
+    await client.login(lecturer, "lecturer123")
+    try:
+        for i in range(n):
+            class_name = classes[i % len(classes)]
+            op, path = ("stats", f"/api/stats?class={class_name}") if i % 2 == 0 else \
+                       ("trend", f"/api/trend?class={class_name}&days=14")
+            t0 = time.perf_counter()
+            status, _ = await client.request("GET", path)
+            timings.setdefault(op, []).append(time.perf_counter() - t0)
+            if status != 200:
+                timings.setdefault("errors", []).append(status)
+    finally:
+        client.close()
+
+
+async def run_load(host, port, clients, requests, classes, lecturers):
+    timings = {}
+    tasks = [student_kiosk(host, port, datagen.student_name(i), classes, requests, timings) for i in range(clients)]
+    tasks += [lecturer_console(host, port, datagen.lecturer_name(i), classes, requests, timings) for i in range(lecturers)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - t0, timings
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(host, port, proc, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during start-up")
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="requests per second against the CheckMeIN API server")
+    parser.add_argument("--clients", type=int, default=50, help="student kiosk connections")
+    parser.add_argument("--lecturers", type=int, default=2, help="lecturer connections reading stats/trends")
+    parser.add_argument("--requests", type=int, default=200, help="requests per connection")
+    parser.add_argument("--students", type=int, default=2_000)
+    parser.add_argument("--classes", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--backend", choices=["csv", "sqlite"])
+    parser.add_argument("--batch-rows", type=int, default=0, help="passed to serve (group commit)")
+    parser.add_argument("--batch-ms", type=int, default=0, help="passed to serve (group commit)")
+    parser.add_argument("--pipeline", action="store_true", help="passed to serve (queued check-ins)")
+    parser.add_argument("--url", help="host:port of a running server instead of starting one")
+    args = parser.parse_args()
+
+    classes = [datagen.class_name(c) for c in range(args.classes)]
+    proc = folder = None
+    if args.url:
+        host, _, port = args.url.rpartition(":")
+        port = int(port)
+    else:
+        folder = tempfile.TemporaryDirectory()
+        datagen.generate(folder.name, students=args.students, classes=args.classes, rows=args.rows)
+        host, port = "127.0.0.1", free_port()
+        cmd = [sys.executable, "-m", "checkmein", "--data-dir", folder.name]
+        if args.backend:
+            cmd += ["--backend", args.backend]
+        cmd += ["serve", "--port", str(port), "--batch-rows", str(args.batch_rows), "--batch-ms", str(args.batch_ms)]
+        if args.pipeline:
+            cmd.append("--pipeline")
+        if args.backend == "sqlite":
+            import sqlite_database
+            sqlite_database.migrate_from_csv()
+            sqlite_database.reset_connections()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL)
+        wait_for_server(host, port, proc)
+        print(f"server up on {args.rows} rows in {time.perf_counter() - t0:.2f}s")
+
+    try:
+        elapsed, timings = asyncio.run(run_load(host, port, args.clients, args.requests, classes, args.lecturers))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if folder is not None:
+            folder.cleanup()
+
+    errors = timings.pop("errors", [])
+    total = sum(len(v) for v in timings.values())
+    print(f"{total} requests from {args.clients + args.lecturers} connections in {elapsed:.2f}s: "
+          f"{total / elapsed:,.0f} req/s, {len(errors)} errors")
+    for op, values in sorted(timings.items()):
+        print(f"  {op:<8} {len(values):>7} reqs  p50 {percentile(values, 50) * 1000:7.2f} ms"
+              f"  p99 {percentile(values, 99) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
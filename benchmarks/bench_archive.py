@@ -0,0 +1,60 @@
+"""
+Start-up and everyday queries with and without the cold archive.
+
+Generates a synthetic data folder with years of history (benchmarks.datagen),
+then times loading AttendanceService, today's attendance map and a 14-day
+trend, first with everything in attendance.csv and again after
+`database.archive_attendance()` has moved the closed months out. Also prints
+how much disk the history takes before and after compression.
+
+    python benchmarks/bench_archive.py [rows] [days]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+from benchmarks import datagen
+from services import AttendanceService
+
+
+def folder_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _dirs, names in os.walk(path) for name in names)
+
+
+def measure(label):
+    t0 = time.perf_counter()
+    # a full parse both times: no checkpoint to load, none written into the folder being measured
+    service = AttendanceService(checkpoint=False)
+    startup = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    service.get_attendance_map_for_date()
+    today = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    service.get_attendance_history_for_class(datagen.class_name(0), days=14)
+    trend = time.perf_counter() - t0
+    print(f"{label:<16} start-up {startup:>7.2f} s  today {today * 1000:>7.2f} ms  14-day trend {trend * 1000:>7.2f} ms"
+          f"  rows in memory {len(service.attendance_records):>9}")
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 3 * 365
+    with tempfile.TemporaryDirectory() as folder:
+        database.set_data_dir(folder)
+        datagen.generate(folder, students=5_000, classes=200, rows=n_rows, days=days)
+        size = folder_size(folder)
+        measure("one file")
+
+        t0 = time.perf_counter()
+        moved, months = database.archive_attendance(keep_months=2)
+        print(f"archived {moved} rows into {months} months in {time.perf_counter() - t0:.2f} s; "
+              f"data folder {size / 2**20:.1f} MB -> {folder_size(folder) / 2**20:.1f} MB")
+        measure("archived")
+
+
+if __name__ == "__main__":
+    main()
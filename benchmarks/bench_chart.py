@@ -0,0 +1,83 @@
+"""
+Per-chart latency: old pyplot + attendance_trend.png round-trip vs in-memory Agg render.
+
+The old path built a new pyplot figure, saved it to a file and the GUI
+read the file back. The new path redraws one reused Agg figure into a
+BytesIO. Both draw the same 14-day series.
+
+    python benchmarks/bench_chart.py [charts]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import matplotlib
+matplotlib.use("Agg")  # the old path used pyplot; keep it headless for the benchmark
+import matplotlib.pyplot as plt
+
+import database
+from services import AttendanceService
+
+
+def old_path(class_name, x_dates, rates, out):
+    plt.figure(figsize=(8, 4))
+    plt.plot(x_dates, rates, marker="o", linestyle="-")
+    plt.title(f"14-day Attendance Rate - {class_name}")
+    plt.xlabel("Date")
+    plt.ylabel("Attendance Rate (%)")
+    plt.ylim(0, 100)
+    plt.grid(True)
+    plt.gcf().autofmt_xdate()
+    plt.tight_layout()
+    plt.savefig(out)
+    plt.close()
+    # what PhotoImage(file=...) did next
+    with open(out, "rb") as f:
+        return f.read()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    today = date.today()
+    x_dates = [today - timedelta(days=13 - i) for i in range(14)]
+    rates = [60 + (i * 7) % 40 for i in range(14)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        database.set_data_dir(folder)
+        service = AttendanceService(checkpoint=False)
+        out = os.path.join(folder, "attendance_trend.png")
+
+        # warm up imports/fonts for both paths
+        old_path("CLS", x_dates, rates, out)
+        service._render_trend_png("CLS", 14, x_dates, rates)
+
+        t0 = time.perf_counter()
+        for i in range(n):
+            old_path(f"CLS{i}", x_dates, rates, out)
+        old_ms = (time.perf_counter() - t0) / n * 1000
+
+        t0 = time.perf_counter()
+        for i in range(n):
+            service._render_trend_png(f"CLS{i}", 14, x_dates, rates)
+        new_ms = (time.perf_counter() - t0) / n * 1000
+
+        # repeat views of unchanged data come from the chart cache
+        service.add_class("CLS")
+        service.mark_attendance("CLS", "student1")
+        service.get_trend_chart("CLS")
+        t0 = time.perf_counter()
+        for _ in range(n):
+            service.get_trend_chart("CLS")
+        cached_ms = (time.perf_counter() - t0) / n * 1000
+
+    print(f"pyplot + file round-trip: {old_ms:8.1f} ms/chart")
+    print(f"reused Agg figure, bytes: {new_ms:8.1f} ms/chart")
+    print(f"cached repeat view:       {cached_ms:8.3f} ms/chart")
+
+
+if __name__ == "__main__":
+    main()
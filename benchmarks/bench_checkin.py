@@ -0,0 +1,43 @@
+"""
+Check-in latency vs attendance.csv size.
+
+Builds throwaway data folders with growing attendance files and times
+AttendanceService.mark_attendance for a batch of fresh students on each.
+With in-place cache updates the per-check-in time should stay flat.
+
+    python benchmarks/bench_checkin.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks import datagen
+from services import AttendanceService
+
+SIZES = [10_000, 50_000, 200_000]
+CHECKINS = 200
+N_STUDENTS = 2_000
+N_CLASSES = 50
+
+
+def main():
+    print(f"{'rows':>10} {'load (s)':>10} {'check-in (ms)':>14}")
+    for n_rows in SIZES:
+        with tempfile.TemporaryDirectory() as folder:
+            datagen.generate(folder, students=N_STUDENTS, classes=N_CLASSES, rows=n_rows)
+            t0 = time.perf_counter()
+            service = AttendanceService()
+            load_time = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for i in range(CHECKINS):
+                service.mark_attendance(datagen.class_name(0), f"new_student{i}")
+            per_checkin = (time.perf_counter() - t0) / CHECKINS * 1000
+            print(f"{n_rows:>10} {load_time:>10.2f} {per_checkin:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
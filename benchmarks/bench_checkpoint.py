@@ -0,0 +1,57 @@
+"""
+AttendanceService start-up: parsing the CSV files vs loading the checkpoint.
+
+Generates a synthetic data folder (benchmarks.datagen), then times:
+  - a cold start that parses every file (checkpoint=False),
+  - a start from the checkpoint saved after the cold start,
+  - a start from the checkpoint after other kiosks appended check-ins,
+    so only that tail is parsed.
+
+    python benchmarks/bench_checkpoint.py [rows] [appended]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+from benchmarks import datagen
+from services import AttendanceService
+
+
+def measure(label, **kwargs):
+    best = None
+    for _ in range(3):
+        t0 = time.perf_counter()
+        service = AttendanceService(**kwargs)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {best:>7.3f} s  ({len(service.attendance_records)} rows)")
+    return service
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    appended = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    with tempfile.TemporaryDirectory() as folder:
+        database.set_data_dir(folder)
+        info = datagen.generate(folder, students=10_000, classes=500, rows=n_rows)
+        # saved once (as the GUI does on exit) for the others to load
+        AttendanceService(checkpoint=False).save_checkpoint()
+        size = os.path.getsize(AttendanceService._checkpoint_path())
+        print(f"checkpoint file {size / 2**20:.1f} MB, attendance.csv {os.path.getsize(database.ATTENDANCE_CSV) / 2**20:.1f} MB")
+
+        measure("cold (parse CSV)", checkpoint=False)
+        measure("checkpoint", checkpoint=True)
+
+        today = time.strftime("%Y-%m-%d")
+        rows = [(today, datagen.class_name(i % info["classes"]), datagen.student_name(i % info["students"]),
+                 "Present", "09:00:00") for i in range(appended)]
+        database.append_attendance_rows(rows)
+        measure(f"checkpoint + {appended} new rows", checkpoint=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Burst of check-ins at the start of a lecture: one write per row vs group commit.
+
+Times AttendanceService.mark_attendance for a burst of fresh students against
+a data folder that already holds a term's worth of rows, with the write
+buffer off, on, and on with an fsync per batch.
+
+    python benchmarks/bench_group_commit.py [checkins]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+from benchmarks import datagen
+from services import AttendanceService
+
+EXISTING_ROWS = 50_000
+
+MODES = [
+    ("one write per row", dict()),
+    ("group commit 64 rows / 20 ms", dict(max_rows=64, max_delay_ms=20)),
+    ("group commit + fsync per batch", dict(max_rows=64, max_delay_ms=20, fsync=True)),
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    print(f"{n} check-ins on top of {EXISTING_ROWS} rows")
+    for label, config in MODES:
+        with tempfile.TemporaryDirectory() as folder:
+            datagen.generate(folder, students=2_000, classes=50, rows=EXISTING_ROWS)
+            database.configure_write_buffer(**config)
+            service = AttendanceService()
+            t0 = time.perf_counter()
+            for i in range(n):
+                service.mark_attendance(datagen.class_name(0), f"burst{i}")
+            accepted = time.perf_counter() - t0
+            service.flush()
+            total = time.perf_counter() - t0
+            database.configure_write_buffer()
+        print(f"{label:<32} {accepted / n * 1e6:8.1f} us/check-in, {total:6.3f}s until all on disk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Memory used by attendance rows: list of csv dicts vs AttendanceStore.
+
+Generates a synthetic data folder (benchmarks.datagen), then loads it both ways under
+tracemalloc and reports the memory each representation keeps alive.
+
+    python benchmarks/bench_memory.py [rows]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+from attendance_store import AttendanceStore
+from benchmarks import datagen
+
+def measure(label, load):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    data = load()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {len(data):>10} rows {current / 2**20:>9.1f} MB kept {peak / 2**20:>9.1f} MB peak {elapsed:>7.2f} s")
+    del data
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as folder:
+        datagen.generate(folder, students=5_000, classes=200, rows=n_rows)
+        measure("list of dicts", database.load_attendance_records)
+        measure("AttendanceStore", lambda: AttendanceStore.from_records(database.iter_attendance_records()))
+
+
+if __name__ == "__main__":
+    main()
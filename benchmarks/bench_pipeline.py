@@ -0,0 +1,91 @@
+"""
+Start-of-lecture burst: direct mark_attendance vs the queued CheckinPipeline.
+
+Submits a burst of fresh check-ins from one thread against a data folder that
+already holds a term's worth of rows, then waits until all of them are on
+disk. Prints check-ins per second, time-to-ack and time-to-durable
+percentiles, and checks every check-in made it to the file exactly once.
+
+    python benchmarks/bench_pipeline.py [checkins] [--fsync]
+
+--fsync syncs every pipeline batch to disk; single direct appends are not synced.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+from benchmarks import datagen
+from checkin_pipeline import CheckinPipeline, _percentile
+from services import AttendanceService
+
+EXISTING_ROWS = 200_000
+CLASSES = 50
+
+
+def burst(n):
+    # each student checks in to one class; spread over the classes like a timetable slot
+    return [(datagen.class_name(i % CLASSES), f"burst{i}") for i in range(n)]
+
+
+def check_on_disk(n):
+    today = time.strftime("%Y-%m-%d")
+    keys = [(r["class_name"], r["student_username"]) for r in database.iter_attendance_records()
+            if r["date"] == today and r["student_username"].startswith("burst")]
+    assert len(keys) == n and len(set(keys)) == n, f"expected {n} rows on disk, found {len(keys)}"
+
+
+def run_direct(checkins):
+    service = AttendanceService()
+    acks = []
+    t0 = time.perf_counter()
+    for class_name, student in checkins:
+        t = time.perf_counter()
+        service.mark_attendance(class_name, student)
+        acks.append((time.perf_counter() - t) * 1000)
+    service.flush()
+    total = time.perf_counter() - t0
+    # every call returns after its write, so ack and durable are the same
+    return total, total, {"ack_p50_ms": _percentile(acks, 50), "ack_p99_ms": _percentile(acks, 99),
+                          "durable_p50_ms": _percentile(acks, 50), "durable_p99_ms": _percentile(acks, 99)}
+
+
+def run_pipeline(checkins):
+    service = AttendanceService()
+    pipeline = CheckinPipeline(service)
+    t0 = time.perf_counter()
+    for class_name, student in checkins:
+        ok, msg = pipeline.submit(class_name, student)
+        assert ok, msg
+    accepted = time.perf_counter() - t0
+    pipeline.flush()
+    total = time.perf_counter() - t0
+    stats = pipeline.stats()
+    pipeline.close()
+    return accepted, total, stats
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if args else 5_000
+    fsync = "--fsync" in sys.argv
+    print(f"{n} check-ins on top of {EXISTING_ROWS} rows{' (fsync)' if fsync else ''}")
+    checkins = burst(n)
+    for label, run in (("direct mark_attendance", run_direct), ("queued pipeline", run_pipeline)):
+        with tempfile.TemporaryDirectory() as folder:
+            datagen.generate(folder, students=5_000, classes=CLASSES, rows=EXISTING_ROWS)
+            database.configure_write_buffer(fsync=fsync)
+            accepted, total, stats = run(checkins)
+            check_on_disk(n)
+            database.configure_write_buffer()
+        extra = f", {stats['batches']} batches" if "batches" in stats else ""
+        print(f"{label:<24} {n / accepted:9,.0f} acks/s  {n / total:9,.0f} durable/s{extra}")
+        print(f"{'':<24} ack p50 {stats['ack_p50_ms']:.3f} ms  p99 {stats['ack_p99_ms']:.3f} ms   "
+              f"durable p50 {stats['durable_p50_ms']:.2f} ms  p99 {stats['durable_p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
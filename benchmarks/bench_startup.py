@@ -0,0 +1,67 @@
+"""
+Time from launching the app to the login window being drawn.
+
+Runs main_gui in a fresh interpreter (so import time counts) against a
+synthetic data folder, once with lazy startup and once eager, and prints
+the median of a few runs. Needs a display.
+
+    python benchmarks/bench_startup.py [attendance_rows]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks import datagen
+
+RUNS = 3
+
+# child: point at the data folder, build the app, draw it, report, exit
+CHILD = """
+import sys
+sys.path.insert(0, {root!r})
+import database
+database.set_data_dir({folder!r})
+from main_gui import AttendanceApp
+app = AttendanceApp(lazy={lazy})
+app.update()
+print("READY", flush=True)
+app.destroy()
+"""
+
+
+def time_to_login(folder, lazy):
+    code = CHILD.format(root=ROOT, folder=folder, lazy=lazy)
+    # an empty checkpoint folder per run, so every run is a cold start and lazy vs eager is all that differs
+    env = dict(os.environ, CHECKMEIN_CACHE_DIR=tempfile.mkdtemp(dir=folder))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True, env=env)
+    for line in proc.stdout:
+        if line.strip() == "READY":
+            elapsed = time.perf_counter() - t0
+            break
+    else:
+        proc.wait()
+        raise RuntimeError("app exited before the login window appeared (is a display available?)")
+    proc.wait()
+    return elapsed
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as folder:
+        datagen.generate(folder, students=5_000, classes=200, rows=n_rows)
+        print(f"attendance rows: {n_rows}")
+        for lazy in (False, True):
+            times = [time_to_login(folder, lazy) for _ in range(RUNS)]
+            label = "lazy" if lazy else "eager"
+            print(f"{label:<6} time-to-login-window: {statistics.median(times):.2f}s (runs: {', '.join(f'{t:.2f}' for t in times)})")
+
+
+if __name__ == "__main__":
+    main()
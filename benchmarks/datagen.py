@@ -0,0 +1,136 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+Writes users.csv, classes.csv, enrollments.csv and attendance.csv in the
+same format as database.py. The same arguments always give byte-identical files, so
+timings from different runs (or machines) are comparable.
+
+Every class has a fixed, enrolled roster of consecutive students. Attendance covers
+the `days` days before today, in date order like real check-ins, with each
+(date, class, student) at most once. Today is left empty so benchmarks can
+mark fresh rows.
+
+    python -m benchmarks.datagen OUT_DIR [--students 10000] [--classes 500] [--rows 5000000]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+
+# (name, students, classes, attendance rows)
+SIZES = {
+    "small": (1_000, 50, 100_000),
+    "medium": (5_000, 200, 1_000_000),
+    "large": (10_000, 500, 5_000_000),
+}
+
+# weights out of 100
+STATUS_WEIGHTS = [("Present", 80), ("Late", 10), ("Absent", 7), ("Excused", 3)]
+
+
+def student_name(i):
+    return f"student{i}"
+
+
+def class_name(i):
+    return f"CLS{i:04d}"
+
+
+def lecturer_name(i):
+    return f"lecturer{i}"
+
+
+def generate(folder, students=10_000, classes=500, rows=5_000_000, days=120, lecturers=None, seed=0):
+    """
+    Write a data folder and point database at it. Returns a dict describing what was written.
+    rows is spread evenly over the days; it must not exceed days * classes * students.
+    Service checkpoints go to a .cache folder inside it, so a throwaway folder takes them along.
+    """
+    if rows > days * classes * students:
+        raise ValueError("more rows than distinct (date, class, student) combinations")
+    lecturers = lecturers if lecturers is not None else max(1, classes // 4)
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    database.set_data_dir(folder)
+    os.environ["CHECKMEIN_CACHE_DIR"] = os.path.join(folder, ".cache")
+
+    with open(database.USERS_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["username", "password", "role"])
+        writer.writerow(["admin", "admin123", "admin"])
+        writer.writerows([lecturer_name(i), "lecturer123", "lecturer"] for i in range(lecturers))
+        writer.writerows([student_name(i), "student123", "student"] for i in range(students))
+
+    with open(database.CLASSES_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["class_name", "lecturer_username"])
+        writer.writerows([class_name(c), lecturer_name(c % lecturers)] for c in range(classes))
+
+    # status codes picked by a table lookup, check-in times from a fixed pool
+    status_table = [name for name, weight in STATUS_WEIGHTS for _ in range(weight)]
+    times = [f"{h:02d}:{m:02d}:{s:02d}" for h in range(8, 18) for m in range(0, 60, 3) for s in (0, 17, 41)]
+    roster_start = [rng.randrange(students) for _ in range(classes)]
+    student_names = [student_name(i) for i in range(students)]
+    class_names = [class_name(c) for c in range(classes)]
+
+    # just big enough to hold the busiest day's rows for a class
+    busiest_day = -(-rows // days)
+    roster_size = min(students, -(-busiest_day // classes))
+    with open(database.ENROLLMENTS_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(database.ENROLLMENT_FIELDS)
+        for c in range(classes):
+            writer.writerows([class_names[c], student_names[(roster_start[c] + k) % students]]
+                             for k in range(roster_size))
+
+    first_day = date.today() - timedelta(days=days)
+    written = 0
+    with open(database.ATTENDANCE_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(database.ATTENDANCE_FIELDS)
+        for d in range(days):
+            # spread the remainder so the total is exactly `rows`
+            per_day = (rows * (d + 1)) // days - (rows * d) // days
+            day = (first_day + timedelta(days=d)).isoformat()
+            batch = []
+            for j in range(per_day):
+                c = j % classes
+                k = j // classes  # k-th student of the class roster
+                batch.append((day, class_names[c], student_names[(roster_start[c] + k) % students],
+                              status_table[rng.randrange(100)], times[rng.randrange(len(times))]))
+            writer.writerows(batch)
+            written += per_day
+
+    if os.path.exists(database.ATTENDANCE_UPDATES_CSV):
+        os.remove(database.ATTENDANCE_UPDATES_CSV)
+    return {"students": students, "classes": classes, "lecturers": lecturers,
+            "roster_size": roster_size, "rows": written, "days": days, "seed": seed,
+            # first student on the first class's roster: has a row on every day
+            "sample": [class_names[0], student_names[roster_start[0]]]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.datagen", description="write a synthetic CheckMeIN data folder")
+    parser.add_argument("out_dir")
+    parser.add_argument("--size", choices=sorted(SIZES), help="preset for students/classes/rows")
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--classes", type=int)
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    students, classes, rows = SIZES[args.size or "large"]
+    info = generate(os.path.abspath(args.out_dir),
+                    students=args.students or students, classes=args.classes or classes,
+                    rows=args.rows if args.rows is not None else rows, days=args.days, seed=args.seed)
+    print(f"Wrote {info['rows']} attendance rows, {info['students']} students, {info['classes']} classes to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stress test for several processes writing to one data folder.
+
+Every worker process opens its own AttendanceService on a shared temp
+folder and, all at the same time:
+  - tries to mark every (class, student) pair, in its own random order
+  - corrects the status of the rows it managed to mark (with a tiny
+    compaction threshold, so attendance.csv keeps getting rewritten)
+  - adds its own users, and adds then deletes throwaway users
+    (which rewrites users.csv)
+At the end each pair must appear exactly once in the attendance data and every
+permanent user must be stored exactly once. Exits 1 on any
+lost or duplicated row.
+
+    python benchmarks/stress_writers.py [workers]
+    CHECKMEIN_BACKEND=sqlite python benchmarks/stress_writers.py
+"""
+import csv
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+from services import AttendanceService
+
+CLASSES = [f"C{i}" for i in range(5)]
+STUDENTS = [f"s{i}" for i in range(40)]
+USERS_PER_WORKER = 25
+
+
+def worker(n, folder, start_evt):
+    database.set_data_dir(folder)
+    database.COMPACT_THRESHOLD_BYTES = 2_000  # compact (rewrite attendance.csv) very often
+    service = AttendanceService(checkpoint=False)
+    pairs = [(c, s) for c in CLASSES for s in STUDENTS]
+    random.Random(n).shuffle(pairs)
+    start_evt.wait()
+
+    marked = []
+    for i, (c, s) in enumerate(pairs):
+        ok, _ = service.mark_attendance(c, s)
+        if ok:
+            marked.append((c, s))
+        if i % 7 == 0 and i // 7 < USERS_PER_WORKER:
+            service.add_user(f"w{n}_u{i // 7}", "pw", "student")
+            service.add_user(f"w{n}_tmp{i}", "pw", "student")
+            service.delete_user(f"w{n}_tmp{i}")
+    today = time.strftime("%Y-%m-%d")
+    for c, s in marked:
+        service.update_attendance(today, c, s, "Late")
+    return len(marked)
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    with tempfile.TemporaryDirectory() as folder:
+        database.set_data_dir(folder)
+        database.ensure_data_dir()
+
+        manager = multiprocessing.Manager()
+        start_evt = manager.Event()
+        with multiprocessing.Pool(n_workers) as pool:
+            results = [pool.apply_async(worker, (n, folder, start_evt)) for n in range(n_workers)]
+            time.sleep(0.5)
+            t0 = time.perf_counter()
+            start_evt.set()
+            marked = [r.get() for r in results]
+            elapsed = time.perf_counter() - t0
+        manager.shutdown()
+
+        db = database.get_backend()
+        db.compact_attendance()
+        rows = db.load_attendance_records()
+        if db is database:
+            # count raw rows so a user written twice shows up
+            with open(database.USERS_CSV, newline="", encoding="utf-8") as f:
+                users = Counter(row["username"] for row in csv.DictReader(f))
+        else:
+            users = Counter(list(db.load_users()[0]))
+
+    failures = []
+    pair_counts = Counter((r["class_name"], r["student_username"]) for r in rows)
+    expected_pairs = {(c, s) for c in CLASSES for s in STUDENTS}
+    missing = expected_pairs - set(pair_counts)
+    dupes = [p for p, k in pair_counts.items() if k > 1]
+    if missing:
+        failures.append(f"{len(missing)} attendance rows lost")
+    if dupes:
+        failures.append(f"{len(dupes)} attendance rows duplicated")
+    if sum(marked) != len(expected_pairs):
+        failures.append(f"workers reported {sum(marked)} successful marks, expected {len(expected_pairs)}")
+    not_late = sum(1 for r in rows if r["status"] != "Late")
+    if not_late:
+        failures.append(f"{not_late} status corrections lost")
+    expected_users = {f"w{n}_u{i}" for n in range(n_workers) for i in range(USERS_PER_WORKER)}
+    lost_users = expected_users - set(users)
+    if lost_users:
+        failures.append(f"{len(lost_users)} users lost")
+    if any(k > 1 for k in users.values()):
+        failures.append("duplicate users")
+    if any("_tmp" in u for u in users):
+        failures.append("deleted users came back")
+
+    print(f"{n_workers} workers, {len(rows)} attendance rows, {len(users)} users, {elapsed:.2f}s")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK: no lost or duplicated rows")
+
+
+if __name__ == "__main__":
+    main()
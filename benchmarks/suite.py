@@ -0,0 +1,340 @@
+"""
+Benchmark suite for AttendanceService and the storage functions.
+
+Generates a synthetic data folder (benchmarks.datagen), times every public
+AttendanceService method and every storage backend function on it, and
+writes the timings as JSON. Compare two result files to catch regressions
+before deploying a storage or algorithm change:
+
+    python -m benchmarks.suite run --size medium --out baseline.json
+    python -m benchmarks.suite run --size medium --out new.json --baseline baseline.json
+    python -m benchmarks.suite compare baseline.json new.json --threshold 0.25
+
+compare (and run --baseline) exits with status 1 when something regressed.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import database
+from benchmarks import datagen
+from services import AttendanceService
+
+
+def time_case(fn, repeat, setup=None):
+    """Call fn `repeat` times (running setup, untimed, before each call) and summarise in ms."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "max_ms": max(times), "runs": repeat}
+
+
+def service_cases(service, backend, out_dir, info):
+    """(name, fn, repeat, setup) for every public AttendanceService method."""
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    today = date.today().isoformat()
+    cls, student = info["sample"]  # a student on cls's roster, with a row every day
+    fresh = itertools.count()
+    classes = itertools.cycle(range(info["classes"]))
+
+    def mark():
+        service.mark_attendance(cls, f"bench_mark{next(fresh)}")
+
+    def mark_bulk():
+        service.mark_attendance_bulk(datagen.class_name(1), {f"bench_bulk{next(fresh)}": "Absent" for _ in range(100)})
+
+    statuses = itertools.cycle(["Late", "Present"])
+
+    def update():
+        service.update_attendance(yesterday, cls, student, next(statuses))
+
+    def add_user():
+        service.add_user(f"bench_user{next(fresh)}", "pw", "student")
+
+    def add_class():
+        service.add_class(f"bench_class{next(fresh)}")
+
+    doomed = []
+
+    def make_user():
+        doomed.append(f"bench_doomed{next(fresh)}")
+        service.add_user(doomed[-1], "pw", "student")
+
+    def make_class():
+        doomed.append(f"bench_doomed_class{next(fresh)}")
+        service.add_class(doomed[-1])
+
+    def trend_uncached():
+        # a different class each call, so the chart cache never answers
+        ok, render = service.trend_chart_renderer(datagen.class_name(next(classes)))
+        if ok:
+            render()
+
+    def external_append():
+        # another kiosk writes a row; refresh should pick up just that row
+        db = database.get_backend(backend)
+        db.append_attendance(today, cls, f"bench_other{next(fresh)}", "Present", "09:00:00")
+
+    service.get_trend_chart(cls)  # warm the cache (and the matplotlib import) for the cached case
+
+    cases = [
+        # full parses; checkpoint=False so they neither read nor rewrite the checkpoint
+        ("service.load", lambda: AttendanceService(backend=backend, checkpoint=False), 3, None),
+        ("service.load_lazy", lambda: AttendanceService(backend=backend, lazy=True, checkpoint=False), 3, None),
+    ]
+    if backend == "csv":
+        # start-up from a checkpoint of the service passed in (SQLite has none)
+        service.save_checkpoint()
+        cases.append(("service.load_checkpoint", lambda: AttendanceService(backend=backend), 3, None))
+    return cases + [
+        ("service.refresh_unchanged", service.refresh, 20, None),
+        ("service.refresh_after_append", service.refresh, 20, external_append),
+        # the memo is cleared before each call so these keep measuring the query itself
+        ("service.get_attendance_map_for_date", lambda: service.get_attendance_map_for_date(yesterday), 20, service.clear_memo),
+        ("service.get_class_attendance_stats", lambda: service.get_class_attendance_stats(cls), 50, service.clear_memo),
+        ("service.get_attendance_history_for_class", lambda: service.get_attendance_history_for_class(cls, 14), 50, service.clear_memo),
+        ("service.get_student_history", lambda: service.get_student_history(student), 20, service.clear_memo),
+        ("service.get_class_attendance_stats_memoized", lambda: service.get_class_attendance_stats(cls), 50, None),
+        ("service.get_student_history_memoized", lambda: service.get_student_history(student), 50, None),
+        ("service.trend_chart_render", trend_uncached, 5, None),
+        ("service.get_trend_chart_cached", lambda: service.get_trend_chart(cls), 50, None),
+        ("service.export_class_stats_to_excel",
+         lambda: service.export_class_stats_to_excel(cls, out_path=os.path.join(out_dir, "class.xlsx")), 3, None),
+        ("service.export_student_history_to_excel",
+         lambda: service.export_student_history_to_excel(student, out_path=os.path.join(out_dir, "student.xlsx")), 3, None),
+        ("service.mark_attendance", mark, 200, None),
+        ("service.mark_attendance_bulk_100", mark_bulk, 10, None),
+        ("service.update_attendance", update, 100, None),
+        ("service.add_user", add_user, 50, None),
+        ("service.add_class", add_class, 50, None),
+        ("service.delete_user", lambda: service.delete_user(doomed.pop()), 5, make_user),
+        ("service.delete_class", lambda: service.delete_class(doomed.pop()), 5, make_class),
+        ("service.flush", service.flush, 20, None),
+        # each run folds one pending correction, i.e. rewrites attendance.csv
+        ("service.compact", service.compact, 3, update),
+    ]
+
+
+def database_cases(db, info):
+    """(name, fn, repeat, setup) for every storage function the backend module has."""
+    today = date.today().isoformat()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    cls = datagen.class_name(2)
+    sample_class, sample_student = info["sample"]
+    fresh = itertools.count()
+    doomed = []
+    statuses = itertools.cycle(["Late", "Present"])
+
+    def drain(it):
+        for _ in it:
+            pass
+
+    def make_user():
+        doomed.append(f"db_doomed{next(fresh)}")
+        db.append_user(doomed[-1], "pw", "student")
+
+    def make_class():
+        doomed.append(f"db_doomed_class{next(fresh)}")
+        db.append_class(doomed[-1])
+
+    def buffered_appends():
+        db.configure_write_buffer(max_rows=64)
+        try:
+            for _ in range(64):
+                db.append_attendance(today, cls, f"db_buffered{next(fresh)}", "Present", "09:00:00")
+            db.flush_attendance()
+        finally:
+            db.configure_write_buffer()
+
+    def tail_offset():
+        return max(0, os.path.getsize(database.ATTENDANCE_CSV) - 64 * 1024)
+
+    # (case name, backend function it exercises, fn, repeat)
+    cases = [
+        ("ensure_data_dir", "ensure_data_dir", db.ensure_data_dir, 50),
+        ("load_users", "load_users", db.load_users, 10),
+        ("load_classes", "load_classes", db.load_classes, 20),
+        ("load_attendance_records", "load_attendance_records", db.load_attendance_records, 3),
+        ("iter_attendance_records", "iter_attendance_records", lambda: drain(db.iter_attendance_records()), 3),
+        ("load_attendance_updates", "load_attendance_updates", lambda: db.load_attendance_updates(), 20),
+        ("file_state", "file_state", lambda: db.file_state(database.ATTENDANCE_CSV), 100),
+        ("read_csv_tail_64k", "read_csv_tail", lambda: db.read_csv_tail(database.ATTENDANCE_CSV, tail_offset()), 20),
+        ("recent_attendance_keys", "recent_attendance_keys", lambda: db.recent_attendance_keys(yesterday), 20),
+        ("append_user", "append_user", lambda: db.append_user(f"db_user{next(fresh)}", "pw", "student"), 50),
+        ("append_class", "append_class", lambda: db.append_class(f"db_class{next(fresh)}"), 50),
+        ("append_attendance", "append_attendance",
+         lambda: db.append_attendance(today, cls, f"db_mark{next(fresh)}", "Present", "09:00:00"), 200),
+        ("append_attendance_rows_100", "append_attendance_rows",
+         lambda: db.append_attendance_rows([(today, cls, f"db_rows{next(fresh)}", "Absent", "") for _ in range(100)]), 10),
+        ("append_attendance_buffered_64", "configure_write_buffer", buffered_appends, 10),
+        ("update_attendance_record", "update_attendance_record",
+         lambda: db.update_attendance_record(yesterday, sample_class, sample_student, next(statuses)), 100),
+        ("has_attendance", "has_attendance", lambda: db.has_attendance(), 50),
+        ("find_attendance_status", "find_attendance_status",
+         lambda: db.find_attendance_status(yesterday, sample_class, sample_student), 50),
+        ("query_attendance_map", "query_attendance_map", lambda: db.query_attendance_map(yesterday), 10),
+        ("query_status_counts", "query_status_counts", lambda: db.query_status_counts(cls), 20),
+        ("query_daily_counts", "query_daily_counts", lambda: db.query_daily_counts(cls), 20),
+        ("query_student_history", "query_student_history", lambda: db.query_student_history(sample_student), 20),
+    ]
+    # skip what this backend doesn't have (query_* on CSV, read_csv_tail on SQLite, ...)
+    result = [(f"db.{name}", fn, repeat, None) for name, func, fn, repeat in cases if hasattr(db, func)]
+    if hasattr(db, "compact_attendance"):
+        result.append(("db.compact_attendance", db.compact_attendance, 3,
+                       lambda: db.update_attendance_record(yesterday, sample_class, sample_student, next(statuses))))
+    result.append(("db.delete_user", lambda: db.delete_user(doomed.pop()), 5, make_user))
+    result.append(("db.delete_class", lambda: db.delete_class(doomed.pop()), 5, make_class))
+    return result
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(args):
+    students, classes, rows = datagen.SIZES[args.size]
+    students = args.students or students
+    classes = args.classes or classes
+    rows = args.rows if args.rows is not None else rows
+    only = args.only
+    backend = args.backend or os.environ.get("CHECKMEIN_BACKEND") or "csv"
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        data_dir = os.path.join(folder, "data")
+        out_dir = os.path.join(folder, "out")
+        os.makedirs(out_dir)
+        t0 = time.perf_counter()
+        info = datagen.generate(data_dir, students=students, classes=classes, rows=rows, seed=args.seed)
+        print(f"Generated {info['rows']} rows, {students} students, {classes} classes in {time.perf_counter() - t0:.1f}s")
+        db = database.get_backend(backend)
+        if db is not database:
+            t0 = time.perf_counter()
+            db.migrate_from_csv(replace=True)
+            print(f"Migrated to {backend} in {time.perf_counter() - t0:.1f}s")
+
+        service = AttendanceService(backend=backend)
+        cases = service_cases(service, backend, out_dir, info) + database_cases(db, info)
+        for name, fn, repeat, setup in cases:
+            if only and not any(part in name for part in only):
+                continue
+            results[name] = stats = time_case(fn, max(1, int(repeat * args.repeat_scale)), setup)
+            print(f"{name:<45} {stats['median_ms']:>10.3f} ms  (min {stats['min_ms']:.3f}, {stats['runs']} runs)", flush=True)
+        if hasattr(db, "reset_connections"):
+            db.reset_connections()
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend,
+            "data": info,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        return report_regressions(baseline, report, args.threshold, args.min_ms)
+    return 0
+
+
+def report_regressions(baseline, current, threshold, min_ms):
+    """Print a side-by-side table. Returns 1 if any case got slower by more than threshold (and min_ms)."""
+    if baseline["meta"].get("data") != current["meta"].get("data") or \
+            baseline["meta"].get("backend") != current["meta"].get("backend"):
+        print("warning: baseline was taken on different data or backend; timings may not be comparable")
+    regressions = []
+    print(f"{'case':<45} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<45} {'-':>10} {new['median_ms']:>10.3f}      new")
+            continue
+        before, after = old["median_ms"], new["median_ms"]
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ""
+        if change > threshold and after - before > min_ms:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<45} {before:>10.3f} {after:>10.3f} {change:>+7.0%}{flag}")
+    for name in baseline["results"]:
+        if name not in current["results"]:
+            print(f"{name:<45} {baseline['results'][name]['median_ms']:>10.3f} {'-':>10}  missing")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    return report_regressions(baseline, current, args.threshold, args.min_ms)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description="CheckMeIN benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_compare_options(p):
+        p.add_argument("--threshold", type=float, default=0.25, help="flag cases slower by more than this fraction (default 0.25)")
+        p.add_argument("--min-ms", type=float, default=0.05, help="ignore slowdowns smaller than this many ms (noise)")
+
+    r = sub.add_parser("run", help="generate data, time everything, write JSON")
+    r.add_argument("--size", choices=sorted(datagen.SIZES), default="small", help="data size preset (default small)")
+    r.add_argument("--students", type=int, help="override the preset's student count")
+    r.add_argument("--classes", type=int, help="override the preset's class count")
+    r.add_argument("--rows", type=int, help="override the preset's attendance row count")
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--backend", choices=["csv", "sqlite"], help="storage backend (default: $CHECKMEIN_BACKEND or csv)")
+    r.add_argument("--only", action="append", metavar="TEXT", help="run only cases whose name contains TEXT (repeatable)")
+    r.add_argument("--repeat-scale", type=float, default=1.0, help="multiply every case's repeat count")
+    r.add_argument("--out", help="write results to this JSON file")
+    r.add_argument("--baseline", help="compare against this results file when done")
+    add_compare_options(r)
+    r.set_defaults(func=run)
+
+    c = sub.add_parser("compare", help="compare two results files")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    add_compare_options(c)
+    c.set_defaults(func=compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Check-in pipeline for bursts (everyone checking in at the start of a lecture).
+
+    pipeline = CheckinPipeline(service)
+    ok, msg = pipeline.submit("SWE3001", "student1")   # provisional answer, no disk I/O
+    ...
+    pipeline.close()                                   # wait for the queue to reach disk
+
+submit() checks for a duplicate against the service's cache and the check-ins
+still in flight, adds the row to the cache (so the GUI/API see it at once) and
+puts it on a bounded queue. One writer thread takes the queue in batches and
+appends each batch with the backend's append_attendance_rows, which
+re-checks duplicates against the file under the write lock (other kiosks),
+journals the batch and syncs it if configure_write_buffer(fsync=True).
+If another program marked the same student first, its row is the one kept on
+disk; stats() counts these as conflicts and the cache takes that row's status.
+
+When the queue is full, submit() waits up to `block_seconds` for room and then
+answers "Busy, try again" rather than letting memory grow without bound.
+
+A batch whose write keeps failing (disk full, permissions) is retried
+`max_retries` times and then given up: its rows are logged (logger
+"checkmein.pipeline") and returned by unwritten(), and taken back out of the
+cache so the student isn't told "Already marked" for a row that isn't on
+disk. close() waits at most `timeout` seconds, so a stuck disk can't hang the
+program at exit.
+
+The cache is changed on the thread calling submit(); the writer thread only
+touches it (under the same lock) to take back rows that were not written.
+
+stats() reports counters plus p50/p99 time-to-ack (submit returning) and
+time-to-durable (the batch holding the row written) over recent check-ins.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import instrumentation
+from instrumentation import timed
+
+# latency samples kept for the percentiles
+LATENCY_SAMPLES = 10_000
+# how long the exit handler waits for the queue to reach disk
+EXIT_TIMEOUT_SECONDS = 10.0
+
+log = logging.getLogger("checkmein.pipeline")
+
+
+def _percentile(samples, p):
+    if not samples:
+        return 0.0
+    values = sorted(samples)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class CheckinPipeline:
+    def __init__(self, service, max_pending=10_000, max_batch=500, block_seconds=0.0, retry_seconds=0.5,
+                 max_retries=10):
+        """
+        service: the AttendanceService whose cache and backend are used.
+        max_pending: check-ins allowed to wait for the writer before submit() pushes back.
+        max_batch: most rows written in one append.
+        block_seconds: how long submit() waits for room in a full queue before giving up.
+        retry_seconds: pause before retrying a batch whose write failed (e.g. disk full).
+        max_retries: retries before a failing batch is given up (see unwritten()).
+        """
+        self.service = service
+        self.max_batch = max_batch
+        self.block_seconds = block_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_pending)
+        # (date, class, student) -> row, for rows acknowledged but not written yet
+        self._in_flight = {}
+        # rows acknowledged but given up after max_retries failed writes
+        self._failed = []
+        self._reported = []  # what close() last logged as lost
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._ack_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._durable_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.counts = {"accepted": 0, "duplicate": 0, "busy": 0, "written": 0,
+                       "conflicts": 0, "batches": 0, "write_errors": 0, "failed": 0}
+        self._closed = False
+        self._stop_queued = False  # the None that tells the writer to stop has been queued
+        self._writer = threading.Thread(target=self._run, name="checkin-writer", daemon=True)
+        self._writer.start()
+        # acknowledged check-ins must not be lost when the program exits normally
+        atexit.register(self.close, EXIT_TIMEOUT_SECONDS)
+
+    @timed("pipeline.submit")
+    def submit(self, class_name, student_username, status="Present"):
+        """
+        Accept a check-in for today. Returns (True, "Marked") once it is queued and visible in the
+        service, (False, "Already marked") for a duplicate, (False, "Not enrolled in this class")
+        as AttendanceService.mark_attendance, or (False, "Busy, try again") if the queue stayed full.
+        """
+        started = time.perf_counter()
+        if self._closed:
+            return False, "Check-in is closed"
+        if not self.service.is_enrolled(class_name, student_username):
+            return False, "Not enrolled in this class"
+        now = datetime.now()
+        date_str = now.strftime("%Y-%m-%d")
+        row = (date_str, class_name, student_username, status, now.strftime("%H:%M:%S"))
+        key = row[:3]
+        with self._submit_lock:
+            if key in self._in_flight or self.service.find_status(*key) is not None:
+                self._count("duplicate")
+                return False, "Already marked"
+            try:
+                if self.block_seconds:
+                    self._queue.put((row, started), timeout=self.block_seconds)
+                else:
+                    self._queue.put_nowait((row, started))
+            except queue.Full:
+                self._count("busy")
+                return False, "Busy, try again"
+            self._in_flight[key] = row
+            self.service.add_marked_row(row)
+        self._count("accepted")
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._ack_ms.append(elapsed * 1000)
+        return True, "Marked"
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.counts[name] += n
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        rows = [row for row, _started in batch]
+        written = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                t0 = time.perf_counter()
+                written = self.service.db.append_attendance_rows(rows)
+                instrumentation.record("pipeline.write_batch", time.perf_counter() - t0)
+                break
+            except Exception as e:
+                # keep the rows (they were acknowledged) and try again
+                self._count("write_errors")
+                if attempt == self.max_retries:
+                    log.error("giving up on %d check-in(s) after %d failed writes (%s): %r",
+                              len(rows), attempt + 1, e, rows)
+                else:
+                    time.sleep(self.retry_seconds)
+        done = time.perf_counter()
+        with self._stats_lock:
+            if written is None:
+                self.counts["failed"] += len(rows)
+            else:
+                self.counts["batches"] += 1
+                self.counts["written"] += len(written)
+                # rows the backend dropped were marked by another program first
+                self.counts["conflicts"] += len(rows) - len(written)
+                self._durable_ms.extend((done - started) * 1000 for _row, started in batch)
+        if written is None:
+            dropped = rows
+        else:
+            kept = {row[:3] for row in written}
+            dropped = [row for row in rows if row[:3] not in kept]
+        with self._submit_lock:
+            if written is None:
+                self._failed.extend(rows)
+            if dropped:
+                self.service.drop_marked_rows(dropped)
+            for row in rows:
+                self._in_flight.pop(row[:3], None)
+
+    def pending(self):
+        """Check-ins acknowledged but not on disk yet."""
+        return len(self._in_flight)
+
+    def flush(self):
+        """Block until every check-in submitted so far has been written."""
+        self._queue.join()
+
+    def unwritten(self):
+        """Rows acknowledged to a caller but not on disk: given up after failed writes, or still queued."""
+        with self._submit_lock:
+            return list(self._failed) + list(self._in_flight.values())
+
+    def close(self, timeout=None):
+        """
+        Stop accepting check-ins, write out the queue and stop the writer thread, waiting at most
+        timeout seconds (None: until done). Returns unwritten(), which is empty unless writes failed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._closed = True
+        if not self._stop_queued:
+            try:
+                # a full queue behind a stuck write must not outlast the timeout either
+                self._queue.put(None, timeout=timeout)
+                self._stop_queued = True
+            except queue.Full:
+                pass  # the next close() tries again
+        self._writer.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        lost = self.unwritten()
+        if lost and lost != self._reported:
+            log.error("%d acknowledged check-in(s) were not written: %r", len(lost), lost)
+            self._reported = lost
+        return lost
+
+    def stats(self):
+        """Counters, queue depth and p50/p99 ack / durable latency in ms."""
+        with self._stats_lock:
+            ack, durable = list(self._ack_ms), list(self._durable_ms)
+            result = dict(self.counts)
+        result.update(
+            queued=self._queue.qsize(), unwritten=len(self._failed),
+            ack_p50_ms=round(_percentile(ack, 50), 3), ack_p99_ms=round(_percentile(ack, 99), 3),
+            durable_p50_ms=round(_percentile(durable, 50), 3), durable_p99_ms=round(_percentile(durable, 99), 3),
+        )
+        return result
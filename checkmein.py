@@ -0,0 +1,208 @@
+"""
+Headless command line tools for CheckMeIN (no Tk window needed).
+
+    python -m checkmein export --all-classes --all-students --out-dir exports/
+    python -m checkmein export --class "SWE3001" --student student1 --workers 4
+    python -m checkmein serve --port 8765 --batch-rows 64 --batch-ms 20
+    python -m checkmein enroll enrollments_2026s2.csv
+    python -m checkmein archive --keep-months 2
+    python -m checkmein compact
+
+Exports reuse AttendanceService. The data is loaded once in the parent
+process and the per-class / per-student workbooks are generated in a
+process pool. On platforms that fork, the workers share the parent's
+loaded data instead of reading the CSV files again.
+
+`serve` runs the JSON API for thin kiosk clients (see api_server.py).
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import database
+from services import AttendanceService
+
+# set in the parent before the pool starts; forked workers inherit it
+_service = None
+
+
+def _init_worker(backend, data_dir):
+    global _service
+    if _service is None:
+        # spawn start method (e.g. Windows): nothing inherited, load our own copy
+        if data_dir:
+            database.set_data_dir(data_dir)
+        _service = AttendanceService(backend=backend)
+    elif hasattr(_service.db, "reset_connections"):
+        # database connections must not be shared across fork
+        _service.db.reset_connections()
+
+
+def _safe_name(name):
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "export"
+
+
+def _export_one(kind, name, out_dir):
+    """Run one export in a worker. Returns (kind, name, ok, path_or_message)."""
+    try:
+        if kind == "class":
+            out = os.path.join(out_dir, f"{_safe_name(name)}_attendance.xlsx")
+            ok, info = _service.export_class_stats_to_excel(name, out_path=out)
+        else:
+            out = os.path.join(out_dir, f"{_safe_name(name)}_history.xlsx")
+            ok, info = _service.export_student_history_to_excel(name, out_path=out)
+    except Exception as e:
+        ok, info = False, f"Failed to export: {e}"
+    return kind, name, ok, info
+
+
+def run_export(args):
+    global _service
+    if args.data_dir:
+        database.set_data_dir(os.path.abspath(args.data_dir))
+
+    started = time.perf_counter()
+    _service = AttendanceService(backend=args.backend)
+    print(f"Loaded data in {time.perf_counter() - started:.2f}s")
+
+    jobs = []
+    classes = _service.classes if args.all_classes else (args.class_names or [])
+    students = _service.students if args.all_students else (args.students or [])
+    jobs += [("class", c) for c in classes]
+    jobs += [("student", s) for s in students]
+    if not jobs:
+        print("Nothing to export (use --all-classes/--all-students or --class/--student).")
+        return 1
+
+    out_dir = os.path.abspath(args.out_dir)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    workers = args.workers or os.cpu_count() or 1
+    exported = skipped = 0
+    total = len(jobs)
+
+    def report(done, result):
+        nonlocal exported, skipped
+        kind, name, ok, info = result
+        if ok:
+            exported += 1
+        else:
+            skipped += 1
+        print(f"[{done}/{total}] {kind} {name}: {info}", flush=True)
+
+    if workers <= 1 or total == 1:
+        for done, (kind, name) in enumerate(jobs, start=1):
+            report(done, _export_one(kind, name, out_dir))
+    else:
+        # fork shares the loaded service copy-on-write; fall back to the default elsewhere
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork") if "fork" in methods else None
+        data_dir = database.BASE_DIR
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(args.backend, data_dir)) as pool:
+            futures = [pool.submit(_export_one, kind, name, out_dir) for kind, name in jobs]
+            for done, fut in enumerate(as_completed(futures), start=1):
+                report(done, fut.result())
+
+    elapsed = time.perf_counter() - started
+    print(f"Exported {exported} file(s), {skipped} skipped, in {elapsed:.2f}s using {min(workers, total)} worker(s)")
+    return 0
+
+
+def run_enroll(args):
+    if args.data_dir:
+        database.set_data_dir(os.path.abspath(args.data_dir))
+    service = AttendanceService(backend=args.backend, lazy=True)
+    ok = False
+    for path in args.files:
+        file_ok, msg = service.import_enrollments(path)
+        print(f"{path}: {msg}")
+        ok = ok or file_ok
+    return 0 if ok else 1
+
+
+def run_archive(args):
+    if args.data_dir:
+        database.set_data_dir(os.path.abspath(args.data_dir))
+    service = AttendanceService(backend=args.backend, lazy=True)
+    ok, msg = service.archive(args.keep_months)
+    print(msg)
+    return 0 if ok else 1
+
+
+def run_compact(args):
+    if args.data_dir:
+        database.set_data_dir(os.path.abspath(args.data_dir))
+    service = AttendanceService(backend=args.backend, lazy=True)
+    folded = service.compact()
+    print(f"Folded {folded} status correction(s) into attendance.csv" if folded else "No pending status corrections")
+    return 0
+
+
+def run_serve(args):
+    import api_server
+
+    if args.data_dir:
+        database.set_data_dir(os.path.abspath(args.data_dir))
+    if args.batch_rows or args.batch_ms or args.fsync:
+        database.configure_write_buffer(args.batch_rows, args.batch_ms, args.fsync)
+    pipeline = {"max_pending": args.max_pending} if args.pipeline else None
+    api_server.serve(args.host, args.port, backend=args.backend, refresh_seconds=args.refresh, pipeline=pipeline)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m checkmein", description="CheckMeIN headless tools")
+    parser.add_argument("--data-dir", help="data folder (default: ./data next to the program)")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], help="storage backend (default: $CHECKMEIN_BACKEND or csv)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="write class statistics / student history workbooks")
+    export.add_argument("--all-classes", action="store_true", help="export statistics for every class")
+    export.add_argument("--all-students", action="store_true", help="export history for every student")
+    export.add_argument("--class", dest="class_names", action="append", metavar="NAME", help="export one class (repeatable)")
+    export.add_argument("--student", dest="students", action="append", metavar="USERNAME", help="export one student (repeatable)")
+    export.add_argument("--out-dir", default="exports", help="folder for the workbooks (default: ./exports)")
+    export.add_argument("--workers", type=int, default=0, help="worker processes (default: number of CPUs)")
+    export.set_defaults(func=run_export)
+
+    enroll = sub.add_parser("enroll", help="bulk-enroll students from class_name,student_username CSV files")
+    enroll.add_argument("files", nargs="+", metavar="CSV", help="CSV file(s); a header row is optional")
+    enroll.set_defaults(func=run_enroll)
+
+    archive = sub.add_parser("archive", help="move old attendance into compressed monthly files")
+    archive.add_argument("--keep-months", type=int, default=2,
+                         help="months kept in attendance.csv, this one included (default: 2)")
+    archive.set_defaults(func=run_archive)
+
+    compact = sub.add_parser("compact", help="fold pending status corrections into attendance.csv")
+    compact.set_defaults(func=run_compact)
+
+    serve = sub.add_parser("serve", help="run the JSON API server for kiosks")
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    serve.add_argument("--refresh", type=float, default=2.0, metavar="SECONDS",
+                       help="pick up changes other programs made to the data this often (0 = never, default: 2)")
+    serve.add_argument("--batch-rows", type=int, default=0, help="CSV: write check-ins in groups of this many rows")
+    serve.add_argument("--batch-ms", type=int, default=0, help="CSV: write buffered check-ins at most this many ms later")
+    serve.add_argument("--fsync", action="store_true", help="CSV: sync check-ins to disk before answering (a group at a time when batching)")
+    serve.add_argument("--pipeline", action="store_true",
+                       help="answer check-ins once queued; a writer thread saves them in batches")
+    serve.add_argument("--max-pending", type=int, default=10_000,
+                       help="with --pipeline: queued check-ins allowed before new ones get 'Busy' (default: 10000)")
+    serve.set_defaults(func=run_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,182 @@
+import atexit
 import csv
+import gzip
+import io
+import itertools
+import json
 import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+import instrumentation
+from instrumentation import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 BASE_DIR = os.path.join(os.path.dirname(__file__), "data")
 USERS_CSV = os.path.join(BASE_DIR, "users.csv")
 CLASSES_CSV = os.path.join(BASE_DIR, "classes.csv")
 ATTENDANCE_CSV = os.path.join(BASE_DIR, "attendance.csv")
+# status corrections are appended here and folded into attendance.csv by compact_attendance()
+ATTENDANCE_UPDATES_CSV = os.path.join(BASE_DIR, "attendance_updates.csv")
+# a batch of appends being written; left behind only if the writer crashed mid-batch
+ATTENDANCE_JOURNAL = os.path.join(BASE_DIR, "attendance.journal")
+# which students belong to which class; created by the first enrollment
+ENROLLMENTS_CSV = os.path.join(BASE_DIR, "enrollments.csv")
+# closed months of attendance, moved out of attendance.csv by archive_attendance()
+ARCHIVE_DIR = os.path.join(BASE_DIR, "attendance_archive")
+ARCHIVE_MANIFEST = os.path.join(ARCHIVE_DIR, "manifest.json")
+# an archive run that was interrupted; finished by the next writer
+ARCHIVE_JOURNAL = os.path.join(ARCHIVE_DIR, "archive.journal")
+
+ATTENDANCE_FIELDS = ["date", "class_name", "student_username", "status", "time_in"]
+UPDATE_FIELDS = ["date", "class_name", "student_username", "status", "updated_at"]
+ENROLLMENT_FIELDS = ["class_name", "student_username"]
+# enrollments row with this student marks a class as having a roster, so it stays empty rather
+# than falling back to every student once its last student is taken off
+ROSTER_MARKER = ""
+
+# compact automatically once the update log grows past this many bytes
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+
+# the backward scan in recent_attendance_keys stops only after this many older check-ins in a
+# row, so a late row appended out of order (a kiosk with a slow clock, a mark at 23:59:59 written
+# after midnight) doesn't hide the newer rows above it
+OUT_OF_ORDER_SLACK = 1000
+
+def set_data_dir(path):
+    """Point the module at another data folder (used by benchmarks and tools)."""
+    global BASE_DIR, USERS_CSV, CLASSES_CSV, ATTENDANCE_CSV, ATTENDANCE_UPDATES_CSV, ATTENDANCE_JOURNAL, ENROLLMENTS_CSV
+    global ARCHIVE_DIR, ARCHIVE_MANIFEST, ARCHIVE_JOURNAL
+    flush_attendance()  # buffered rows belong to the old folder
+    BASE_DIR = path
+    USERS_CSV = os.path.join(BASE_DIR, "users.csv")
+    CLASSES_CSV = os.path.join(BASE_DIR, "classes.csv")
+    ATTENDANCE_CSV = os.path.join(BASE_DIR, "attendance.csv")
+    ATTENDANCE_UPDATES_CSV = os.path.join(BASE_DIR, "attendance_updates.csv")
+    ATTENDANCE_JOURNAL = os.path.join(BASE_DIR, "attendance.journal")
+    ENROLLMENTS_CSV = os.path.join(BASE_DIR, "enrollments.csv")
+    ARCHIVE_DIR = os.path.join(BASE_DIR, "attendance_archive")
+    ARCHIVE_MANIFEST = os.path.join(ARCHIVE_DIR, "manifest.json")
+    ARCHIVE_JOURNAL = os.path.join(ARCHIVE_DIR, "archive.journal")
+
+def get_backend(name=None):
+    """
+    Return the storage module to use: this CSV module or sqlite_database.
+    Defaults to the CHECKMEIN_BACKEND environment variable, then "csv".
+    """
+    name = (name or os.environ.get("CHECKMEIN_BACKEND") or "csv").lower()
+    if name == "csv":
+        return sys.modules[__name__]
+    if name == "sqlite":
+        import sqlite_database
+        return sqlite_database
+    raise ValueError(f"Unknown storage backend: {name}")
+
+def file_state(path):
+    """Return (inode, size, mtime_ns) of a data file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+@timed("db.read_csv_tail")
+def read_csv_tail(path, offset):
+    """
+    Read the rows appended to a CSV file after byte `offset` (the header is skipped when offset is 0).
+    Returns (rows, end, state): the rows as lists of strings, the offset to continue from next time
+    (a half-written last line is left for then) and the file_state of the file that was read.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+        st = os.fstat(f.fileno())
+    instrumentation.add_bytes(read=len(data))
+    cut = data.rfind(b"\n") + 1
+    rows = []
+    if cut:
+        text = data[:cut].decode("utf-8", errors="replace")
+        if offset == 0:
+            text = text.lstrip("\ufeff")
+        rows = [row for row in csv.reader(text.splitlines()) if row]
+        if offset == 0 and rows:
+            rows.pop(0)
+    return rows, offset + cut, (st.st_ino, st.st_size, st.st_mtime_ns)
+
+# serialises writers inside this process; the lock file does the same across processes
+_process_lock = threading.RLock()
+_lock_depth = 0
+_lock_handle = None
+
+@contextmanager
+def locked():
+    """
+    Hold the exclusive write lock for the data folder. Every write goes through this, so several
+    kiosks sharing one data/ folder never interleave appends or lose rows to a rewrite.
+    Re-entrant within a process (e.g. compaction triggered from inside an update).
+    """
+    global _lock_depth, _lock_handle
+    with _process_lock:
+        if _lock_depth == 0:
+            os.makedirs(BASE_DIR, exist_ok=True)
+            handle = open(os.path.join(BASE_DIR, ".lock"), "a+b")
+            waited = time.perf_counter()
+            try:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                else:
+                    handle.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue  # LK_LOCK gives up after ~10s; keep waiting
+            except BaseException:
+                handle.close()
+                raise
+            _lock_handle = handle
+            # time spent waiting for other kiosks shows up as its own entry
+            instrumentation.record("db.lock_wait", time.perf_counter() - waited)
+        _lock_depth += 1
+        try:
+            if _lock_depth == 1:
+                # repair a batch a crashed writer left half-done before anyone appends after it
+                _recover_journal()
+                _recover_archive()
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0:
+                handle, _lock_handle = _lock_handle, None
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                    else:
+                        handle.seek(0)
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+                finally:
+                    handle.close()
 
 def ensure_data_dir():
     if not os.path.exists(BASE_DIR):
-        os.makedirs(BASE_DIR)
+        os.makedirs(BASE_DIR, exist_ok=True)
+    if (os.path.exists(USERS_CSV) and os.path.exists(CLASSES_CSV) and os.path.exists(ATTENDANCE_CSV)
+            and not os.path.exists(ATTENDANCE_JOURNAL) and not os.path.exists(ARCHIVE_JOURNAL)):
+        return
+    with locked():
+        _create_missing_files()
+
+def _create_missing_files():
     # create files with headers if missing
     if not os.path.exists(USERS_CSV):
         with open(USERS_CSV, "w", newline="", encoding="utf-8") as f:
@@ -23,8 +190,28 @@ def ensure_data_dir():
     if not os.path.exists(ATTENDANCE_CSV):
         with open(ATTENDANCE_CSV, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
-            writer.writerow(["date", "class_name", "student_username", "status", "time_in"])
+            writer.writerow(ATTENDANCE_FIELDS)
+
+def _rewrite_csv(path, fieldnames, rows):
+    """Write rows to a temp file next to path, then swap it in with an atomic rename."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+        _count_written(f, 0)
+    os.replace(tmp_path, path)
 
+# byte counters for instrumentation (cheap: one fstat/tell per file, not per row)
+def _count_read(f):
+    instrumentation.add_bytes(read=os.fstat(f.fileno()).st_size)
+
+def _count_written(f, start):
+    instrumentation.add_bytes(written=f.tell() - start)
+
+@timed("db.load_users")
 def load_users():
     ensure_data_dir()
     users = {}
@@ -38,8 +225,10 @@ def load_users():
                 students.append(row["username"])
             elif row["role"] == "lecturer":
                 lecturers.append(row["username"])
+        _count_read(f)
     return users, students, lecturers
 
+@timed("db.load_classes")
 def load_classes():
     ensure_data_dir()
     classes = {}  # class_name -> lecturer_username (may be empty)
@@ -47,29 +236,75 @@ def load_classes():
         reader = csv.DictReader(f)
         for row in reader:
             classes[row["class_name"]] = row.get("lecturer_username", "")
+        _count_read(f)
     return classes
 
-def load_attendance_records():
-    ensure_data_dir()
-    records = []
-    with open(ATTENDANCE_CSV, newline="", encoding="utf-8") as f:
+@timed("db.load_attendance_updates")
+def load_attendance_updates():
+    """Return {(date, class_name, student_username): status} from the update log, newest record winning."""
+    updates = {}
+    if not os.path.exists(ATTENDANCE_UPDATES_CSV):
+        return updates
+    with open(ATTENDANCE_UPDATES_CSV, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            records.append(row)
-    return records
+            updates[(row["date"], row["class_name"], row["student_username"])] = row["status"]
+        _count_read(f)
+    return updates
+
+def iter_attendance_records(start=None, end=None, archived=True):
+    """
+    Yield attendance rows one at a time (pending status corrections applied), without building a list.
+    start/end ('YYYY-MM-DD', inclusive) limit the rows to that range and only open the archived
+    months that overlap it; archived=False reads attendance.csv alone.
+    """
+    ensure_data_dir()
+    flush_attendance()
+    # replay pending status corrections on top of the base rows
+    updates = load_attendance_updates()
+    ranged = start is not None or end is not None
+    rows = iter_archived_records(archive_partitions(start, end), updates) if archived else ()
+    for row in itertools.chain(rows, _iter_hot_rows(updates)):
+        if ranged and ((start is not None and row["date"] < start) or (end is not None and row["date"] > end)):
+            continue
+        yield row
+
+def _iter_hot_rows(updates):
+    with open(ATTENDANCE_CSV, newline="", encoding="utf-8") as f:
+        yield from _apply_updates(csv.DictReader(f), updates)
+        _count_read(f)
+
+def _apply_updates(rows, updates):
+    for row in rows:
+        if updates:
+            key = (row["date"], row["class_name"], row["student_username"])
+            if key in updates:
+                row["status"] = updates[key]
+        yield row
 
+@timed("db.load_attendance_records")
+def load_attendance_records():
+    return list(iter_attendance_records())
+
+@timed("db.append_user")
 def append_user(username, password, role):
     ensure_data_dir()
-    with open(USERS_CSV, "a", newline="", encoding="utf-8") as f:
+    with locked(), open(USERS_CSV, "a", newline="", encoding="utf-8") as f:
+        start = f.tell()
         writer = csv.writer(f)
         writer.writerow([username, password, role])
+        _count_written(f, start)
 
+@timed("db.append_class")
 def append_class(class_name, lecturer_username=""):
     ensure_data_dir()
-    with open(CLASSES_CSV, "a", newline="", encoding="utf-8") as f:
+    with locked(), open(CLASSES_CSV, "a", newline="", encoding="utf-8") as f:
+        start = f.tell()
         writer = csv.writer(f)
         writer.writerow([class_name, lecturer_username])
+        _count_written(f, start)
 
+@timed("db.delete_user")
 def delete_user(username):
     """
     从 users.csv 里删除指定 username 对应的用户。
@@ -81,24 +316,24 @@ def delete_user(username):
     rows = []
     deleted = False
 
-    with open(USERS_CSV, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row["username"] == username:
-                deleted = True
-            else:
-                rows.append(row)
+    # read and rewrite under one lock so rows appended meanwhile by another process aren't lost
+    with locked():
+        with open(USERS_CSV, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if row["username"] == username:
+                    deleted = True
+                else:
+                    rows.append(row)
+            _count_read(f)
 
-    if deleted:
-        with open(USERS_CSV, "w", newline="", encoding="utf-8") as f:
-            fieldnames = ["username", "password", "role"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+        if deleted:
+            _rewrite_csv(USERS_CSV, ["username", "password", "role"], rows)
 
     return deleted
 
 
+@timed("db.delete_class")
 def delete_class(class_name):
     """
     从 classes.csv 里删除指定 class_name 对应的班级。
@@ -110,46 +345,548 @@ def delete_class(class_name):
     rows = []
     deleted = False
 
-    with open(CLASSES_CSV, newline="", encoding="utf-8") as f:
+    # read and rewrite under one lock so rows appended meanwhile by another process aren't lost
+    with locked():
+        with open(CLASSES_CSV, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if row["class_name"] == class_name:
+                    deleted = True
+                else:
+                    rows.append(row)
+            _count_read(f)
+
+        if deleted:
+            _rewrite_csv(CLASSES_CSV, ["class_name", "lecturer_username"], rows)
+
+    return deleted
+
+
+@timed("db.load_enrollments")
+def load_enrollments():
+    """
+    Return {class_name: [student_username, ...]} in enrollment order ({} before the first enrollment).
+    A class with a roster but nobody on it maps to [].
+    """
+    enrollments = {}
+    if not os.path.exists(ENROLLMENTS_CSV):
+        return enrollments
+    seen = set()
+    with open(ENROLLMENTS_CSV, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            if row["class_name"] == class_name:
-                deleted = True
-            else:
-                rows.append(row)
+            key = (row["class_name"], row["student_username"])
+            if key not in seen:
+                seen.add(key)
+                students = enrollments.setdefault(key[0], [])
+                if key[1] != ROSTER_MARKER:
+                    students.append(key[1])
+        _count_read(f)
+    return enrollments
 
-    if deleted:
-        with open(CLASSES_CSV, "w", newline="", encoding="utf-8") as f:
-            fieldnames = ["class_name", "lecturer_username"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+@timed("db.append_enrollments")
+def append_enrollments(pairs):
+    """
+    Enroll (class_name, student_username) pairs in one locked append, skipping pairs already in the
+    file (or repeated in pairs). Returns the pairs written.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    ensure_data_dir()
+    with locked():
+        existing = set()
+        if os.path.exists(ENROLLMENTS_CSV):
+            with open(ENROLLMENTS_CSV, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    existing.add((row["class_name"], row["student_username"]))
+                _count_read(f)
+        written = []
+        for pair in pairs:
+            pair = tuple(pair)
+            if pair not in existing:
+                existing.add(pair)
+                written.append(pair)
+        if written:
+            new_file = not os.path.exists(ENROLLMENTS_CSV)
+            with open(ENROLLMENTS_CSV, "a", newline="", encoding="utf-8") as f:
+                start = f.tell()
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(ENROLLMENT_FIELDS)
+                writer.writerows(written)
+                _count_written(f, start)
+    return written
+
+@timed("db.delete_enrollments")
+def delete_enrollments(pairs=(), class_name=None, student_username=None):
+    """
+    Remove enrollments: the given (class_name, student_username) pairs, every enrollment of
+    class_name, and/or every enrollment of student_username. Returns the number removed.
+    """
+    pairs = {tuple(p) for p in pairs}
+    if not os.path.exists(ENROLLMENTS_CSV):
+        return 0
+    kept = []
+    removed = 0
+    with locked():
+        with open(ENROLLMENTS_CSV, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if ((row["class_name"], row["student_username"]) in pairs
+                        or row["class_name"] == class_name or row["student_username"] == student_username):
+                    removed += 1
+                else:
+                    kept.append(row)
+            _count_read(f)
+        if removed:
+            _rewrite_csv(ENROLLMENTS_CSV, ENROLLMENT_FIELDS, kept)
+    return removed
 
-    return deleted
 
+def _parse_line(line):
+    text = line.rstrip(b"\r").decode("utf-8", errors="replace")
+    if not text:
+        return None
+    row = next(csv.reader([text]), None)
+    if not row or len(row) < 3:
+        return None
+    return row
 
+# (path, inode, since_date, offset read up to, keys) from the last recent_attendance_keys call
+_recent_keys = None
+
+@timed("db.recent_attendance_keys")
+def recent_attendance_keys(since_date, block_size=64 * 1024):
+    """
+    Return {(date, class_name, student_username)} for the rows at the end of attendance.csv
+    dated on or after since_date ('YYYY-MM-DD'). Check-ins are appended in roughly time order, so
+    this reads the file backwards and stops after OUT_OF_ORDER_SLACK older check-ins in a row: the
+    cost is the size of the recent tail, not the whole file. Back-dated rows (no time_in) are
+    passed over rather than counted.
+    The answer is kept, and the next call for the same date only reads rows appended since.
+    Call under locked() to get an answer that holds across processes. Do not modify the returned set.
+    """
+    global _recent_keys
+    with open(ATTENDANCE_CSV, "rb") as f:
+        st = os.fstat(f.fileno())
+        cached = _recent_keys
+        if (cached is not None and cached[:3] == (ATTENDANCE_CSV, st.st_ino, since_date)
+                and cached[3] <= st.st_size):
+            keys = cached[4]
+            if cached[3] < st.st_size:
+                rows, end, _ = read_csv_tail(ATTENDANCE_CSV, cached[3])
+                for row in rows:
+                    if len(row) >= 3 and row[0] >= since_date:
+                        keys.add((row[0], row[1], row[2]))
+                _recent_keys = (ATTENDANCE_CSV, st.st_ino, since_date, end, keys)
+            return keys
+
+        keys = set()
+        _recent_keys = (ATTENDANCE_CSV, st.st_ino, since_date, st.st_size, keys)
+        for row in _iter_recent_rows(f, st.st_size, since_date, block_size):
+            keys.add((row[0], row[1], row[2]))
+    return keys
+
+def _iter_recent_rows(f, size, since_date, block_size=64 * 1024):
+    """
+    Yield the rows of attendance.csv (open in binary as f, size bytes long) dated on or after
+    since_date, newest first, stopping after OUT_OF_ORDER_SLACK older check-ins in a row.
+    """
+    pos = size
+    leftover = b""
+    older = 0  # older check-ins seen since the last row on/after since_date
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        instrumentation.add_bytes(read=step)
+        lines = (f.read(step) + leftover).split(b"\n")
+        # the first piece may be the end of a line that started in the previous block
+        leftover = lines.pop(0) if pos > 0 else b""
+        for line in reversed(lines):
+            row = _parse_line(line)
+            if row is None or row[0] == "date":
+                continue
+            if row[0] < since_date:
+                if len(row) > 4 and row[4]:
+                    older += 1
+                    if older >= OUT_OF_ORDER_SLACK:
+                        return
+                continue  # back-dated entry (no check-in time) sits out of date order
+            older = 0
+            yield row
+
+@timed("db.recent_attendance_status")
+def recent_attendance_status(date, class_name, student_username):
+    """
+    Return the status on disk for a recent check-in (date, class, student), or None if there is
+    none. The file is read backwards as in recent_attendance_keys, so this is meant for today's
+    check-ins (e.g. one another kiosk wrote first), not for looking up history.
+    """
+    ensure_data_dir()
+    key = [date, class_name, student_username]
+    with locked(), open(ATTENDANCE_CSV, "rb") as f:
+        for row in _iter_recent_rows(f, os.fstat(f.fileno()).st_size, date):
+            if row[:3] == key:
+                status = row[3] if len(row) > 3 else ""
+                break
+        else:
+            return None
+        return load_attendance_updates().get(tuple(key), status)
+
+@timed("db.append_attendance")
 def append_attendance(date, class_name, student_username, status, time_in):
+    """
+    Append one attendance row unless (date, class, student) is already in the file.
+    The check and the append happen under the data-folder lock, so two kiosks can't
+    both mark the same student. Returns True if the row was written.
+
+    With the write buffer on (configure_write_buffer) the row is queued instead and True means
+    accepted: the check against the file, and so against other kiosks, happens when the batch is written.
+    """
+    if _write_buffer["max_rows"] or _write_buffer["max_delay_ms"]:
+        return _buffer_row((date, class_name, student_username, status, time_in))
     ensure_data_dir()
+    with locked():
+        if (date, class_name, student_username) in recent_attendance_keys(date):
+            return False
+        with open(ATTENDANCE_CSV, "a", newline="", encoding="utf-8") as f:
+            start = f.tell()
+            writer = csv.writer(f)
+            writer.writerow([date, class_name, student_username, status, time_in])
+            _count_written(f, start)
+            if _write_buffer["fsync"]:
+                f.flush()
+                os.fsync(f.fileno())
+    return True
+
+@timed("db.append_attendance_rows")
+def append_attendance_rows(rows):
+    """
+    Append many (date, class_name, student_username, status, time_in) rows in one locked write,
+    skipping any whose (date, class, student) is already in the file or earlier in the batch.
+    Returns the rows that were written.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    ensure_data_dir()
+    flush_attendance()  # keep the file in the order rows were accepted
+    return _write_batch(rows)
+
+def _write_batch(rows):
+    """Drop rows whose key is already in the file (or earlier in rows), then append the rest as one batch."""
+    since = min(r[0] for r in rows)
+    if since < datetime.now().strftime("%Y-%m-%d"):
+        # back-dated rows (a paper roll entered later) break the file's date order: check it all
+        since = ""
+    with locked():
+        seen = set(recent_attendance_keys(since))
+        if not since:
+            # a back-dated row may belong to a month that has been archived already
+            months = {r[0][:7] for r in rows}
+            parts = [p for p in load_archive_manifest() if p["month"] in months]
+            seen.update((r["date"], r["class_name"], r["student_username"]) for r in iter_archived_records(parts, {}))
+        written = []
+        for r in rows:
+            key = (r[0], r[1], r[2])
+            if key not in seen:
+                seen.add(key)
+                written.append(r)
+        if written:
+            _append_journaled(written)
+    return written
+
+def _append_journaled(rows):
+    """
+    Append rows to attendance.csv as one write. The journal records the file size before the
+    batch and the batch itself, so a crash part way leaves nothing that _recover_journal can't fix.
+    Call under locked().
+    """
+    fsync = _write_buffer["fsync"]
+    size = os.path.getsize(ATTENDANCE_CSV)
+    with open(ATTENDANCE_JOURNAL, "w", newline="", encoding="utf-8") as j:
+        writer = csv.writer(j)
+        writer.writerow([size])
+        writer.writerows(rows)
+        writer.writerow(["END"])  # without this line the batch never reached attendance.csv
+        if fsync:
+            j.flush()
+            os.fsync(j.fileno())
+        _count_written(j, 0)
     with open(ATTENDANCE_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([date, class_name, student_username, status, time_in])
+        start = f.tell()
+        csv.writer(f).writerows(rows)
+        _count_written(f, start)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.remove(ATTENDANCE_JOURNAL)
+
+def _recover_journal():
+    """Redo the batch a crashed writer left in the journal: cut attendance.csv back to where it started and append it again."""
+    if not os.path.exists(ATTENDANCE_JOURNAL):
+        return
+    with open(ATTENDANCE_JOURNAL, newline="", encoding="utf-8") as j:
+        entries = list(csv.reader(j))
+    if len(entries) >= 2 and entries[-1] == ["END"] and os.path.exists(ATTENDANCE_CSV):
+        size = int(entries[0][0])
+        with open(ATTENDANCE_CSV, "r+b") as f:
+            f.truncate(size)
+        with open(ATTENDANCE_CSV, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(entries[1:-1])
+            f.flush()
+            os.fsync(f.fileno())
+    # an incomplete journal means the crash came before attendance.csv was touched
+    os.remove(ATTENDANCE_JOURNAL)
+
+# group commit for append_attendance, off unless configure_write_buffer() turns it on
+_write_buffer = {"max_rows": 0, "max_delay_ms": 0, "fsync": False}
+_buffer_lock = threading.Lock()
+_buffer_rows = []
+_buffer_keys = set()
+_buffer_timer = None
 
+def configure_write_buffer(max_rows=0, max_delay_ms=0, fsync=False):
+    """
+    Batch append_attendance calls and write them as one group: a batch goes out once max_rows rows
+    are waiting, max_delay_ms after its first row, or on flush_attendance() (0 turns a trigger off;
+    both 0 turns buffering off). fsync=True syncs every batch (or, unbuffered, every row) to disk
+    before the write returns; otherwise the OS decides when. Rows still in memory are lost if the process is killed, but a
+    batch is never left half-written: the journal is replayed on the next write or startup.
+    """
+    flush_attendance()
+    _write_buffer.update(max_rows=max_rows, max_delay_ms=max_delay_ms, fsync=fsync)
+
+def _buffer_row(row):
+    global _buffer_timer
+    with _buffer_lock:
+        key = (row[0], row[1], row[2])
+        if key in _buffer_keys:
+            return False
+        _buffer_keys.add(key)
+        _buffer_rows.append(row)
+        full = _write_buffer["max_rows"] and len(_buffer_rows) >= _write_buffer["max_rows"]
+        if not full and _buffer_timer is None and _write_buffer["max_delay_ms"]:
+            _buffer_timer = threading.Timer(_write_buffer["max_delay_ms"] / 1000, flush_attendance)
+            _buffer_timer.daemon = True
+            _buffer_timer.start()
+    if full:
+        flush_attendance()
+    return True
+
+@timed("db.flush_attendance")
+def flush_attendance():
+    """Write buffered check-ins out now. Returns the number of rows written (duplicates are dropped)."""
+    global _buffer_rows, _buffer_timer
+    with _buffer_lock:
+        rows, _buffer_rows = _buffer_rows, []
+        _buffer_keys.clear()
+        if _buffer_timer is not None:
+            _buffer_timer.cancel()
+            _buffer_timer = None
+    if not rows:
+        return 0
+    try:
+        ensure_data_dir()
+        return len(_write_batch(rows))
+    except Exception:
+        # put the batch back so a later flush can retry it
+        with _buffer_lock:
+            _buffer_rows[:0] = rows
+            _buffer_keys.update((r[0], r[1], r[2]) for r in rows)
+        raise
+
+atexit.register(flush_attendance)
+
+@timed("db.update_attendance_record")
 def update_attendance_record(date, class_name, student_username, new_status):
+    """
+    Record a status change by appending to the update log instead of rewriting attendance.csv.
+    The caller is expected to have checked the record exists (the service does this from its index);
+    updates for unknown rows are ignored when the log is loaded.
+    """
     ensure_data_dir()
-    rows = []
-    changed = False
-    with open(ATTENDANCE_CSV, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row["date"] == date and row["class_name"] == class_name and row["student_username"] == student_username:
-                row["status"] = new_status
-                changed = True
-            rows.append(row)
-    if changed:
-        with open(ATTENDANCE_CSV, "w", newline="", encoding="utf-8") as f:
-            fieldnames = ["date", "class_name", "student_username", "status", "time_in"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+    flush_attendance()  # the row being corrected may still be buffered
+    with locked():
+        new_file = not os.path.exists(ATTENDANCE_UPDATES_CSV)
+        with open(ATTENDANCE_UPDATES_CSV, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(UPDATE_FIELDS)
+            start = f.tell()
+            writer.writerow([date, class_name, student_username, new_status, datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
+            _count_written(f, start)
+        if os.path.getsize(ATTENDANCE_UPDATES_CSV) > COMPACT_THRESHOLD_BYTES:
+            compact_attendance()
+    return True
+
+@timed("db.compact_attendance")
+def compact_attendance():
+    """
+    Fold the update log into attendance.csv (temp file + atomic rename) and clear the log.
+    Corrections to archived months are folded into their partitions.
+    Returns the number of pending updates that were folded in.
+    """
+    ensure_data_dir()
+    flush_attendance()
+    with locked():
+        if not os.path.exists(ATTENDANCE_UPDATES_CSV):
+            return 0
+        updates = load_attendance_updates()
+        _commit_archive(None, updates)
+        # if we crash before this, the log is simply replayed again (same result)
+        os.remove(ATTENDANCE_UPDATES_CSV)
+    return len(updates)
+
+
+# cold storage: one gzip-compressed CSV per closed month, listed in manifest.json
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+# (path, file_state, partitions) from the last manifest read
+_manifest_cache = None
+
+def load_archive_manifest():
+    """
+    Return the archived months, oldest first, as dicts with month ('YYYY-MM'), file, generation,
+    first and last date and rows. Empty if nothing has been archived. Do not modify the result.
+    """
+    global _manifest_cache
+    state = file_state(ARCHIVE_MANIFEST)
+    if state is None:
+        return []
+    cached = _manifest_cache
+    if cached is not None and cached[:2] == (ARCHIVE_MANIFEST, state):
+        return cached[2]
+    with open(ARCHIVE_MANIFEST, encoding="utf-8") as f:
+        partitions = json.load(f)["partitions"]
+    _manifest_cache = (ARCHIVE_MANIFEST, state, partitions)
+    return partitions
+
+def archive_partitions(start=None, end=None):
+    """Archived months whose dates overlap start..end ('YYYY-MM-DD', inclusive; None leaves that side open)."""
+    return [p for p in load_archive_manifest()
+            if (start is None or p["last"] >= start) and (end is None or p["first"] <= end)]
+
+def iter_archived_records(partitions, updates=None):
+    """Yield the rows of the given archived months (from load_archive_manifest), pending corrections applied."""
+    if updates is None:
+        updates = load_attendance_updates()
+    for p in partitions:
+        path = os.path.join(ARCHIVE_DIR, p["file"])
+        instrumentation.add_bytes(read=os.path.getsize(path))
+        with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+            yield from _apply_updates(csv.DictReader(f), updates)
+
+@timed("db.archive_attendance")
+def archive_attendance(keep_months=2):
+    """
+    Move the rows dated before the last keep_months calendar months (this month included) out of
+    attendance.csv into one compressed file per month under attendance_archive/. Pending corrections
+    are folded in as by compact_attendance(). Archived rows are still returned by
+    iter_attendance_records()/load_attendance_records(), so readers and exports see everything.
+    Returns (rows moved, months written).
+    """
+    now = datetime.now()
+    month = now.year * 12 + now.month - 1 - (max(1, int(keep_months)) - 1)
+    cutoff = f"{month // 12:04d}-{month % 12 + 1:02d}-01"
+    ensure_data_dir()
+    flush_attendance()
+    with locked():
+        result = _commit_archive(cutoff, load_attendance_updates())
+        if os.path.exists(ATTENDANCE_UPDATES_CSV):
+            os.remove(ATTENDANCE_UPDATES_CSV)
+    return result
+
+def _commit_archive(cutoff, updates):
+    """
+    Rewrite attendance.csv with updates applied and without the rows dated before cutoff (None keeps
+    them all); those rows, and corrections to months already archived, go into new copies of the
+    month partitions. Call under locked(). Returns (rows moved, months written).
+    """
+    manifest = {p["month"]: p for p in load_archive_manifest()}
+    remaining, moving = [], {}
+    for row in _iter_hot_rows(updates):
+        date = row["date"]
+        if cutoff is not None and date < cutoff and _DATE_RE.fullmatch(date):
+            moving.setdefault(date[:7], []).append(row)
+        else:
+            remaining.append(row)  # rows with a malformed date stay where they are
+    months = set(moving) | {key[0][:7] for key in updates if key[0][:7] in manifest}
+    if not months:
+        if updates:
+            _rewrite_csv(ATTENDANCE_CSV, ATTENDANCE_FIELDS, remaining)
+        return 0, 0
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    replaced = []
+    for month in sorted(months):
+        old = manifest.get(month)
+        rows = list(iter_archived_records([old], updates)) if old else []
+        keys = {(r["date"], r["class_name"], r["student_username"]) for r in rows}
+        for row in moving.get(month, ()):
+            key = (row["date"], row["class_name"], row["student_username"])
+            if key not in keys:
+                keys.add(key)
+                rows.append(row)
+        rows.sort(key=lambda r: r["date"])
+        # never overwrite a file the current manifest points at
+        generation = old["generation"] + 1 if old else 0
+        name = f"{month}.{generation}.csv.gz" if generation else f"{month}.csv.gz"
+        _write_partition(os.path.join(ARCHIVE_DIR, name), rows)
+        manifest[month] = {"month": month, "file": name, "generation": generation,
+                           "first": rows[0]["date"], "last": rows[-1]["date"], "rows": len(rows)}
+        if old:
+            replaced.append(old["file"])
+
+    # from here on _recover_archive can finish the job if we crash
+    plan = {"cutoff": cutoff, "partitions": [manifest[m] for m in sorted(manifest)], "remove": replaced}
+    _write_json(ARCHIVE_JOURNAL, plan)
+    _finish_archive(plan, remaining)
+    return sum(len(rows) for rows in moving.values()), len(months)
+
+def _finish_archive(plan, remaining=None):
+    _write_json(ARCHIVE_MANIFEST, {"partitions": plan["partitions"]})
+    cutoff = plan["cutoff"]
+    if remaining is None and cutoff and os.path.exists(ATTENDANCE_CSV):
+        # recovering: the rows before the cutoff are in the partitions already (dropping them twice is harmless)
+        with open(ATTENDANCE_CSV, newline="", encoding="utf-8") as f:
+            remaining = [row for row in csv.DictReader(f)
+                         if not (row["date"] < cutoff and _DATE_RE.fullmatch(row["date"]))]
+    if remaining is not None:
+        _rewrite_csv(ATTENDANCE_CSV, ATTENDANCE_FIELDS, remaining)
+    for name in plan["remove"]:
+        try:
+            os.remove(os.path.join(ARCHIVE_DIR, name))
+        except FileNotFoundError:
+            pass
+    os.remove(ARCHIVE_JOURNAL)
+
+def _recover_archive():
+    """Finish an archive or compaction that crashed after writing its new partitions."""
+    if not os.path.exists(ARCHIVE_JOURNAL):
+        return
+    with open(ARCHIVE_JOURNAL, encoding="utf-8") as f:
+        plan = json.load(f)
+    _finish_archive(plan)
+
+def _write_partition(path, rows):
+    with open(path, "wb") as raw:
+        with gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as gz:
+            text = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+            writer = csv.DictWriter(text, fieldnames=ATTENDANCE_FIELDS, extrasaction="ignore")
             writer.writeheader()
             writer.writerows(rows)
-    return changed
+            text.flush()
+            text.detach()
+        raw.flush()
+        os.fsync(raw.fileno())
+        _count_written(raw, 0)
 
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+        _count_written(f, 0)
+    os.replace(tmp_path, path)
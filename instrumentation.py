@@ -0,0 +1,152 @@
+"""
+Lightweight timing for the hot paths (storage functions and AttendanceService).
+
+Functions decorated with @timed("name") count their calls, total/max time and
+the bytes the storage code reports through add_bytes(). Calls slower than the
+slow threshold are logged (logger "checkmein.slow") and kept in a short list
+for the admin diagnostics tab. snapshot() / dump_json() export everything.
+
+Switches:
+  - set_enabled(False) at run time: each call then costs one flag check.
+  - CHECKMEIN_INSTRUMENT=0 in the environment before start-up: the decorator
+    returns functions untouched, so there is no overhead at all.
+  - CHECKMEIN_SLOW_MS sets the slow threshold (default 250 ms).
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# decided once at import; when off, @timed does not wrap anything
+INSTALLED = os.environ.get("CHECKMEIN_INSTRUMENT", "1").lower() not in ("0", "false", "no", "off")
+
+_enabled = INSTALLED
+_slow_ms = float(os.environ.get("CHECKMEIN_SLOW_MS") or 250)
+SLOW_LOG_SIZE = 100
+
+log = logging.getLogger("checkmein.slow")
+
+_lock = threading.Lock()
+_stats = {}  # name -> [calls, total_s, max_s, bytes_read, bytes_written, errors]
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_local = threading.local()  # per-thread stack of the ops currently running
+
+
+def timed(name):
+    """Decorator: record calls, time and bytes for the function under `name`."""
+    def decorate(fn):
+        if not INSTALLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+            frame = [name, 0, 0]  # name, bytes read, bytes written
+            stack.append(frame)
+            failed = True
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - t0
+                stack.pop()
+                _record(name, elapsed, frame[1], frame[2], failed)
+        return wrapper
+    return decorate
+
+
+def _record(name, elapsed, read, written, failed):
+    with _lock:
+        s = _stats.get(name)
+        if s is None:
+            s = _stats[name] = [0, 0.0, 0.0, 0, 0, 0]
+        s[0] += 1
+        s[1] += elapsed
+        if elapsed > s[2]:
+            s[2] = elapsed
+        s[3] += read
+        s[4] += written
+        if failed:
+            s[5] += 1
+    ms = elapsed * 1000
+    if ms >= _slow_ms:
+        entry = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "op": name, "ms": round(ms, 1),
+                 "bytes_read": read, "bytes_written": written}
+        _slow.append(entry)
+        log.warning("slow %s: %.1f ms (read %d B, wrote %d B)", name, ms, read, written)
+
+
+def record(name, seconds):
+    """Record a measurement taken by hand (for spans that aren't a whole function call)."""
+    if _enabled:
+        _record(name, seconds, 0, 0, False)
+
+
+def add_bytes(read=0, written=0):
+    """Count bytes against every timed op running on this thread (so callers include their callees)."""
+    if not _enabled:
+        return
+    for frame in getattr(_local, "stack", ()):
+        frame[1] += read
+        frame[2] += written
+
+
+def set_enabled(flag):
+    """Turn recording on/off at run time (has no effect if CHECKMEIN_INSTRUMENT=0 at start-up)."""
+    global _enabled
+    _enabled = bool(flag) and INSTALLED
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_slow_threshold(ms):
+    global _slow_ms
+    _slow_ms = float(ms)
+
+
+def slow_threshold():
+    return _slow_ms
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _slow.clear()
+
+
+def snapshot():
+    """Return the counters as plain data (sorted by total time, slowest first)."""
+    with _lock:
+        items = [(name, list(s)) for name, s in _stats.items()]
+        slow = list(_slow)
+    ops = {}
+    for name, (calls, total, peak, read, written, errors) in sorted(items, key=lambda kv: -kv[1][1]):
+        ops[name] = {
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total * 1000 / calls, 3) if calls else 0.0,
+            "max_ms": round(peak * 1000, 3),
+            "bytes_read": read,
+            "bytes_written": written,
+            "errors": errors,
+        }
+    return {"enabled": _enabled, "installed": INSTALLED, "slow_threshold_ms": _slow_ms,
+            "operations": ops, "slow": slow}
+
+
+def dump_json(path):
+    """Write snapshot() to a JSON file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    return path
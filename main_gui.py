@@ -2,13 +2,19 @@
 import tkinter
 import tkinter.ttk as ttk
 from tkinter import messagebox
+from tkinter import filedialog
 import os
 from services import AttendanceService
+import database
+import instrumentation
 from datetime import datetime
 import subprocess
 import sys
 import shutil
 import time
+import base64
+import queue
+import threading
 
 # Helper: ensure csv -> xlsx if possible and open the file with Excel (Windows).
 def open_in_excel(path):
@@ -84,7 +90,7 @@ def open_in_excel(path):
 #main GUI class
 class AttendanceApp(tkinter.Tk):
     #runs once when program starts
-    def __init__(self):
+    def __init__(self, backend=None, lazy=True):
         #runs parent class (tk.Tk) init method also the window
         super().__init__()
 
@@ -95,7 +101,9 @@ class AttendanceApp(tkinter.Tk):
 
         try:
             # Initialize service
-            self.service = AttendanceService()
+            # backend: "csv" (default) or "sqlite", see database.get_backend
+            # lazy: only users/classes are read now, attendance loads in the background
+            self.service = AttendanceService(backend=backend, lazy=lazy)
             print("Service initialized successfully")
         except Exception as e:
             messagebox.showerror("Initialization Error", f"Failed to initialize service: {str(e)}")
@@ -123,22 +131,30 @@ class AttendanceApp(tkinter.Tk):
         container.grid_rowconfigure(0, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
-        #dict to hold pages
+        #dict to hold pages, each page is only built the first time it is shown
+        self.container = container
         self.frames = {}
 
-        #create/add page to frames dict
-        for F in (LoginPage, AdminPage, LecturerPage, StudentPage):
+        #show login page first
+        self.show_frame(LoginPage)
+
+        # read attendance once the login window is up, so the first query doesn't wait for it
+        if lazy:
+            self.after_idle(self.service.load_attendance_in_background)
+
+    def get_frame(self, page_name):
+        frame = self.frames.get(page_name)
+        if frame is None:
             #create instance of page
-            frame = F(parent=container, controller=self)
-            self.frames[F] = frame
+            frame = page_name(parent=self.container, controller=self)
+            self.frames[page_name] = frame
             #place frame in grid btw stack on top of each other
             frame.grid(row=0, column=0, sticky="nsew")
-
-        #show login page first
-        self.show_frame(LoginPage)
+        return frame
 
     def show_frame(self, page_name):
-        frame = self.frames[page_name]
+        frame = self.get_frame(page_name)
+        self.current_frame = frame
         #line that bring the frame to the front
         frame.tkraise()
         # Call on_show method if it exists
@@ -150,29 +166,35 @@ class AttendanceApp(tkinter.Tk):
         username = (username or "").strip()
         password = (password or "").strip()
 
-        # ensure latest data (in case admin added user)
-        try:
-            self.service.reload()
-        except Exception:
-            pass
-        self.sync_from_service()
+        # only users.csv is checked (re-read only if another kiosk changed it)
+        role = self.service.authenticate(username, password)
+        if role is None:
+            messagebox.showerror("Login Failed", "Invalid username or password.")
+            return
+        self.current_user = username
 
-        # check if username exists
-        if username in self.service.users and self.service.users[username]['password'] == password:
-            self.current_user = username
-            role = self.service.users[username]['role']
+        #show menu based on role
+        if role == 'admin':
+            self.show_frame(AdminPage)
+        elif role == 'lecturer':
+            self.show_frame(LecturerPage)
+        elif role == 'student':
+            self.show_frame(StudentPage)
 
-            #show menu based on role
-            if role == 'admin':
-                self.show_frame(AdminPage)
-            elif role == 'lecturer':
-                self.show_frame(LecturerPage)
-            elif role == 'student':
-                self.show_frame(StudentPage)
+        # classes and attendance from other kiosks are picked up once the page is up
+        self.after_idle(self.refresh_after_login)
+        messagebox.showinfo("Login Successful", f"Welcome, {username}!")
 
-            messagebox.showinfo("Login Successful", f"Welcome, {username}!")
-        else:
-            messagebox.showerror("Login Failed", "Invalid username or password.")
+    def refresh_after_login(self):
+        try:
+            self.service.refresh()
+        except Exception:
+            pass
+        if self.service.data_version != self.synced_version:
+            self.sync_from_service()
+            # the page was drawn from what we had before the refresh
+            if self.current_user and hasattr(self.current_frame, 'on_show'):
+                self.current_frame.on_show()
 
     def logout(self):
         #log out current user and return to login page
@@ -181,12 +203,17 @@ class AttendanceApp(tkinter.Tk):
 
     def sync_from_service(self):
         # copy important lists/dicts from service for backward compatibility with UI code
+        self.synced_version = self.service.data_version
         self.users = dict(self.service.users)
         self.students = list(self.service.students)
         self.lecturers = list(self.service.lecturers)
         self.classes = list(self.service.classes)
+
+    @property
+    def attendance(self):
         # attendance_today used by UI for quick checks (class -> {student: status})
-        self.attendance = self.service.get_attendance_map_for_date()
+        # computed on demand so syncing doesn't wait for attendance to load
+        return self.service.get_attendance_map_for_date()
 
 #login page
 class LoginPage(ttk.Frame):
@@ -303,10 +330,77 @@ class AdminPage(ttk.Frame):
         self.class_name_entry = ttk.Entry(class_tab, width=40)
         self.class_name_entry.pack(pady=5, fill="x")
 
+        ttk.Label(class_tab, text="Lecturer (optional)").pack(pady=5, anchor="w")
+        self.class_lecturer_combobox = ttk.Combobox(class_tab, state="readonly", width=38)
+        self.class_lecturer_combobox.pack(pady=5, fill="x")
+
         add_class_btn = ttk.Button(class_tab, text="Add Class", command=self.add_class)
         add_class_btn.pack(pady=10)
 
-        #tab 4: logout button (button)
+        #tab 4: enrollment (class roster and lecturer)
+        enroll_tab = ttk.Frame(notebook, padding="10")
+        notebook.add(enroll_tab, text="Enrollment")
+
+        ttk.Label(enroll_tab, text="Class").pack(pady=2, anchor="w")
+        self.enroll_class_combobox = ttk.Combobox(enroll_tab, state="readonly", width=38)
+        self.enroll_class_combobox.pack(pady=2, fill="x")
+        self.enroll_class_combobox.bind("<<ComboboxSelected>>", lambda e: self.show_enrollment())
+        self.enroll_info_label = ttk.Label(enroll_tab, text="")
+        self.enroll_info_label.pack(pady=2, anchor="w")
+
+        lecturer_row = ttk.Frame(enroll_tab)
+        lecturer_row.pack(fill="x", pady=4)
+        ttk.Label(lecturer_row, text="Lecturer").pack(side="left")
+        self.enroll_lecturer_combobox = ttk.Combobox(lecturer_row, state="readonly", width=24)
+        self.enroll_lecturer_combobox.pack(side="left", padx=5)
+        ttk.Button(lecturer_row, text="Set Lecturer", command=self.set_lecturer).pack(side="left", padx=5)
+
+        ttk.Label(enroll_tab, text="Student usernames (comma or one per line)").pack(pady=2, anchor="w")
+        self.enroll_students_text = tkinter.Text(enroll_tab, height=4, width=40)
+        self.enroll_students_text.pack(pady=2, fill="x")
+
+        enroll_buttons = ttk.Frame(enroll_tab)
+        enroll_buttons.pack(fill="x", pady=4)
+        ttk.Button(enroll_buttons, text="Enroll", command=self.enroll_students).pack(side="left", padx=4)
+        ttk.Button(enroll_buttons, text="Remove", command=self.unenroll_students).pack(side="left", padx=4)
+        ttk.Button(enroll_buttons, text="Import CSV...", command=self.import_enrollments).pack(side="left", padx=4)
+
+        #tab 5: diagnostics (timings of storage/service calls)
+        diag_tab = ttk.Frame(notebook, padding="10")
+        notebook.add(diag_tab, text="Diagnostics")
+
+        diag_controls = ttk.Frame(diag_tab)
+        diag_controls.pack(fill="x")
+        self.instrument_var = tkinter.BooleanVar(value=instrumentation.is_enabled())
+        instrument_check = ttk.Checkbutton(diag_controls, text="Enable instrumentation",
+                                           variable=self.instrument_var, command=self.toggle_instrumentation)
+        if not instrumentation.INSTALLED:
+            # CHECKMEIN_INSTRUMENT=0 at start-up: nothing is wrapped, so nothing to switch on
+            instrument_check.state(["disabled"])
+        instrument_check.pack(side="left")
+        ttk.Button(diag_controls, text="Refresh", command=self.refresh_diagnostics).pack(side="left", padx=4)
+        ttk.Button(diag_controls, text="Reset", command=self.reset_diagnostics).pack(side="left", padx=4)
+        ttk.Button(diag_controls, text="Export JSON...", command=self.export_diagnostics).pack(side="left", padx=4)
+
+        diag_columns = ("calls", "total", "avg", "max", "read", "written", "errors")
+        self.diag_tree = ttk.Treeview(diag_tab, columns=diag_columns, height=8)
+        self.diag_tree.heading("#0", text="Operation")
+        self.diag_tree.column("#0", width=220)
+        for col, text in zip(diag_columns, ("Calls", "Total ms", "Avg ms", "Max ms", "Read KB", "Written KB", "Errors")):
+            self.diag_tree.heading(col, text=text)
+            self.diag_tree.column(col, width=80, anchor="e")
+        self.diag_tree.pack(fill="both", expand=True, pady=5)
+
+        self.slow_label = ttk.Label(diag_tab, text="Slow operations")
+        self.slow_label.pack(anchor="w")
+        self.slow_listbox = tkinter.Listbox(diag_tab, height=4)
+        self.slow_listbox.pack(fill="x")
+
+        # memoized service queries (attendance map, class stats, history, trends)
+        self.memo_label = ttk.Label(diag_tab, text="Query cache")
+        self.memo_label.pack(anchor="w", pady=(5, 0))
+
+        #logout button (button)
         logout_button = ttk.Button(main_frame, text="Logout", command=self.controller.logout)
         logout_button.pack(pady=10, anchor="e", side="bottom")
 
@@ -344,6 +438,7 @@ class AdminPage(ttk.Frame):
 
         # initial populate
         self.populate_lists()
+        self.refresh_diagnostics()
 
     #admin functions
     def add_student(self):
@@ -409,7 +504,7 @@ class AdminPage(ttk.Frame):
             messagebox.showwarning("Input Error", "Class name cannot be empty.")
             return
 
-        success, msg = self.controller.service.add_class(class_name, "")
+        success, msg = self.controller.service.add_class(class_name, self.class_lecturer_combobox.get())
         if not success:
             messagebox.showerror("Error", msg)
             return
@@ -417,9 +512,12 @@ class AdminPage(ttk.Frame):
         self.populate_lists()
         messagebox.showinfo("Success", f"Class '{class_name}' added successfully.")
         self.class_name_entry.delete(0, 'end')
-        #update dropdowns
-        self.controller.frames[LecturerPage].update_class_list()
-        self.controller.frames[StudentPage].update_class_list()
+        self.class_lecturer_combobox.set('')
+        #update dropdowns (pages not built yet pick up the new class when they are)
+        if LecturerPage in self.controller.frames:
+            self.controller.frames[LecturerPage].update_class_list()
+        if StudentPage in self.controller.frames:
+            self.controller.frames[StudentPage].update_class_list()
 
     def delete_selected_user(self):
         sel = None
@@ -517,14 +615,10 @@ class AdminPage(ttk.Frame):
         # refresh controller and other UI lists
         self.controller.sync_from_service()
         # update lecturer & student pages' class lists if present
-        try:
+        if LecturerPage in self.controller.frames:
             self.controller.frames[LecturerPage].update_class_list()
-        except Exception:
-            pass
-        try:
+        if StudentPage in self.controller.frames:
             self.controller.frames[StudentPage].update_class_list()
-        except Exception:
-            pass
         self.populate_lists()
         messagebox.showinfo("Deleted", f"Class '{class_name}' deleted.")
 
@@ -549,12 +643,144 @@ class AdminPage(ttk.Frame):
         for cname in self.controller.service.classes:
             self.classes_listbox.insert('end', cname)
 
+        # class / lecturer pickers ("" = no lecturer)
+        lecturers = [""] + list(self.controller.service.lecturers)
+        self.class_lecturer_combobox['values'] = lecturers
+        self.enroll_lecturer_combobox['values'] = lecturers
+        self.enroll_class_combobox['values'] = self.controller.service.classes
+        if self.enroll_class_combobox.get() not in self.controller.service.classes_map:
+            self.enroll_class_combobox.set('')
+        self.show_enrollment()
+
+    # enrollment tab
+    def show_enrollment(self):
+        class_name = self.enroll_class_combobox.get()
+        service = self.controller.service
+        if not class_name:
+            self.enroll_info_label.config(text="Pick a class to see its lecturer and roster size.")
+            self.enroll_lecturer_combobox.set('')
+            return
+        if class_name in service.enrollments:
+            roster = f"{len(service.enrollments[class_name])} student(s) enrolled"
+        else:
+            roster = "no enrollments yet (every student is listed)"
+        self.enroll_info_label.config(text=roster)
+        self.enroll_lecturer_combobox.set(service.classes_map.get(class_name, ""))
+
+    def _entered_students(self):
+        text = self.enroll_students_text.get("1.0", "end")
+        return [name.strip() for name in text.replace(",", "\n").splitlines() if name.strip()]
+
+    def set_lecturer(self):
+        class_name = self.enroll_class_combobox.get()
+        if not class_name:
+            messagebox.showwarning("Input Error", "Please select a class.")
+            return
+        ok, msg = self.controller.service.set_class_lecturer(class_name, self.enroll_lecturer_combobox.get())
+        if not ok:
+            messagebox.showerror("Error", msg)
+            return
+        self.controller.sync_from_service()
+        self.show_enrollment()
+        messagebox.showinfo("Lecturer", msg)
+
+    def enroll_students(self):
+        class_name = self.enroll_class_combobox.get()
+        students = self._entered_students()
+        if not class_name or not students:
+            messagebox.showwarning("Input Error", "Select a class and enter at least one student username.")
+            return
+        ok, msg = self.controller.service.enroll_students(class_name, students)
+        if ok:
+            messagebox.showinfo("Enrollment", msg)
+            self.enroll_students_text.delete("1.0", "end")
+        else:
+            messagebox.showwarning("Enrollment", msg)
+        self.show_enrollment()
+
+    def unenroll_students(self):
+        class_name = self.enroll_class_combobox.get()
+        students = self._entered_students()
+        if not class_name or not students:
+            messagebox.showwarning("Input Error", "Select a class and enter at least one student username.")
+            return
+        ok, msg = self.controller.service.unenroll_students(class_name, students)
+        if ok:
+            messagebox.showinfo("Enrollment", msg)
+        else:
+            messagebox.showwarning("Enrollment", msg)
+        self.show_enrollment()
+
+    def import_enrollments(self):
+        path = filedialog.askopenfilename(
+            parent=self,
+            title="Import enrollments (class_name,student_username)",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        ok, msg = self.controller.service.import_enrollments(path)
+        if ok:
+            messagebox.showinfo("Import Enrollments", msg)
+        else:
+            messagebox.showwarning("Import Enrollments", msg)
+        self.show_enrollment()
+
     def on_show(self):
         """Called when Admin page is shown — refresh lists."""
         self.populate_lists()
+        self.refresh_diagnostics()
+
+    # diagnostics tab
+    def refresh_diagnostics(self):
+        snap = instrumentation.snapshot()
+        self.diag_tree.delete(*self.diag_tree.get_children())
+        for name, op in snap["operations"].items():
+            self.diag_tree.insert("", "end", text=name, values=(
+                op["calls"], f"{op['total_ms']:.1f}", f"{op['avg_ms']:.3f}", f"{op['max_ms']:.1f}",
+                f"{op['bytes_read'] / 1024:.1f}", f"{op['bytes_written'] / 1024:.1f}", op["errors"]))
+        self.slow_label.config(text=f"Slow operations (over {snap['slow_threshold_ms']:g} ms)")
+        self.slow_listbox.delete(0, 'end')
+        for entry in reversed(snap["slow"]):
+            self.slow_listbox.insert('end', f"{entry['time']}  {entry['op']}  {entry['ms']} ms")
+        if hasattr(self.controller.service, 'memo_stats'):
+            memo = self.controller.service.memo_stats()
+            self.memo_label.config(text=(
+                f"Query cache: {memo['hits']} hits, {memo['misses']} misses ({memo['hit_rate']:.0%}), "
+                f"{memo['entries']} entries, {memo['bytes'] / 1024:.0f} of {memo['max_bytes'] / 1024:.0f} KB, "
+                f"{memo['evictions']} evicted"))
+
+    def reset_diagnostics(self):
+        instrumentation.reset()
+        if hasattr(self.controller.service, 'clear_memo'):
+            self.controller.service.clear_memo()
+        self.refresh_diagnostics()
+
+    def toggle_instrumentation(self):
+        instrumentation.set_enabled(self.instrument_var.get())
+        self.instrument_var.set(instrumentation.is_enabled())
+
+    def export_diagnostics(self):
+        path = filedialog.asksaveasfilename(
+            parent=self,
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json")],
+            initialfile="checkmein_diagnostics.json",
+        )
+        if not path:
+            return
+        try:
+            instrumentation.dump_json(path)
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Failed to write diagnostics: {e}")
+            return
+        messagebox.showinfo("Exported", f"Diagnostics saved to: {path}")
 
 #lecturer menu
 class LecturerPage(ttk.Frame):
+    # roster rows shown at once; the table only ever holds one page
+    PAGE_SIZE = 200
+
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
@@ -601,6 +827,21 @@ class LecturerPage(ttk.Frame):
         self.export_btn = ttk.Button(actions_frame, text="Export Excel", command=self.export_class_excel, width=12)
         self.export_btn.pack(side="left", padx=6)
 
+        # bulk marking: pick rows in the roster (ctrl/shift-click) or mark the whole class
+        mark_frame = ttk.Frame(main_frame)
+        mark_frame.pack(fill="x", pady=4, padx=5)
+        ttk.Label(mark_frame, text="Mark as:").pack(side="left", padx=5)
+        self.bulk_status_combobox = ttk.Combobox(
+            mark_frame,
+            values=["Present", "Absent", "Late", "Excused"],
+            state="readonly",
+            width=12
+        )
+        self.bulk_status_combobox.set("Present")
+        self.bulk_status_combobox.pack(side="left", padx=5)
+        ttk.Button(mark_frame, text="Mark Selected", command=self.mark_selected, width=14).pack(side="left", padx=6)
+        ttk.Button(mark_frame, text="Mark All", command=self.mark_all, width=10).pack(side="left", padx=6)
+
         #attendance display area
         #show in table format
 
@@ -610,7 +851,12 @@ class LecturerPage(ttk.Frame):
 
         #column
         columns = ("student", "status")
-        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings")
+        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", selectmode="extended")
+        self.roster = []  # every student of the class shown, in display order
+        self.roster_members = set()
+        self.roster_class = None
+        self.roster_marks = {}  # student -> status for the shown class and date (unmarked students are absent)
+        self.page = 0  # visible rows are roster[page * PAGE_SIZE:(page + 1) * PAGE_SIZE], their item ids
 
         #heading
         self.tree.heading("student", text="Student Username")
@@ -627,6 +873,21 @@ class LecturerPage(ttk.Frame):
         #tags for coloring rows
         self.tree.tag_configure('Present', background='lightgreen')
         self.tree.tag_configure('Absent', background='lightcoral')
+        # marked Absent on purpose (e.g. a bulk mark), as opposed to not marked yet
+        self.tree.tag_configure('MarkedAbsent', background='indianred', foreground='white')
+
+        #paging and totals under the table
+        nav_frame = ttk.Frame(main_frame)
+        nav_frame.pack(fill="x", padx=5)
+        self.prev_btn = ttk.Button(nav_frame, text="< Prev", command=lambda: self.show_page(self.page - 1), width=8)
+        self.prev_btn.pack(side="left")
+        self.page_label = ttk.Label(nav_frame, text="")
+        self.page_label.pack(side="left", padx=8)
+        self.next_btn = ttk.Button(nav_frame, text="Next >", command=lambda: self.show_page(self.page + 1), width=8)
+        self.next_btn.pack(side="left")
+        self.totals_label = ttk.Label(nav_frame, text="")
+        self.totals_label.pack(side="right", padx=5)
+        self._update_nav()
 
         #logout button
         logout_button = ttk.Button(main_frame, text="Logout", command=self.controller.logout)
@@ -639,42 +900,120 @@ class LecturerPage(ttk.Frame):
             messagebox.showwarning("Input Error", "Please select a class.")
             return
 
-        #clear old data from table (treeview)
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
+        # the roster is just the list of names; rows are only built for the page on screen
+        if hasattr(self.controller.service, 'roster'):
+            self.roster = self.controller.service.roster(selected_class)
+        else:
+            self.roster = list(dict.fromkeys(self.controller.students))  # listed twice in users.csv -> once
+        self.roster_members = set(self.roster)
+        self.roster_class = selected_class
         attendance_map = self.controller.service.get_attendance_map_for_date()
-        class_records = attendance_map.get(selected_class, {})
+        self.roster_marks = dict(attendance_map.get(selected_class, {}))
+        self.show_page(0)
+
+    def _row_values(self, student):
+        # display as "username (FullName)" if available
+        info = self.controller.service.users.get(student, {}) if hasattr(self.controller.service, 'users') else {}
+        display_name = info.get('display_name') if info else None
+        display_label = f"{student} ({display_name})" if display_name else student
+        status = self.roster_marks.get(student)
+        if status is None:
+            return (display_label, "Absent"), ("Absent",)
+        if status == "Present":
+            return (display_label, status), ("Present",)
+        if status == "Absent":
+            return (display_label, status), ("MarkedAbsent",)
+        return (display_label, status), ()
+
+    def show_page(self, page):
+        """Fill the table with one page of the roster (clamped to the pages that exist)."""
+        pages = max(1, -(-len(self.roster) // self.PAGE_SIZE))
+        self.page = min(max(page, 0), pages - 1)
 
-        present_count = 0
-        absent_count = 0
-
-        if not self.controller.students:
-            self.tree.insert('', 'end', values=("No students found.", ""), tags=())
+        #clear old data from table (treeview)
+        self.tree.delete(*self.tree.get_children())
+        if not self.roster:
+            if self.roster_class is not None:
+                self.tree.insert('', 'end', values=("No students found.", ""), tags=())
+        else:
+            start = self.page * self.PAGE_SIZE
+            for student in self.roster[start:start + self.PAGE_SIZE]:
+                values, tags = self._row_values(student)
+                # the username is the item id, so bulk marking can read it back from the selection
+                self.tree.insert('', 'end', iid=student, values=values, tags=tags)
+            self.tree.yview_moveto(0)
+        self._update_nav()
+
+    def _update_nav(self):
+        total = len(self.roster)
+        start = self.page * self.PAGE_SIZE
+        if total:
+            self.page_label.config(text=f"Students {start + 1}-{min(start + self.PAGE_SIZE, total)} of {total}")
+        else:
+            self.page_label.config(text="")
+        self.prev_btn.config(state="normal" if self.page > 0 else "disabled")
+        self.next_btn.config(state="normal" if start + self.PAGE_SIZE < total else "disabled")
+        if self.roster_class is None:
+            self.totals_label.config(text="")
             return
+        # marked students come from the day's records (a handful per class), not from the table rows
+        present = other = 0
+        for student, status in self.roster_marks.items():
+            if student in self.roster_members:
+                if status == "Present":
+                    present += 1
+                elif status != "Absent":
+                    other += 1  # Late / Excused
+        text = f"Total Present: {present}    Total Absent: {total - present - other}"
+        if other:
+            text += f"    Late/Excused: {other}"
+        self.totals_label.config(text=text)
+
+    def refresh_statuses(self):
+        """Re-read today's marks for the shown class and update only the rows that changed."""
+        if self.roster_class is None:
+            return
+        attendance_map = self.controller.service.get_attendance_map_for_date()
+        marks = dict(attendance_map.get(self.roster_class, {}))
+        changed = [s for s in set(marks) | set(self.roster_marks) if marks.get(s) != self.roster_marks.get(s)]
+        self.roster_marks = marks
+        for student in changed:
+            if self.tree.exists(student):
+                values, tags = self._row_values(student)
+                self.tree.item(student, values=values, tags=tags)
+        self._update_nav()
+
+    def mark_selected(self):
+        selected = [item for item in self.tree.selection() if item in self.roster_members]
+        if not selected:
+            messagebox.showwarning("Input Error", "Select one or more students in the list first.")
+            return
+        self._mark_bulk(selected)
 
-        # Insert per-student rows showing username and optional full name
-        for student in self.controller.students:
-            # display as "username (FullName)" if available
-            info = self.controller.service.users.get(student, {}) if hasattr(self.controller.service, 'users') else {}
-            display_name = info.get('display_name') if info else None
-            display_label = f"{student} ({display_name})" if display_name else student
-
-            if student in class_records:
-                status = class_records[student]
-                tag = "Present" if status == "Present" else ""
-                present_count += 1
-            else:
-                status = "Absent"
-                tag = "Absent"
-                absent_count += 1
-            self.tree.insert('', 'end', values=(display_label, status), tags=(tag,))
+    def mark_all(self):
+        if not self.roster:
+            messagebox.showwarning("Input Error", "Click View Attendance to load the class list first.")
+            return
+        status = self.bulk_status_combobox.get()
+        if not messagebox.askyesno("Mark All", f"Mark every unmarked student in this class as {status}?"):
+            return
+        self._mark_bulk(self.roster)
 
-        # separator and totals
-        self.tree.insert('', 'end', values=("", ""), tags=())
-        self.tree.insert('', 'end', values=("Total Present:", present_count), tags=())
-        self.tree.insert('', 'end', values=("Total Absent:", absent_count), tags=())
-        # Also keep overall stats available; do not erase the student list.
+    def _mark_bulk(self, students):
+        selected_class = self.class_combobox.get()
+        if not selected_class:
+            messagebox.showwarning("Input Error", "Please select a class.")
+            return
+        status = self.bulk_status_combobox.get() or "Present"
+        ok, msg = self.controller.service.mark_attendance_bulk(selected_class, {s: status for s in students})
+        if ok:
+            messagebox.showinfo("Attendance", msg)
+        else:
+            messagebox.showwarning("Attendance", msg)
+        if selected_class == self.roster_class:
+            self.refresh_statuses()
+        else:
+            self.view_attendance()
 
     def export_class_excel(self):
         selected_class = self.class_combobox.get()
@@ -708,29 +1047,77 @@ class LecturerPage(ttk.Frame):
         if not selected_class:
             messagebox.showwarning("Input Error", "Please select a class.")
             return
-        ok, out = self.controller.service.plot_attendance_trend(selected_class)
+        # chart data is collected here; drawing happens on a worker thread so the window stays responsive
+        ok, render = self.controller.service.trend_chart_renderer(selected_class)
         if not ok:
-            messagebox.showinfo("No Data", out)
+            messagebox.showinfo("No Data", render)
+            return
+        self.trend_button.config(state="disabled")
+        results = queue.Queue()
+
+        def work():
+            try:
+                results.put((True, render()))
+            except Exception as e:
+                results.put((False, f"Failed to draw chart: {e}"))
+
+        threading.Thread(target=work, daemon=True).start()
+        self.after(50, self._poll_trend, selected_class, results)
+
+    def _poll_trend(self, selected_class, results):
+        # Tk widgets must only be touched from the main thread, so check back via after()
+        try:
+            ok, out = results.get_nowait()
+        except queue.Empty:
+            self.after(50, self._poll_trend, selected_class, results)
+            return
+        self.trend_button.config(state="normal")
+        if not ok:
+            messagebox.showerror("Trend Error", out)
             return
-        # open image in new window
+        # open image in new window (straight from the PNG bytes, no file involved)
         plot_window = tkinter.Toplevel(self)
         plot_window.title(f"Attendance Trend - {selected_class}")
         try:
-            img = tkinter.PhotoImage(file=out)
+            img = tkinter.PhotoImage(data=base64.b64encode(out))
             label = ttk.Label(plot_window, image=img)
             label.image = img
             label.pack()
-        except Exception:
-            ttk.Label(plot_window, text=f"Plot saved to: {out}").pack()
+        except Exception as e:
+            ttk.Label(plot_window, text=f"Unable to show chart: {e}").pack()
+        save_btn = ttk.Button(plot_window, text="Save Chart...",
+                              command=lambda: self.save_trend(plot_window, selected_class, out))
+        save_btn.pack(pady=5)
+
+    def save_trend(self, plot_window, selected_class, png):
+        # only writes to disk when the user asks for it
+        path = filedialog.asksaveasfilename(
+            parent=plot_window,
+            defaultextension=".png",
+            filetypes=[("PNG image", "*.png")],
+            initialfile=f"{selected_class}_trend.png",
+        )
+        if not path:
+            return
+        try:
+            with open(path, "wb") as f:
+                f.write(png)
+        except Exception as e:
+            messagebox.showerror("Save Error", f"Failed to save chart: {e}", parent=plot_window)
+            return
+        messagebox.showinfo("Saved", f"Chart saved to: {path}", parent=plot_window)
 
     def on_show(self):
         # refresh class list and enable buttons so they are visible
         self.update_class_list()
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.roster = []
+        self.roster_members = set()
+        self.roster_class = None
+        self.roster_marks = {}
+        self.show_page(0)
         self.class_combobox.set('')
         # enable/disable action buttons depending on whether classes exist
-        has = bool(self.controller.classes)
+        has = bool(self.class_combobox['values'])
         state = "normal" if has else "disabled"
         try:
             self.trend_button.config(state=state)
@@ -743,7 +1130,13 @@ class LecturerPage(ttk.Frame):
         #refresh class list in combobox
         # ensure controller has latest data
         self.controller.sync_from_service()
-        self.class_combobox['values'] = self.controller.classes
+        service = self.controller.service
+        user = self.controller.current_user
+        # lecturers see their own classes and unassigned ones; anyone else sees them all
+        if hasattr(service, 'classes_for_lecturer') and service.users.get(user, {}).get('role') == 'lecturer':
+            self.class_combobox['values'] = service.classes_for_lecturer(user)
+        else:
+            self.class_combobox['values'] = self.controller.classes
 
 #student menu
 class StudentPage(ttk.Frame):
@@ -804,7 +1197,13 @@ class StudentPage(ttk.Frame):
 
     def update_class_list(self):
         #refresh class list in combobox
-        self.class_combobox['values'] = self.controller.classes
+        service = self.controller.service
+        user = self.controller.current_user
+        # only the classes this student is enrolled in, plus those without a roster
+        if user and hasattr(service, 'classes_for_student'):
+            self.class_combobox['values'] = service.classes_for_student(user)
+        else:
+            self.class_combobox['values'] = self.controller.classes
 
     def export_history(self):
         if not self.controller.current_user:
@@ -841,9 +1240,21 @@ class StudentPage(ttk.Frame):
         self.class_combobox.set('')
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="CheckMeIN Attendance Management System")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], help="storage backend (default: $CHECKMEIN_BACKEND or csv)")
+    parser.add_argument("--batch-rows", type=int, default=0, help="CSV: write check-ins in groups of this many rows")
+    parser.add_argument("--batch-ms", type=int, default=0, help="CSV: write buffered check-ins at most this many ms later")
+    parser.add_argument("--fsync", action="store_true", help="CSV: sync check-ins to disk before answering (a group at a time when batching)")
+    args = parser.parse_args()
+    if args.batch_rows or args.batch_ms or args.fsync:
+        database.configure_write_buffer(args.batch_rows, args.batch_ms, args.fsync)
     try:
-        app = AttendanceApp()
+        app = AttendanceApp(backend=args.backend)
         app.mainloop()
+        # the next start-up reads this instead of parsing every CSV again
+        if hasattr(app, "service"):
+            app.service.save_checkpoint()
     except Exception as e:
         print(f"Fatal error: {str(e)}")
 
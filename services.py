@@ -1,252 +1,1246 @@
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta, date
+import csv
 import database
+import functools
+import hashlib
 import os
+import pickle
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+from collections import OrderedDict
+from attendance_store import AttendanceStore, NO_DATE
+from instrumentation import timed
+
+# how many rendered trend charts to keep (least recently used are dropped first)
+CHART_CACHE_SIZE = 16
+
+# snapshot of the loaded state (see save_checkpoint), kept in this user's own cache folder
+# rather than the data folder, which kiosks may share: unpickling a file runs code from it.
+# CHECKMEIN_CACHE_DIR overrides the folder; bump the version when the saved attributes change
+# so older files are ignored
+CHECKPOINT_VERSION = 3
+
+# memory allowed for memoized query results (least recently used are dropped first)
+MEMO_MAX_BYTES = 32 * 1024 * 1024
+
+
+def _approx_size(value):
+    """Rough bytes held by a query result: the containers plus everything in them."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _approx_size(k) + _approx_size(v)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            size += _approx_size(v)
+    return size
+
+
+def memoized(fn):
+    """
+    Cache a read query of AttendanceService by (method, arguments, today's date) until
+    data_version moves. Callers share the cached result, so they must not modify it.
+    Backends that answer queries themselves (SQLite) are never cached: other kiosks write
+    to the same database without moving our data_version.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self._pushdown:
+            return fn(self, *args, **kwargs)
+        # today is part of the key: "today" and "the last N days" move at midnight
+        key = (name, args, tuple(sorted(kwargs.items())), date.today().toordinal())
+        try:
+            hash(key)
+        except TypeError:
+            return fn(self, *args, **kwargs)
+        version = self.data_version
+        with self._memo_lock:
+            if self._memo_version == version:
+                entry = self._memo.get(key)
+                if entry is not None:
+                    self._memo.move_to_end(key)
+                    self.memo_counts["hits"] += 1
+                    return entry[0]
+            self.memo_counts["misses"] += 1
+        value = fn(self, *args, **kwargs)
+        self._memo_store(key, version, value)
+        return value
+    return wrapper
 
 class AttendanceService:
-    def __init__(self):
-        database.ensure_data_dir()
-        self.reload()
+    def __init__(self, backend=None, lazy=False, checkpoint=True):
+        """
+        lazy=True loads only users and classes up front; attendance is read on first use
+        or by load_attendance_in_background() (the GUI does this so login appears quickly).
+        checkpoint=True starts from the last save_checkpoint() when it matches the data folder,
+        reading only what was appended to the files since (CSV storage only).
+        """
+        # storage module: database (CSV files) or sqlite_database, see database.get_backend
+        self.db = database.get_backend(backend)
+        # backends with query_* helpers answer attendance queries themselves,
+        # so we keep only users/classes in memory for them
+        self._pushdown = hasattr(self.db, "query_daily_counts")
+        # backends that move closed months to cold storage; those are read only when a query needs them
+        self._partitioned = hasattr(self.db, "archive_partitions")
+        self.lazy = lazy
+        self.db.ensure_data_dir()
+        # path -> (inode, offset read up to, mtime_ns), or None if the file didn't exist;
+        # refresh() reads on from the offset instead of re-parsing whole files
+        self._file_stamps = {}
+        self._attendance = None
+        self._attendance_thread = None
+        self._attendance_lock = threading.Lock()
+        # bumped on every change to the data, so caches keyed on it go stale by themselves
+        self.data_version = 0
+        # (class_name, days, data_version) -> PNG bytes, in LRU order
+        self._chart_cache = OrderedDict()
+        self._chart_lock = threading.Lock()
+        # one matplotlib figure reused for every chart; the lock keeps renders from interleaving
+        self._trend_figure = None
+        self._figure_lock = threading.Lock()
+        # @memoized query results: key -> (value, size), in LRU order, all for _memo_version
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._memo_version = None
+        self._memo_bytes = 0
+        self.memo_max_bytes = MEMO_MAX_BYTES
+        self.memo_counts = {"hits": 0, "misses": 0, "evictions": 0}
+        self.checkpoint = checkpoint and not self._pushdown
+        # lazy: users and classes are read from the files (quick), and the checkpoint's attendance
+        # store is loaded with the attendance, so login doesn't wait for it to be unpickled
+        self._checkpoint_pending = self.checkpoint and lazy
+        if lazy or not (self.checkpoint and self._load_checkpoint()):
+            self.reload()
 
+    @timed("service.reload")
     def reload(self):
-        self.users, self.students, self.lecturers = database.load_users()
-        self.classes_map = database.load_classes()  # dict class_name -> lecturer
+        """Full reload from storage. Writes update the caches in place, so only call this when needed."""
+        self._file_stamps.clear()
+        self._load_users()
+        self._load_classes()
+        self._load_enrollments()
+        self.data_version += 1
+        self._attendance = None
+        self._attendance_thread = None
+        if not self.lazy:
+            self._load_attendance()
+
+    def _load_users(self):
+        stamps = self._stamp_files(database.USERS_CSV)
+        self.users, self.students, self.lecturers = self.db.load_users()
+        self._file_stamps.update(stamps)
+
+    def _load_classes(self):
+        stamps = self._stamp_files(database.CLASSES_CSV)
+        self.classes_map = self.db.load_classes()  # dict class_name -> lecturer
         self.classes = list(self.classes_map.keys())
-        self.attendance_records = database.load_attendance_records()  # list of dicts
+        self._index_lecturers()
+        self._file_stamps.update(stamps)
+
+    def _index_lecturers(self):
+        # lecturer username -> classes they teach ("" collects classes nobody is assigned to)
+        self.lecturer_classes = {}
+        for class_name in self.classes:
+            self.lecturer_classes.setdefault(self.classes_map.get(class_name) or "", []).append(class_name)
+
+    def _load_enrollments(self):
+        stamps = self._stamp_files(database.ENROLLMENTS_CSV)
+        # class_name -> enrolled students in order, plus a set per class for membership checks
+        self.enrollments = self.db.load_enrollments()
+        self._enrolled = {c: set(students) for c, students in self.enrollments.items()}
+        self._file_stamps.update(stamps)
+
+    @timed("service.load_attendance")
+    def _load_attendance(self):
+        if self._checkpoint_pending:
+            self._checkpoint_pending = False
+            if self._attendance_from_checkpoint():
+                return
+        # column store of attendance rows; iterating it yields dict-like rows
+        store = AttendanceStore()
+        stamps = {}
+        if not self._pushdown:
+            stamps = self._stamp_files(database.ATTENDANCE_UPDATES_CSV, database.ATTENDANCE_CSV)
+            if self._partitioned:
+                store.extend(self.db.iter_attendance_records(archived=False))
+            else:
+                store.extend(self.db.iter_attendance_records())
+        # archived months read into the store so far, and the last archived date
+        self._archived_loaded = set()
+        self._archived_through = ""
+        if self._partitioned:
+            self._archived_through = max((p["last"] for p in self.db.archive_partitions()), default="")
+        # stamps first: refresh() only follows attendance files once the store is in place
+        self._file_stamps.update(stamps)
+        self._attendance = store
+
+    def load_attendance_in_background(self):
+        """Start reading attendance on a worker thread; queries wait for it if they need it first."""
+        with self._attendance_lock:
+            if self._attendance is not None or self._attendance_thread is not None:
+                return
+            self._attendance_thread = threading.Thread(target=self._load_attendance, daemon=True)
+            self._attendance_thread.start()
+
+    @property
+    def attendance_records(self):
+        """The AttendanceStore, loading it (or waiting for the background load) if needed."""
+        store = self._attendance
+        if store is None:
+            thread = self._attendance_thread
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+            with self._attendance_lock:
+                if self._attendance is None:
+                    # not started, or the background load failed: load here so errors surface
+                    self._load_attendance()
+            store = self._attendance
+        return store
+
+    @timed("service.refresh")
+    def refresh(self):
+        """
+        Pick up changes other processes (e.g. another kiosk) made to the data files.
+        Rows appended since our last read are parsed from where we stopped; a file that
+        shrank or was replaced (a delete, a compaction) is re-read in full.
+        Returns True if anything changed.
+        """
+        if self._pushdown:
+            # attendance is queried live; users/classes are cheap to re-read
+            self.reload()
+            return True
+        changed = self._refresh_users()
+
+        rows = self._read_tail(database.CLASSES_CSV)
+        if rows is None:
+            self._load_classes()
+            changed = True
+        elif rows:
+            changed = self._apply_class_rows(rows) or changed
+
+        rows = self._read_tail(database.ENROLLMENTS_CSV)
+        if rows is None:
+            self._load_enrollments()
+            changed = True
+        elif rows:
+            changed = self._add_enrollments(tuple(row[:2]) for row in rows if len(row) >= 2) or changed
+
+        changed = self._follow_attendance() or changed
+
+        if changed:
+            self.data_version += 1
+        return changed
+
+    def _follow_attendance(self):
+        # attendance is followed only once it is loaded (lazy startup may not have read it yet)
+        if self._attendance is None or database.ATTENDANCE_CSV not in self._file_stamps:
+            return False
+        rows = self._read_tail(database.ATTENDANCE_CSV)
+        updates = self._read_tail(database.ATTENDANCE_UPDATES_CSV) if rows is not None else None
+        if rows is None or updates is None:
+            # compacted or rewritten: the base rows changed under us
+            self._load_attendance()
+            return True
+        return bool(rows or updates) and self._apply_attendance_rows(rows, updates)
+
+    @contextmanager
+    def _rewriting_attendance(self):
+        """
+        Wrap a write of ours that may replace attendance.csv (a compaction, also the automatic one
+        behind update_attendance_record). Under the data-folder lock, rows other kiosks appended
+        are read first; afterwards the store matches the files, so they are stamped as read rather
+        than taken for someone else's rewrite and parsed again in full.
+        """
+        if self._pushdown or self._attendance is None or database.ATTENDANCE_CSV not in self._file_stamps:
+            yield
+            return
+        with self.db.locked():
+            if self._follow_attendance():
+                self.data_version += 1
+            yield
+            self._file_stamps.update(self._stamp_files(database.ATTENDANCE_UPDATES_CSV, database.ATTENDANCE_CSV))
+
+    def _refresh_users(self):
+        rows = self._read_tail(database.USERS_CSV)
+        if rows is None:
+            self._load_users()
+            return True
+        return bool(rows) and self._apply_user_rows(rows)
+
+    @timed("service.authenticate")
+    def authenticate(self, username, password):
+        """
+        Return the user's role if username and password match, else None. Only users.csv is
+        looked at (one stat when no other kiosk changed it), so logging in never waits for
+        classes or attendance to be re-read.
+        """
+        try:
+            if self._pushdown:
+                old = self.users
+                self._load_users()
+                changed = self.users != old
+            else:
+                changed = self._refresh_users()
+            if changed:
+                self.data_version += 1
+        except Exception:
+            pass  # check against the users we already have
+        user = self.users.get(username)
+        if user is not None and user["password"] == password:
+            return user["role"]
+        return None
+
+    def _read_tail(self, path):
+        """
+        Return the rows appended to path since we last read it ([] if none),
+        or None if the file was replaced, truncated or removed and must be re-read.
+        """
+        stamp = self._file_stamps.get(path)
+        state = database.file_state(path)
+        if state is None:
+            return [] if stamp is None else None
+        offset = 0
+        if stamp is not None:
+            inode, offset, mtime_ns = stamp
+            if state[0] != inode or state[1] < offset:
+                return None
+            if state[1] == offset:
+                # same size but touched since: rewritten in place
+                return [] if state[2] == mtime_ns else None
+        rows, end, state = database.read_csv_tail(path, offset)
+        if stamp is not None and state[0] != stamp[0]:
+            return None  # replaced between the stat and the read
+        self._file_stamps[path] = (state[0], end, state[2])
+        return rows
+
+    def _apply_user_rows(self, rows):
+        changed = False
+        for row in rows:
+            if len(row) < 3:
+                continue
+            username, password, role = row[0], row[1], row[2]
+            old = self.users.get(username)
+            if old == {"password": password, "role": role}:
+                continue  # our own write, or a row we've already seen
+            if old is not None:
+                if username in self.students:
+                    self.students.remove(username)
+                if username in self.lecturers:
+                    self.lecturers.remove(username)
+            self.users[username] = {"password": password, "role": role}
+            if role == "student":
+                self.students.append(username)
+            elif role == "lecturer":
+                self.lecturers.append(username)
+            changed = True
+        return changed
+
+    def _apply_class_rows(self, rows):
+        changed = False
+        for row in rows:
+            class_name = row[0]
+            lecturer = row[1] if len(row) > 1 else ""
+            if class_name not in self.classes_map:
+                self.classes.append(class_name)
+            elif self.classes_map[class_name] == lecturer:
+                continue
+            self.classes_map[class_name] = lecturer
+            changed = True
+        if changed:
+            self._index_lecturers()
+        return changed
+
+    def _add_enrollments(self, pairs):
+        """Add (class_name, student) pairs to the in-memory enrollment index. Returns True if any were new."""
+        changed = False
+        for class_name, student in pairs:
+            if class_name not in self._enrolled:
+                self._enrolled[class_name] = set()
+                self.enrollments[class_name] = []
+                changed = True
+            enrolled = self._enrolled[class_name]
+            if student != database.ROSTER_MARKER and student not in enrolled:
+                enrolled.add(student)
+                self.enrollments.setdefault(class_name, []).append(student)
+                changed = True
+        return changed
+
+    def _apply_attendance_rows(self, rows, updates, store=None):
+        """Add appended attendance rows we don't have yet, then replay appended status corrections."""
+        if store is None:
+            store = self._attendance
+        changed = False
+        for row in rows:
+            if len(row) < 4:
+                continue
+            # (date, class, student) is unique in the file, so a row we already hold is one of ours
+            if store.find(row[0], row[1], row[2]) is None:
+                store.append(row[0], row[1], row[2], row[3], row[4] if len(row) > 4 else "")
+                changed = True
+        for row in updates:
+            if len(row) < 4:
+                continue
+            i = store.find(row[0], row[1], row[2])
+            if i is not None and store.get_field(i, "status") != row[3]:
+                store.set_status(i, row[3])
+                changed = True
+        return changed
+
+    def _records_for(self, start=None, end=None):
+        """
+        The attendance store, after reading in any archived months that overlap start..end
+        ('YYYY-MM-DD', inclusive; None leaves that side open). Recent dates cost nothing extra.
+        """
+        store = self.attendance_records
+        if not self._partitioned or (start is not None and start > self._archived_through):
+            return store
+        missing = [p for p in self.db.archive_partitions(start, end) if p["file"] not in self._archived_loaded]
+        if missing:
+            store.extend(self.db.iter_archived_records(missing))
+            self._archived_loaded.update(p["file"] for p in missing)
+        return store
+
+    def _find_record(self, date_str, class_name, student_username):
+        """O(1) lookup of the attendance row for (date, class, student), or None."""
+        store = self._records_for(date_str, date_str)
+        i = store.find(date_str, class_name, student_username)
+        return store[i] if i is not None else None
+
+    @staticmethod
+    def _checkpoint_path():
+        """Per-user file for the current data folder (one checkpoint per data folder)."""
+        folder = os.environ.get("CHECKMEIN_CACHE_DIR")
+        if not folder:
+            if os.name == "nt":
+                folder = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "CheckMeIN")
+            else:
+                folder = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "checkmein")
+        key = hashlib.sha1(os.path.abspath(database.BASE_DIR).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(folder, f"{key}.checkpoint")
+
+    @staticmethod
+    def _trusted_checkpoint(path):
+        """Only unpickle a file (and folder) this user owns and nobody else can write to."""
+        if os.name != "posix":
+            return True  # %LOCALAPPDATA% is private to the user already
+        for p in (path, os.path.dirname(path)):
+            st = os.stat(p)
+            if st.st_uid != os.getuid() or st.st_mode & 0o022:
+                return False
+        return True
+
+    @timed("service.save_checkpoint")
+    def save_checkpoint(self):
+        """
+        Pickle users, classes, enrollments and the attendance store (indexes included) together
+        with how far each data file had been read, so the next start-up only replays what was
+        appended since. The file is replaced atomically. Returns (ok, path_or_message).
+        """
+        if self._pushdown or self._attendance is None:
+            return False, "Nothing to checkpoint"
+        return self._write_checkpoint(self._attendance)
+
+    def _write_checkpoint(self, store):
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "data_dir": os.path.abspath(database.BASE_DIR),
+            "file_stamps": dict(self._file_stamps),
+            "users": self.users, "students": self.students, "lecturers": self.lecturers,
+            "classes_map": self.classes_map, "classes": self.classes,
+            "enrollments": self.enrollments,
+            "attendance": store,
+            "archived_loaded": self._archived_loaded, "archived_through": self._archived_through,
+        }
+        path = self._checkpoint_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o600)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # e.g. another thread changed a dict while it was pickled; the next save will do
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False, f"Failed to write checkpoint: {e}"
+        return True, path
+
+    def _read_checkpoint(self):
+        """The state save_checkpoint() wrote for this data folder, or None if there is no usable one."""
+        path = self._checkpoint_path()
+        try:
+            if not self._trusted_checkpoint(path):
+                return None
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except Exception:
+            return None  # none yet, cut short, or written by an incompatible version
+        if (not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION
+                or state.get("data_dir") != os.path.abspath(database.BASE_DIR)):
+            return None
+        return state
+
+    @timed("service.load_checkpoint")
+    def _load_checkpoint(self):
+        """Restore the state from save_checkpoint() and catch up with the files. False if there is no usable checkpoint."""
+        state = self._read_checkpoint()
+        if state is None:
+            return False
+        self.users, self.students, self.lecturers = state["users"], state["students"], state["lecturers"]
+        self.classes_map, self.classes = state["classes_map"], state["classes"]
+        self._index_lecturers()
+        self.enrollments = state["enrollments"]
+        self._enrolled = {c: set(students) for c, students in self.enrollments.items()}
+        self._attendance = state["attendance"]
+        self._archived_loaded = state["archived_loaded"]
+        self._archived_through = state["archived_through"]
+        self._file_stamps = dict(state["file_stamps"])
+        self.data_version += 1
+        try:
+            # rows appended since are read from the saved offsets; a rewritten file is re-read whole
+            self.refresh()
+        except Exception:
+            return False
+        return True
+
+    @timed("service.load_checkpoint_attendance")
+    def _attendance_from_checkpoint(self):
+        """
+        Lazy start-up: take only the attendance store from the checkpoint (users and classes were
+        just read from the files) and catch it up with rows appended since. Runs with the attendance
+        load, off the login path. False if there is no usable checkpoint or the files were rewritten.
+        """
+        state = self._read_checkpoint()
+        if state is None or database.ATTENDANCE_CSV not in state["file_stamps"]:
+            return False
+        store = state["attendance"]
+        for path in (database.ATTENDANCE_CSV, database.ATTENDANCE_UPDATES_CSV):
+            self._file_stamps[path] = state["file_stamps"].get(path)
+        try:
+            rows = self._read_tail(database.ATTENDANCE_CSV)
+            updates = self._read_tail(database.ATTENDANCE_UPDATES_CSV) if rows is not None else None
+        except Exception:
+            rows = None
+        if rows is None or updates is None:
+            return False  # the full parse that follows stamps the files afresh
+        self._apply_attendance_rows(rows, updates, store)
+        self._archived_loaded = state["archived_loaded"]
+        self._archived_through = state["archived_through"]
+        self._attendance = store
+        self.data_version += 1
+        return True
+
+    def _stamp_files(self, *paths):
+        # taken before a full read: rows appended meanwhile are read again by refresh(), which is harmless
+        stamps = {}
+        if self._pushdown:
+            return stamps
+        for path in paths:
+            # (inode, size, mtime_ns): the whole file counts as read
+            stamps[path] = database.file_state(path)
+        return stamps
+
+    def _memo_store(self, key, version, value):
+        size = _approx_size(value)
+        with self._memo_lock:
+            if version != self.data_version:
+                return  # the data changed while this was computed
+            if self._memo_version != version:
+                # everything cached belongs to an older version of the data
+                self._memo.clear()
+                self._memo_bytes = 0
+                self._memo_version = version
+            if size > self.memo_max_bytes:
+                return
+            old = self._memo.pop(key, None)
+            if old is not None:
+                self._memo_bytes -= old[1]
+            self._memo[key] = (value, size)
+            self._memo_bytes += size
+            while self._memo_bytes > self.memo_max_bytes:
+                _key, (_value, dropped) = self._memo.popitem(last=False)
+                self._memo_bytes -= dropped
+                self.memo_counts["evictions"] += 1
+
+    def memo_stats(self):
+        """Hit/miss/eviction counts and the size of the query cache."""
+        with self._memo_lock:
+            stats = dict(self.memo_counts)
+            current = self._memo_version == self.data_version
+            stats.update(entries=len(self._memo) if current else 0,
+                         bytes=self._memo_bytes if current else 0, max_bytes=self.memo_max_bytes)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def clear_memo(self):
+        """Drop cached query results and reset the counters."""
+        with self._memo_lock:
+            self._memo.clear()
+            self._memo_bytes = 0
+            self._memo_version = None
+            self.memo_counts = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # query primitives: in-memory indexes for CSV, SQL for backends that support it
+    def _has_records(self):
+        if self._pushdown:
+            return self.db.has_attendance()
+        return bool(self.attendance_records) or bool(self._archived_through)
+
+    def find_status(self, date_str, class_name, student_username):
+        """The status recorded for (date, class, student), or None if there is no record."""
+        if self._pushdown:
+            return self.db.find_attendance_status(date_str, class_name, student_username)
+        rec = self._find_record(date_str, class_name, student_username)
+        return rec["status"] if rec is not None else None
+
+    def _daily_counts(self, class_name, start_date=None, end_date=None):
+        """Return {datetime.date: {status: count}} for a class, optionally limited to start..end."""
+        counts = {}
+        if self._pushdown:
+            raw = self.db.query_daily_counts(class_name,
+                                             start_date.isoformat() if start_date else None,
+                                             end_date.isoformat() if end_date else None)
+            for date_str, by_status in raw.items():
+                try:
+                    counts[datetime.strptime(date_str, "%Y-%m-%d").date()] = by_status
+                except Exception:
+                    continue
+            return counts
+
+        # read the store's per-(class, day, status) rollup instead of scanning rows
+        store = self._records_for(start_date.isoformat() if start_date else None,
+                                  end_date.isoformat() if end_date else None)
+        cid = store.class_id(class_name)
+        if cid is None:
+            return counts
+        by_day = store.daily_counts(cid)
+        if start_date and end_date:
+            # only look at the days asked for
+            days = (d for d in range(start_date.toordinal(), end_date.toordinal() + 1) if d in by_day)
+        else:
+            lo = start_date.toordinal() if start_date else NO_DATE + 1
+            hi = end_date.toordinal() if end_date else date.max.toordinal()
+            # list() copies in one step: a writer thread (the API server's) may add a day meanwhile
+            days = (d for d in list(by_day) if lo <= d <= hi)
+        for day in days:
+            by_status = {store.status_names[code]: n for code, n in list(by_day[day].items()) if n}
+            if by_status:
+                counts[date.fromordinal(day)] = by_status
+        return counts
+
+    def _daily_rates(self, class_name, days):
+        """Return (date_list, rates) of Present / total * 100 for the last `days` days, or None if no data."""
+        today = date.today()
+        start_date = today - timedelta(days=days - 1)
+        # prepare date list
+        date_list = [start_date + timedelta(days=i) for i in range(days)]
+
+        counts = self._daily_counts(class_name, start_date, today)
+        # if all totals zero -> no recent data
+        if not any(counts.values()):
+            return None
+
+        rates = []
+        for d in date_list:
+            by_status = counts.get(d, {})
+            total = sum(by_status.values())
+            present = by_status.get("Present", 0)
+            rates.append((present / total * 100) if total > 0 else 0.0)
+        return date_list, rates
 
     # user & class management
+    @timed("service.add_user")
     def add_user(self, username, password, role):
         if username in self.users:
             return False, "Username exists"
-        database.append_user(username, password, role)
-        self.reload()
+        self.db.append_user(username, password, role)
+        # apply the new user to the cached state instead of re-reading every file
+        self.users[username] = {"password": password, "role": role}
+        if role == "student":
+            self.students.append(username)
+        elif role == "lecturer":
+            self.lecturers.append(username)
+        self.data_version += 1
         return True, "User added"
 
+    @timed("service.add_class")
     def add_class(self, class_name, lecturer_username=""):
         if class_name in self.classes_map:
             return False, "Class exists"
-        database.append_class(class_name, lecturer_username)
-        self.reload()
+        self.db.append_class(class_name, lecturer_username)
+        self.classes_map[class_name] = lecturer_username
+        self.classes.append(class_name)
+        self.lecturer_classes.setdefault(lecturer_username or "", []).append(class_name)
+        self.data_version += 1
         return True, "Class added"
+
+    @timed("service.set_class_lecturer")
+    def set_class_lecturer(self, class_name, lecturer_username=""):
+        """Assign a class to a lecturer ("" leaves it unassigned). Returns (ok, message)."""
+        if class_name not in self.classes_map:
+            return False, f"Class '{class_name}' not found"
+        if lecturer_username and self.users.get(lecturer_username, {}).get("role") != "lecturer":
+            return False, f"'{lecturer_username}' is not a lecturer"
+        if self.classes_map[class_name] == lecturer_username:
+            return True, "No change"
+        # a later row for the same class wins, in both backends
+        self.db.append_class(class_name, lecturer_username)
+        self.classes_map[class_name] = lecturer_username
+        self._index_lecturers()
+        self.data_version += 1
+        return True, f"'{class_name}' assigned to {lecturer_username or 'nobody'}"
     
+    @timed("service.delete_user")
     def delete_user(self, username):
         """
         通过 database.delete_user 真正删掉 CSV 里的用户，然后刷新缓存。
         """
-        deleted = database.delete_user(username)
+        deleted = self.db.delete_user(username)
         if deleted:
-            self.reload()
+            classes = [c for c, enrolled in self._enrolled.items() if username in enrolled]
+            if classes:
+                self._keep_rosters(classes)
+                self.db.delete_enrollments(student_username=username)
+                for class_name, enrolled in self._enrolled.items():
+                    if username in enrolled:
+                        enrolled.discard(username)
+                        self.enrollments[class_name].remove(username)
+            self.users.pop(username, None)
+            if username in self.students:
+                self.students.remove(username)
+            if username in self.lecturers:
+                self.lecturers.remove(username)
+            self.data_version += 1
             return True, f"User '{username}' deleted."
         else:
             return False, f"User '{username}' not found."
 
+    @timed("service.delete_class")
     def delete_class(self, class_name):
         """
         通过 database.delete_class 真正删掉 CSV 里的班级，然后刷新缓存。
         """
-        deleted = database.delete_class(class_name)
+        deleted = self.db.delete_class(class_name)
         if deleted:
-            self.reload()
+            if class_name in self.enrollments:
+                self.db.delete_enrollments(class_name=class_name)
+                self.enrollments.pop(class_name, None)
+                self._enrolled.pop(class_name, None)
+            self.classes_map.pop(class_name, None)
+            if class_name in self.classes:
+                self.classes.remove(class_name)
+            self._index_lecturers()
+            self.data_version += 1
             return True, f"Class '{class_name}' deleted."
         else:
             return False, f"Class '{class_name}' not found."
 
 
+    # enrollment
+    def roster(self, class_name):
+        """
+        Students of a class in enrollment order. Classes nobody has ever been enrolled in fall back to
+        every student, as before enrollments existed; a class whose students were all taken off is empty.
+        """
+        enrolled = self.enrollments.get(class_name)
+        if enrolled is not None:
+            return list(enrolled)
+        return list(dict.fromkeys(self.students))
+
+    def is_enrolled(self, class_name, student_username):
+        """True if the student is on the class roster (always True for a class that never had one)."""
+        enrolled = self._enrolled.get(class_name)
+        return enrolled is None or student_username in enrolled
+
+    def classes_for_student(self, student_username):
+        """The classes a student can mark: those they are enrolled in, and those without a roster."""
+        return [c for c in self.classes if self.is_enrolled(c, student_username)]
+
+    def classes_for_lecturer(self, lecturer_username):
+        """The lecturer's own classes, then the classes no lecturer is assigned to."""
+        return self.lecturer_classes.get(lecturer_username, []) + self.lecturer_classes.get("", [])
+
+    @timed("service.enroll_students")
+    def enroll_students(self, class_name, students):
+        """Enroll students in a class. Returns (ok, message); unknown and already enrolled students are skipped."""
+        return self._enroll([(class_name, s) for s in students])
+
+    @timed("service.import_enrollments")
+    def import_enrollments(self, path):
+        """
+        Bulk enrollment from a CSV of class_name,student_username rows (header optional).
+        Rows naming an unknown class or student are skipped. Returns (ok, message).
+        """
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                pairs = [(row[0].strip(), row[1].strip()) for row in csv.reader(f) if len(row) >= 2]
+        except Exception as e:
+            return False, f"Failed to read {path}: {e}"
+        if pairs and pairs[0] == tuple(database.ENROLLMENT_FIELDS):
+            pairs.pop(0)
+        return self._enroll(pairs)
+
+    def _enroll(self, pairs):
+        valid = []
+        unknown = 0
+        for class_name, student in pairs:
+            if class_name in self.classes_map and self.users.get(student, {}).get("role") == "student":
+                valid.append((class_name, student))
+            else:
+                unknown += 1
+        valid = list(dict.fromkeys(valid))
+        new = [p for p in valid if p[1] not in self._enrolled.get(p[0], ())]
+        # a class's first enrollment also records that it has a roster (see database.ROSTER_MARKER)
+        markers = [(c, database.ROSTER_MARKER) for c in dict.fromkeys(c for c, _ in new) if c not in self._enrolled]
+        written = self.db.append_enrollments(markers + new) if new else []
+        written = [p for p in written if p[1] != database.ROSTER_MARKER]
+        if written:
+            self._add_enrollments(markers + written)
+            self.data_version += 1
+        msg = f"Enrolled {len(written)} student(s)"
+        if len(valid) > len(written):
+            msg += f", {len(valid) - len(written)} already enrolled"
+        if unknown:
+            msg += f", {unknown} skipped (unknown class or student)"
+        return bool(written), msg
+
+    @timed("service.unenroll_students")
+    def unenroll_students(self, class_name, students):
+        """Take students off a class roster. Returns (ok, message)."""
+        enrolled = self._enrolled.get(class_name, set())
+        pairs = [(class_name, s) for s in dict.fromkeys(students) if s in enrolled]
+        if not pairs:
+            return False, "None of those students are enrolled"
+        self._keep_rosters([class_name])
+        self.db.delete_enrollments(pairs)
+        for _, student in pairs:
+            enrolled.discard(student)
+        self.enrollments[class_name] = [s for s in self.enrollments[class_name] if s in enrolled]
+        self.data_version += 1
+        return True, f"Removed {len(pairs)} student(s) from {class_name}"
+
+    def _keep_rosters(self, classes):
+        # enrollments written before ROSTER_MARKER existed have no marker row; add it before taking
+        # students off, so a class left empty doesn't go back to listing every student
+        self.db.append_enrollments([(c, database.ROSTER_MARKER) for c in classes])
+
     # attendance
+    @timed("service.mark_attendance")
     def mark_attendance(self, class_name, student_username, status="Present"):
         now = datetime.now()
         date_str = now.strftime("%Y-%m-%d")
         time_in = now.strftime("%H:%M:%S")
+        if not self.is_enrolled(class_name, student_username):
+            return False, "Not enrolled in this class"
         # check if already marked for the same date
-        for rec in self.attendance_records:
-            if rec["date"] == date_str and rec["class_name"] == class_name and rec["student_username"] == student_username:
-                return False, "Already marked"
-        database.append_attendance(date_str, class_name, student_username, status, time_in)
-        self.reload()
+        if self.find_status(date_str, class_name, student_username) is not None:
+            return False, "Already marked"
+        # the backend re-checks under its write lock, which catches marks made by other kiosks
+        if not self.db.append_attendance(date_str, class_name, student_username, status, time_in):
+            return False, "Already marked"
+        self.add_marked_row((date_str, class_name, student_username, status, time_in))
         return True, "Marked"
 
+    def add_marked_row(self, row):
+        """
+        Apply a check-in that was (or is about to be) written to the cached state; used by
+        CheckinPipeline, which answers before the row reaches the backend.
+        """
+        if not self._pushdown:
+            self.attendance_records.append(*row)
+        # only once the store has the row: a memoized read running meanwhile would otherwise
+        # cache what it saw before the append under the new version
+        self.data_version += 1
+
+    def drop_marked_rows(self, rows):
+        """
+        Take back add_marked_row() for check-ins the backend did not write: given up after failed
+        writes, or beaten by another kiosk's mark. Each key is looked up on disk again, so the cache
+        ends up holding the other kiosk's status, or no row at all (the student can check in again).
+        """
+        if self._pushdown:
+            return  # nothing cached: queries already go to the backend
+        store = self.attendance_records
+        for row in rows:
+            i = store.find(row[0], row[1], row[2])
+            if i is None:
+                continue
+            try:
+                status = self.db.recent_attendance_status(row[0], row[1], row[2])
+            except Exception:
+                status = None  # the disk that failed the write can't be read either
+            if status is None:
+                store.remove(i)
+            else:
+                store.set_status(i, status)
+        self.data_version += 1
+
+    @timed("service.mark_attendance_bulk")
+    def mark_attendance_bulk(self, class_name, statuses, date=None):
+        """
+        Mark many students of a class at once, e.g. a paper roll entered afterwards or a whole
+        class marked Excused. statuses is {student_username: status}; date is 'YYYY-MM-DD' or a
+        date (default today; past dates are stored without a check-in time).
+        Students already marked for that date are skipped. All rows go out in one append.
+        Returns (True, message) if anything was marked, else (False, message); nothing is marked
+        if the date doesn't parse or a username isn't a student enrolled in the class.
+        """
+        now = datetime.now()
+        try:
+            if date is None:
+                date_str = now.strftime("%Y-%m-%d")
+            elif isinstance(date, str):
+                date_str = datetime.strptime(date.strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+            else:
+                date_str = date.strftime("%Y-%m-%d")
+        except (AttributeError, TypeError, ValueError):
+            return False, "Invalid date"
+        not_students = [s for s in statuses if self.users.get(s, {}).get("role") != "student"]
+        if not_students:
+            return False, f"Not a student: {', '.join(map(str, not_students))}"
+        not_enrolled = [s for s in statuses if not self.is_enrolled(class_name, s)]
+        if not_enrolled:
+            return False, f"Not enrolled in {class_name}: {', '.join(not_enrolled)}"
+        if date_str == now.strftime("%Y-%m-%d"):
+            time_in = now.strftime("%H:%M:%S")
+        else:
+            time_in = ""
+
+        if self._pushdown:
+            already = self.db.query_attendance_map(date_str).get(class_name, {})
+        else:
+            store = self._records_for(date_str, date_str)
+            already = {}
+            for student in statuses:
+                if store.find(date_str, class_name, student) is not None:
+                    already[student] = True
+        rows = [(date_str, class_name, student, status, time_in)
+                for student, status in statuses.items() if student not in already]
+        # the backend re-checks under its write lock and returns only the rows it wrote
+        written = self.db.append_attendance_rows(rows) if rows else []
+        if written:
+            if not self._pushdown:
+                for row in written:
+                    store.append(*row)
+            # after the store changes, as in add_marked_row
+            self.data_version += 1
+        skipped = len(statuses) - len(written)
+        if not written:
+            return False, "All selected students are already marked" if statuses else "No students selected"
+        msg = f"Marked {len(written)} student(s)"
+        if skipped:
+            msg += f", {skipped} already marked"
+        return True, msg
+
+    @timed("service.update_attendance")
     def update_attendance(self, date_str, class_name, student_username, new_status):
-        ok = database.update_attendance_record(date_str, class_name, student_username, new_status)
+        if self._pushdown:
+            ok = self.db.update_attendance_record(date_str, class_name, student_username, new_status)
+            if ok:
+                self.data_version += 1
+            return ok
+        if self._find_record(date_str, class_name, student_username) is None:
+            return False
+        with self._rewriting_attendance():
+            ok = self.db.update_attendance_record(date_str, class_name, student_username, new_status)
+            if ok:
+                # looked up again: catching up with other kiosks may have re-read the store
+                rec = self._find_record(date_str, class_name, student_username)
+                if rec is not None:
+                    # rec is a view onto the store, so this updates the status column
+                    rec["status"] = new_status
         if ok:
-            self.reload()
+            self.data_version += 1
             return True
         return False
 
+    @timed("service.compact")
+    def compact(self):
+        """Fold pending status corrections into attendance.csv. Returns number of updates folded."""
+        with self._rewriting_attendance():
+            folded = self.db.compact_attendance()
+        return folded
+
+    @timed("service.archive")
+    def archive(self, keep_months=2):
+        """
+        Move attendance older than the last keep_months months into compressed monthly files
+        (CSV storage only). Archived months are still read when a query covers them.
+        Returns (ok, message).
+        """
+        if not hasattr(self.db, "archive_attendance"):
+            return False, "This storage backend keeps attendance in one indexed table; nothing to archive"
+        moved, months = self.db.archive_attendance(keep_months)
+        if not moved and not months:
+            return False, "Nothing to archive"
+        if self._attendance is not None:
+            # attendance.csv was rewritten without the archived rows
+            with self._attendance_lock:
+                self._load_attendance()
+        self.data_version += 1
+        return True, f"Archived {moved} record(s) into {months} month file(s)"
+
+    def flush(self):
+        """Write out check-ins waiting in the backend's write buffer (see database.configure_write_buffer)."""
+        if hasattr(self.db, "flush_attendance"):
+            return self.db.flush_attendance()
+        return 0
+
     # helpers for UI
+    @timed("service.get_attendance_map_for_date")
+    @memoized
     def get_attendance_map_for_date(self, target_date=None):
         """Return dict: class_name -> {student_username: status} for target_date (default today)"""
         if target_date is None:
             target_date = datetime.now().strftime("%Y-%m-%d")
-        records = [r for r in self.attendance_records if r["date"] == target_date]
+        if self._pushdown:
+            return self.db.query_attendance_map(target_date)
+        store = self._records_for(target_date, target_date)
         mapping = {}
-        for r in records:
-            mapping.setdefault(r["class_name"], {})[r["student_username"]] = r["status"]
+        for i in store.rows_for_date(target_date):
+            class_name = store.class_names[store.class_ids[i]]
+            mapping.setdefault(class_name, {})[store.student_names[store.student_ids[i]]] = store.status_names[store.statuses[i]]
         return mapping
 
+    @timed("service.get_class_attendance_stats")
+    @memoized
     def get_class_attendance_stats(self, class_name):
         """Return counts for Present/Absent/Late/Excused across all records for this class."""
         counts = {"Present": 0, "Absent": 0, "Late": 0, "Excused": 0}
-        for r in self.attendance_records:
-            if r.get("class_name") == class_name:
-                status = r.get("status", "Absent")
-                counts[status] = counts.get(status, 0) + 1
+        if self._pushdown:
+            for status, n in self.db.query_status_counts(class_name).items():
+                counts[status] = counts.get(status, 0) + n
+            return counts
+        store = self._records_for()
+        cid = store.class_id(class_name)
+        if cid is None:
+            return counts
+        for code, n in list(store.class_counts(cid).items()):
+            if n:
+                status = store.status_names[code]
+                counts[status] = counts.get(status, 0) + n
         return counts
 
-    def plot_attendance_trend(self, class_name):
+    @timed("service.plot_attendance_trend")
+    def plot_attendance_trend(self, class_name, out_path=None, days=14):
         """
-        Build 14-day attendance rate (Present / total * 100) for the class and save PNG.
+        Build the attendance rate (Present / total * 100) chart for the class and save it as PNG.
+        This is the explicit "save to disk" path; viewers should use get_trend_chart() instead.
         Returns (True, path) or (False, message).
         """
-        if not self.attendance_records:
+        ok, render = self.trend_chart_renderer(class_name, days)
+        if not ok:
+            return False, render
+        out = out_path or os.path.join(os.path.dirname(__file__), "attendance_trend.png")
+        with open(out, "wb") as f:
+            f.write(render())
+        return True, out
+
+    @timed("service.trend_chart_renderer")
+    def trend_chart_renderer(self, class_name, days=14):
+        """
+        Collect the trend data now and return (True, render) where render() draws the chart and
+        returns PNG bytes, or (False, message). render() only uses the data captured here, so the
+        GUI can call it on a worker thread. Results are cached by (class, days, data_version),
+        except with backends that answer queries themselves (SQLite): other kiosks write to those
+        without moving our data_version, so the chart is drawn from the current data every time.
+        """
+        key = (class_name, days, self.data_version)
+        cached = self.trend_chart_cached(class_name, days)
+        if cached is not None:
+            return True, lambda: cached
+
+        if not self._has_records():
             return False, "No records"
+        series = self._daily_rates(class_name, days)
+        if series is None:
+            return False, "No recent data"
+        x_dates, rates = series
 
-        today = date.today()
-        start_date = today - timedelta(days=13)
-        # prepare date list
-        date_list = [start_date + timedelta(days=i) for i in range(14)]
+        def render():
+            png = self._render_trend_png(class_name, days, x_dates, rates)
+            if self._pushdown:
+                return png
+            with self._chart_lock:
+                self._chart_cache[key] = png
+                self._chart_cache.move_to_end(key)
+                while len(self._chart_cache) > CHART_CACHE_SIZE:
+                    self._chart_cache.popitem(last=False)
+            return png
+        return True, render
 
-        # compute totals and presents per date
-        totals = {d: 0 for d in date_list}
-        presents = {d: 0 for d in date_list}
+    def trend_chart_cached(self, class_name, days=14):
+        """Return cached PNG bytes for the current data, or None."""
+        if self._pushdown:
+            return None
+        key = (class_name, days, self.data_version)
+        with self._chart_lock:
+            png = self._chart_cache.get(key)
+            if png is not None:
+                self._chart_cache.move_to_end(key)
+            return png
 
-        for r in self.attendance_records:
-            if r.get("class_name") != class_name:
-                continue
-            try:
-                rec_date = datetime.strptime(r.get("date", ""), "%Y-%m-%d").date()
-            except Exception:
-                continue
-            if rec_date < start_date or rec_date > today:
-                continue
-            totals[rec_date] += 1
-            if r.get("status") == "Present":
-                presents[rec_date] += 1
+    def get_trend_chart(self, class_name, days=14):
+        """Return (True, png_bytes) or (False, message), using the chart cache."""
+        ok, render = self.trend_chart_renderer(class_name, days)
+        if not ok:
+            return False, render
+        return True, render()
 
-        # if all totals zero -> no recent data
-        if all(totals[d] == 0 for d in date_list):
-            return False, "No recent data"
+    @timed("service.render_chart")
+    def _render_trend_png(self, class_name, days, x_dates, rates):
+        """Draw the chart on the shared Agg figure and return PNG bytes (nothing is written to disk)."""
+        with self._figure_lock:
+            fig = self._trend_figure
+            if fig is None:
+                # imported here so starting the app doesn't pay for matplotlib.
+                # Figure + Agg canvas instead of pyplot: no global state, safe off the Tk thread
+                from matplotlib.figure import Figure
+                from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-        # build rates
-        rates = []
-        x_dates = []
-        for d in date_list:
-            total = totals[d]
-            present = presents[d]
-            rate = (present / total * 100) if total > 0 else 0.0
-            x_dates.append(d)
-            rates.append(rate)
-
-        # plot (matplotlib can plot datetime.date)
-        plt.figure(figsize=(8, 4))
-        plt.plot(x_dates, rates, marker="o", linestyle="-")
-        plt.title(f"14-day Attendance Rate - {class_name}")
-        plt.xlabel("Date")
-        plt.ylabel("Attendance Rate (%)")
-        plt.ylim(0, 100)
-        plt.grid(True)
-        plt.gcf().autofmt_xdate()
-        out = os.path.join(os.path.dirname(__file__), "attendance_trend.png")
-        plt.tight_layout()
-        plt.savefig(out)
-        plt.close()
-        return True, out
+                fig = self._trend_figure = Figure(figsize=(8, 4))
+                FigureCanvasAgg(fig)
+            fig.clear()
+            ax = fig.add_subplot()
+            # plot (matplotlib can plot datetime.date)
+            ax.plot(x_dates, rates, marker="o", linestyle="-")
+            ax.set_title(f"{days}-day Attendance Rate - {class_name}")
+            ax.set_xlabel("Date")
+            ax.set_ylabel("Attendance Rate (%)")
+            ax.set_ylim(0, 100)
+            ax.grid(True)
+            fig.autofmt_xdate()
+            fig.tight_layout()
+            buf = BytesIO()
+            fig.savefig(buf, format="png")
+            return buf.getvalue()
 
+    @timed("service.get_student_history")
+    @memoized
     def get_student_history(self, student_username):
         """Return list of attendance records for a student sorted by date desc."""
-        recs = [r for r in self.attendance_records if r.get("student_username") == student_username]
-        # parse dates and sort descending
-        def parse_date(rec):
-            try:
-                return datetime.strptime(rec.get("date", ""), "%Y-%m-%d").date()
-            except Exception:
-                return date.min
-        recs.sort(key=parse_date, reverse=True)
-        return recs
+        if self._pushdown:
+            return self.db.query_student_history(student_username)
+        store = self._records_for()
+        rows = list(store.rows_for_student(student_username))
+        # sort by day descending (rows without a valid date have ordinal 0, so they go last)
+        rows.sort(key=lambda i: store.days[i], reverse=True)
+        return [store.row(i) for i in rows]
 
     # Excel export helpers using openpyxl (preferred) with fallbacks
-    def _write_xlsx_openpyxl(self, rows, headers, out_xlsx, sheet_name="Sheet1"):
-        """Helper: write list-of-rows to .xlsx using openpyxl with header formatting."""
+    @staticmethod
+    def _widen(widths, row):
+        """Grow per-column max text lengths with one row; callers do this while they build rows."""
+        for i, val in enumerate(row):
+            if val is not None:
+                l = len(str(val))
+                if l > widths[i]:
+                    widths[i] = l
+
+    @timed("service.write_xlsx")
+    def _write_xlsx_openpyxl(self, rows, headers, out_xlsx, sheet_name="Sheet1", col_widths=None):
+        """
+        Helper: write rows to .xlsx using openpyxl with header formatting.
+        Uses a write-only (streaming) workbook so cells are not kept in memory. Write-only sheets
+        need column widths before the first row, so pass col_widths (max text length per column)
+        tracked while building rows; otherwise rows must be a list and are measured here.
+        """
         from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
         from openpyxl.styles import Font, Alignment
         from openpyxl.utils import get_column_letter
-        from openpyxl.styles import NamedStyle
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = sheet_name[:31]
+        if col_widths is None:
+            col_widths = [len(str(h)) for h in headers]  # Start with header length
+            for row in rows:
+                self._widen(col_widths, row)
+
+        wb = Workbook(write_only=True)
+        # Excel sheet titles can't contain []:*?/\ (class names like "SWE3001: ..." do)
+        ws = wb.create_sheet(title=re.sub(r"[\[\]:*?/\\]", "_", sheet_name)[:31])
 
         header_font = Font(bold=True)
         align = Alignment(horizontal="left", vertical="center")
 
-        # Define a date style for date columns
-        date_style = NamedStyle(name="date_style", number_format="YYYY-MM-DD")
+        # Set column widths with a small buffer (must happen before the first row is written)
+        for i, width in enumerate(col_widths, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = max(width, len(str(headers[i - 1]))) + 2
 
         # write header
-        for c_idx, h in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=c_idx, value=h)
+        header_cells = []
+        for h in headers:
+            cell = WriteOnlyCell(ws, value=h)
             cell.font = header_font
             cell.alignment = align
+            header_cells.append(cell)
+        ws.append(header_cells)
 
-        # write rows
-        for r_idx, row in enumerate(rows, start=2):
-            for c_idx, val in enumerate(row, start=1):
-                cell = ws.cell(row=r_idx, column=c_idx, value=val)
+        # stream rows
+        date_cols = {i for i, h in enumerate(headers) if h.lower() == "date"}
+        for row in rows:
+            cells = []
+            for c_idx, val in enumerate(row):
+                cell = WriteOnlyCell(ws, value=val)
                 cell.alignment = align
-                # Apply date style if the header indicates a date column
-                if headers[c_idx - 1].lower() == "date" and isinstance(val, (datetime, date)):
-                    cell.style = date_style
-
-        # autosize columns
-        for i, h in enumerate(headers, start=1):
-            col_letter = get_column_letter(i)
-            max_len = len(str(h))  # Start with header length
-            for cell in ws[col_letter]:
-                if cell.value is not None:
-                    l = len(str(cell.value))
-                    if l > max_len:
-                        max_len = l
-            # Set column width with a small buffer
-            ws.column_dimensions[col_letter].width = max_len + 2
+                # Apply date format if the header indicates a date column
+                if c_idx in date_cols and isinstance(val, (datetime, date)):
+                    cell.number_format = "YYYY-MM-DD"
+                cells.append(cell)
+            ws.append(cells)
 
         wb.save(out_xlsx)
         return out_xlsx
 
+    @timed("service.export_class_stats_to_excel")
     def export_class_stats_to_excel(self, class_name, out_path=None):
         """
         Export per-date attendance counts for a class to a real .xlsx file.
         Uses openpyxl for formatting. Falls back to CSV if needed.
         """
+        ok, write = self.class_stats_exporter(class_name, out_path)
+        if not ok:
+            return False, write
+        return write()
+
+    @timed("service.class_stats_exporter")
+    def class_stats_exporter(self, class_name, out_path=None):
+        """
+        Collect the class statistics now and return (True, write) where write() saves the
+        workbook and returns (ok, path_or_message), or (False, message). Like
+        trend_chart_renderer, write() only uses the rows captured here, so it can run on a
+        worker thread while the service keeps taking check-ins.
+        """
         # build summary: list of rows with header
-        # gather statuses per date
-        today = date.today()
-        dates = sorted({(datetime.strptime(r["date"], "%Y-%m-%d").date())
-                        for r in self.attendance_records if r.get("class_name") == class_name and r.get("date")}, reverse=False)
+        # per-date status counts for the class, gathered in one pass
+        daily = self._daily_counts(class_name)
+        dates = sorted(daily)
         if not dates:
             return False, "No records for this class"
 
         # determine all statuses encountered
         statuses = set()
-        for r in self.attendance_records:
-            if r.get("class_name") == class_name:
-                statuses.add(r.get("status", "Absent"))
+        for by_status in daily.values():
+            statuses.update(by_status)
         statuses = sorted(statuses)
 
         # header: date + statuses
         headers = ["date"] + statuses
+        widths = [len(h) for h in headers]
         rows = []
         for d in dates:
-            counts = {s: 0 for s in statuses}
-            for r in self.attendance_records:
-                if r.get("class_name") != class_name:
-                    continue
-                try:
-                    rec_date = datetime.strptime(r.get("date", ""), "%Y-%m-%d").date()
-                except Exception:
-                    continue
-                if rec_date == d:
-                    counts[r.get("status", "Absent")] = counts.get(r.get("status", "Absent"), 0) + 1
-            row = [d.strftime("%Y-%m-%d")] + [counts[s] for s in statuses]
+            counts = daily[d]
+            row = [d.strftime("%Y-%m-%d")] + [counts.get(s, 0) for s in statuses]
             rows.append(row)
+            self._widen(widths, row)
 
         out_dir = os.path.join(os.path.dirname(__file__), "data")
         if not os.path.exists(out_dir):
@@ -256,34 +1250,30 @@ class AttendanceService:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         default_name = f"{class_name}_attendance_{ts}.xlsx"
         out_xlsx = out_path or os.path.join(out_dir, default_name)
+        return True, lambda: self._write_export(rows, headers, out_xlsx, class_name, widths)
 
-        # try to write .xlsx using openpyxl helper
-        try:
-            self._write_xlsx_openpyxl(rows, headers, out_xlsx, sheet_name=class_name)
-            return True, out_xlsx
-        except Exception:
-            # fallback to simple CSV
-            try:
-                # ensure CSV fallback also uses a unique filename
-                out_csv = out_xlsx.replace(".xlsx", ".csv")
-                with open(out_csv, "w", encoding="utf-8", newline="") as f:
-                    f.write(",".join(headers) + "\n")
-                    for r in rows:
-                        f.write(",".join(str(x) for x in r) + "\n")
-                return True, out_csv
-            except Exception as e:
-                return False, f"Failed to export: {e}"
-
+    @timed("service.export_student_history_to_excel")
     def export_student_history_to_excel(self, student_username, out_path=None):
         """Export full attendance history for a student to .xlsx (openpyxl) or CSV fallback."""
+        ok, write = self.student_history_exporter(student_username, out_path)
+        if not ok:
+            return False, write
+        return write()
+
+    @timed("service.student_history_exporter")
+    def student_history_exporter(self, student_username, out_path=None):
+        """Like class_stats_exporter, for a student's history: (True, write) or (False, message)."""
         hist = self.get_student_history(student_username)
         if not hist:
             return False, "No records for this student"
 
         headers = ["date", "class_name", "student_username", "status", "time_in"]
+        widths = [len(h) for h in headers]
         rows = []
         for r in hist:
-            rows.append([r.get("date", ""), r.get("class_name", ""), r.get("student_username", ""), r.get("status", ""), r.get("time_in", "")])
+            row = [r.get("date", ""), r.get("class_name", ""), r.get("student_username", ""), r.get("status", ""), r.get("time_in", "")]
+            rows.append(row)
+            self._widen(widths, row)
 
         out_dir = os.path.join(os.path.dirname(__file__), "data")
         if not os.path.exists(out_dir):
@@ -291,12 +1281,18 @@ class AttendanceService:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         default_name = f"{student_username}_history_{ts}.xlsx"
         out_xlsx = out_path or os.path.join(out_dir, default_name)
+        return True, lambda: self._write_export(rows, headers, out_xlsx, student_username or "History", widths)
 
+    def _write_export(self, rows, headers, out_xlsx, sheet_name, widths):
+        """Write rows to .xlsx, or to a CSV next to it if that fails. Returns (ok, path_or_message)."""
+        # try to write .xlsx using openpyxl helper
         try:
-            self._write_xlsx_openpyxl(rows, headers, out_xlsx, sheet_name=(student_username or "History"))
+            self._write_xlsx_openpyxl(rows, headers, out_xlsx, sheet_name=sheet_name, col_widths=widths)
             return True, out_xlsx
         except Exception:
+            # fallback to simple CSV
             try:
+                # ensure CSV fallback also uses a unique filename
                 out_csv = out_xlsx.replace(".xlsx", ".csv")
                 with open(out_csv, "w", encoding="utf-8", newline="") as f:
                     f.write(",".join(headers) + "\n")
@@ -306,49 +1302,22 @@ class AttendanceService:
             except Exception as e:
                 return False, f"Failed to export: {e}"
 
+    @timed("service.get_attendance_history_for_class")
+    @memoized
     def get_attendance_history_for_class(self, class_name, days=14):
         """
         Return an ordered dict mapping datetime.date -> attendance rate (0-100) for the past `days` days
         (including today). If no data at all, returns empty dict.
         This is intended to be used by the GUI to build animated plots.
         """
-        if not self.attendance_records:
+        if not self._has_records():
             return {}
 
-        today = date.today()
-        start_date = today - timedelta(days=days - 1)
-        # prepare date list
-        date_list = [start_date + timedelta(days=i) for i in range(days)]
-
-        totals = {d: 0 for d in date_list}
-        presents = {d: 0 for d in date_list}
-
-        for r in self.attendance_records:
-            if r.get("class_name") != class_name:
-                continue
-            try:
-                rec_date = datetime.strptime(r.get("date", ""), "%Y-%m-%d").date()
-            except Exception:
-                continue
-            if rec_date < start_date or rec_date > today:
-                continue
-            totals[rec_date] += 1
-            if r.get("status") == "Present":
-                presents[rec_date] += 1
-
-        # if all totals zero -> no recent data
-        if all(totals[d] == 0 for d in date_list):
+        series = self._daily_rates(class_name, days)
+        if series is None:
             return {}
-
-        # build rates dict
-        rates = {}
-        for d in date_list:
-            total = totals[d]
-            present = presents[d]
-            rate = (present / total * 100) if total > 0 else 0.0
-            rates[d] = rate
-
-        return rates
+        date_list, rates = series
+        return dict(zip(date_list, rates))
 
     # compatibility aliases (GUI may try different names)
     def get_class_attendance_history(self, class_name, days=14):
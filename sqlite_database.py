@@ -0,0 +1,368 @@
+"""
+SQLite storage backend.
+
+Offers the same functions as database.py (load_users, append_attendance,
+update_attendance_record, delete_class, ...) so AttendanceService can use
+either one, plus a few query_* functions that let the service push
+filtering and counting down into SQL instead of scanning rows in Python.
+
+Select it with CHECKMEIN_BACKEND=sqlite or `python main_gui.py --backend sqlite`.
+Move existing CSV data over once with:
+
+    python sqlite_database.py migrate [--data-dir DIR] [--replace]
+"""
+import os
+import sqlite3
+import threading
+
+import database
+from instrumentation import timed
+
+DB_NAME = "checkmein.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS classes (
+    class_name TEXT PRIMARY KEY,
+    lecturer_username TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    student_username TEXT NOT NULL,
+    status TEXT NOT NULL,
+    time_in TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_key ON attendance (date, class_name, student_username);
+CREATE INDEX IF NOT EXISTS idx_attendance_class_date ON attendance (class_name, date);
+CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance (student_username, date);
+CREATE TABLE IF NOT EXISTS enrollments (
+    class_name TEXT NOT NULL,
+    student_username TEXT NOT NULL,
+    PRIMARY KEY (class_name, student_username)
+);
+"""
+
+# one connection per thread (GUI thread, chart workers, ...)
+_local = threading.local()
+
+
+def db_path():
+    # follows database.set_data_dir so tools can point both backends at the same folder
+    return os.path.join(database.BASE_DIR, DB_NAME)
+
+
+def _connect():
+    path = db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path:
+        return conn
+    if not os.path.exists(database.BASE_DIR):
+        os.makedirs(database.BASE_DIR)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _local.conn = conn
+    _local.path = path
+    return conn
+
+
+def reset_connections():
+    """Forget connections inherited from a parent process (call in the child after fork)."""
+    global _local
+    _local = threading.local()
+
+
+def ensure_data_dir():
+    conn = _connect()
+    if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        with conn:
+            conn.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
+
+
+@timed("sqlite.load_users")
+def load_users():
+    users = {}
+    students = []
+    lecturers = []
+    for row in _connect().execute("SELECT username, password, role FROM users ORDER BY rowid"):
+        users[row["username"]] = {"password": row["password"], "role": row["role"]}
+        if row["role"] == "student":
+            students.append(row["username"])
+        elif row["role"] == "lecturer":
+            lecturers.append(row["username"])
+    return users, students, lecturers
+
+
+@timed("sqlite.load_classes")
+def load_classes():
+    classes = {}
+    for row in _connect().execute("SELECT class_name, lecturer_username FROM classes ORDER BY rowid"):
+        classes[row["class_name"]] = row["lecturer_username"]
+    return classes
+
+
+@timed("sqlite.load_attendance_records")
+def load_attendance_records():
+    rows = _connect().execute(
+        "SELECT date, class_name, student_username, status, time_in FROM attendance ORDER BY id")
+    return [dict(row) for row in rows]
+
+
+@timed("sqlite.append_user")
+def append_user(username, password, role):
+    conn = _connect()
+    with conn:
+        # same "last one wins" behaviour as appending a duplicate row to users.csv
+        conn.execute("INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)",
+                     (username, password, role))
+
+
+@timed("sqlite.append_class")
+def append_class(class_name, lecturer_username=""):
+    conn = _connect()
+    with conn:
+        # an upsert keeps the row (and so the class order) when only the lecturer changes
+        conn.execute("INSERT INTO classes (class_name, lecturer_username) VALUES (?, ?) "
+                     "ON CONFLICT(class_name) DO UPDATE SET lecturer_username = excluded.lecturer_username",
+                     (class_name, lecturer_username))
+
+
+@timed("sqlite.delete_user")
+def delete_user(username):
+    conn = _connect()
+    with conn:
+        cur = conn.execute("DELETE FROM users WHERE username = ?", (username,))
+    return cur.rowcount > 0
+
+
+@timed("sqlite.delete_class")
+def delete_class(class_name):
+    conn = _connect()
+    with conn:
+        cur = conn.execute("DELETE FROM classes WHERE class_name = ?", (class_name,))
+    return cur.rowcount > 0
+
+
+@timed("sqlite.load_enrollments")
+def load_enrollments():
+    enrollments = {}
+    for row in _connect().execute("SELECT class_name, student_username FROM enrollments ORDER BY rowid"):
+        students = enrollments.setdefault(row["class_name"], [])
+        if row["student_username"] != database.ROSTER_MARKER:
+            students.append(row["student_username"])
+    return enrollments
+
+
+@timed("sqlite.append_enrollments")
+def append_enrollments(pairs):
+    """Enroll (class_name, student_username) pairs, skipping existing ones. Returns the pairs written."""
+    conn = _connect()
+    written = []
+    with conn:
+        for pair in pairs:
+            cur = conn.execute("INSERT OR IGNORE INTO enrollments (class_name, student_username) VALUES (?, ?)",
+                               tuple(pair))
+            if cur.rowcount > 0:
+                written.append(tuple(pair))
+    return written
+
+
+@timed("sqlite.delete_enrollments")
+def delete_enrollments(pairs=(), class_name=None, student_username=None):
+    conn = _connect()
+    removed = 0
+    with conn:
+        for pair in pairs:
+            removed += conn.execute("DELETE FROM enrollments WHERE class_name = ? AND student_username = ?",
+                                    tuple(pair)).rowcount
+        if class_name is not None:
+            removed += conn.execute("DELETE FROM enrollments WHERE class_name = ?", (class_name,)).rowcount
+        if student_username is not None:
+            removed += conn.execute("DELETE FROM enrollments WHERE student_username = ?",
+                                    (student_username,)).rowcount
+    return removed
+
+
+@timed("sqlite.append_attendance")
+def append_attendance(date, class_name, student_username, status, time_in):
+    """Insert one row unless (date, class, student) already exists. Returns True if inserted."""
+    conn = _connect()
+    with conn:
+        # BEGIN IMMEDIATE takes the write lock before the check, so other processes can't race us
+        conn.execute("BEGIN IMMEDIATE")
+        exists = conn.execute(
+            "SELECT 1 FROM attendance WHERE date = ? AND class_name = ? AND student_username = ? LIMIT 1",
+            (date, class_name, student_username)).fetchone()
+        if exists:
+            return False
+        conn.execute(
+            "INSERT INTO attendance (date, class_name, student_username, status, time_in) VALUES (?, ?, ?, ?, ?)",
+            (date, class_name, student_username, status, time_in))
+    return True
+
+
+@timed("sqlite.append_attendance_rows")
+def append_attendance_rows(rows):
+    """Insert many (date, class, student, status, time_in) rows in one transaction, skipping existing keys."""
+    conn = _connect()
+    written = []
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        seen = set()
+        for r in rows:
+            key = (r[0], r[1], r[2])
+            if key in seen:
+                continue
+            seen.add(key)
+            exists = conn.execute(
+                "SELECT 1 FROM attendance WHERE date = ? AND class_name = ? AND student_username = ? LIMIT 1",
+                key).fetchone()
+            if not exists:
+                written.append(r)
+        conn.executemany(
+            "INSERT INTO attendance (date, class_name, student_username, status, time_in) VALUES (?, ?, ?, ?, ?)",
+            written)
+    return written
+
+
+@timed("sqlite.update_attendance_record")
+def update_attendance_record(date, class_name, student_username, new_status):
+    conn = _connect()
+    with conn:
+        cur = conn.execute(
+            "UPDATE attendance SET status = ? WHERE date = ? AND class_name = ? AND student_username = ?",
+            (new_status, date, class_name, student_username))
+    return cur.rowcount > 0
+
+
+@timed("sqlite.compact_attendance")
+def compact_attendance():
+    """Nothing to fold for SQLite; just checkpoint the WAL back into the main file."""
+    _connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return 0
+
+
+# query helpers used by AttendanceService instead of scanning rows in memory
+@timed("sqlite.has_attendance")
+def has_attendance():
+    return _connect().execute("SELECT EXISTS (SELECT 1 FROM attendance)").fetchone()[0] == 1
+
+
+@timed("sqlite.find_attendance_status")
+def find_attendance_status(date, class_name, student_username):
+    """Return the status recorded for (date, class, student), or None."""
+    row = _connect().execute(
+        "SELECT status FROM attendance WHERE date = ? AND class_name = ? AND student_username = ? "
+        "ORDER BY id DESC LIMIT 1",
+        (date, class_name, student_username)).fetchone()
+    return row["status"] if row else None
+
+
+@timed("sqlite.query_attendance_map")
+def query_attendance_map(date):
+    """Return dict: class_name -> {student_username: status} for one date."""
+    mapping = {}
+    rows = _connect().execute(
+        "SELECT class_name, student_username, status FROM attendance WHERE date = ? ORDER BY id", (date,))
+    for row in rows:
+        mapping.setdefault(row["class_name"], {})[row["student_username"]] = row["status"]
+    return mapping
+
+
+@timed("sqlite.query_status_counts")
+def query_status_counts(class_name):
+    """Return {status: count} across all dates for a class."""
+    rows = _connect().execute(
+        "SELECT status, COUNT(*) AS n FROM attendance WHERE class_name = ? GROUP BY status", (class_name,))
+    return {row["status"]: row["n"] for row in rows}
+
+
+@timed("sqlite.query_daily_counts")
+def query_daily_counts(class_name, start=None, end=None):
+    """Return {date_str: {status: count}} for a class, optionally limited to start..end (inclusive)."""
+    sql = "SELECT date, status, COUNT(*) AS n FROM attendance WHERE class_name = ?"
+    params = [class_name]
+    if start:
+        sql += " AND date >= ?"
+        params.append(start)
+    if end:
+        sql += " AND date <= ?"
+        params.append(end)
+    sql += " GROUP BY date, status"
+    counts = {}
+    for row in _connect().execute(sql, params):
+        counts.setdefault(row["date"], {})[row["status"]] = row["n"]
+    return counts
+
+
+@timed("sqlite.query_student_history")
+def query_student_history(student_username):
+    """Return a student's records, newest date first."""
+    rows = _connect().execute(
+        "SELECT date, class_name, student_username, status, time_in FROM attendance "
+        "WHERE student_username = ? ORDER BY date DESC, id",
+        (student_username,))
+    return [dict(row) for row in rows]
+
+
+@timed("sqlite.migrate_from_csv")
+def migrate_from_csv(replace=False):
+    """
+    Copy users, classes, enrollments and attendance from the CSV files in database.BASE_DIR into the SQLite file.
+    Pending status corrections in the CSV update log are applied on the way.
+    Returns (users, classes, attendance) row counts, or raises RuntimeError if the
+    database already holds attendance and replace is False.
+    """
+    database.ensure_data_dir()
+    users, _, _ = database.load_users()
+    classes = database.load_classes()
+    enrollments = database.load_enrollments()
+    records = database.load_attendance_records()
+
+    conn = _connect()
+    if not replace and has_attendance():
+        raise RuntimeError(f"{db_path()} already has attendance data (use replace=True to overwrite)")
+    with conn:
+        conn.execute("DELETE FROM users")
+        conn.execute("DELETE FROM classes")
+        conn.execute("DELETE FROM attendance")
+        conn.execute("DELETE FROM enrollments")
+        conn.executemany("INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)",
+                         ((u, info["password"], info["role"]) for u, info in users.items()))
+        conn.executemany("INSERT OR REPLACE INTO classes (class_name, lecturer_username) VALUES (?, ?)",
+                         ((c, lecturer or "") for c, lecturer in classes.items()))
+        conn.executemany("INSERT OR IGNORE INTO enrollments (class_name, student_username) VALUES (?, ?)",
+                         ((c, student) for c, students in enrollments.items()
+                          for student in [database.ROSTER_MARKER] + students))
+        conn.executemany(
+            "INSERT INTO attendance (date, class_name, student_username, status, time_in) VALUES (?, ?, ?, ?, ?)",
+            ((r["date"], r["class_name"], r["student_username"], r["status"], r.get("time_in") or "")
+             for r in records))
+    return len(users), len(classes), len(records)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CheckMeIN SQLite backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="copy the CSV data files into checkmein.db")
+    migrate.add_argument("--data-dir", help="folder holding users.csv/classes.csv/attendance.csv")
+    migrate.add_argument("--replace", action="store_true", help="overwrite data already in the database")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        database.set_data_dir(os.path.abspath(args.data_dir))
+    try:
+        n_users, n_classes, n_records = migrate_from_csv(replace=args.replace)
+    except RuntimeError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"Migrated {n_users} users, {n_classes} classes and {n_records} attendance rows into {db_path()}")
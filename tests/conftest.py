@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A fresh data folder (and checkpoint cache) for one test; the module is pointed back afterwards."""
+    old = database.BASE_DIR
+    monkeypatch.setenv("CHECKMEIN_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("CHECKMEIN_BACKEND", raising=False)
+    path = str(tmp_path / "data")
+    database.set_data_dir(path)
+    database.ensure_data_dir()
+    yield path
+    database.configure_write_buffer()
+    database.set_data_dir(old)
+
+
+def run_other_process(data_dir, code):
+    """Run `code` in another Python process (a second kiosk) with `database` pointed at data_dir."""
+    script = f"import database\ndatabase.set_data_dir({data_dir!r})\n" + textwrap.dedent(code)
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
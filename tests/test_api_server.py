@@ -0,0 +1,113 @@
+import asyncio
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+from api_server import ApiServer
+from services import AttendanceService
+
+
+class Client:
+    def __init__(self, server, loop, port):
+        self.server = server
+        self.loop = loop
+        self.port = port
+
+    def request(self, method, path, body=None, token=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        headers = {"Connection": "close"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = conn.getresponse()
+        data = json.loads(response.read())
+        conn.close()
+        return response.status, data
+
+    def login(self, username, password="pw"):
+        status, data = self.request("POST", "/api/login", {"username": username, "password": password})
+        assert status == 200, data
+        return data["token"]
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout=30)
+
+
+@pytest.fixture(params=[None, {}], ids=["direct", "pipeline"])
+def api(request, data_dir):
+    service = AttendanceService(checkpoint=False)
+    service.add_user("lecturer1", "pw", "lecturer")
+    for name in ("student1", "student2", "student3"):
+        service.add_user(name, "pw", "student")
+    service.add_class("SWE1", "lecturer1")
+    server = ApiServer(service=service, refresh_seconds=0, pipeline=request.param)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    _host, port = asyncio.run_coroutine_threadsafe(server.start("127.0.0.1", 0), loop).result(timeout=10)
+    client = Client(server, loop, port)
+    yield client
+    client.run(server.stop())
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def test_mark(api):
+    token = api.login("student1")
+    assert api.request("POST", "/api/mark", {"class_name": "SWE1"}, token) == (200, {"ok": True, "message": "Marked"})
+    status, data = api.request("POST", "/api/mark", {"class_name": "SWE1"}, token)
+    assert status == 200 and data == {"ok": False, "message": "Already marked"}
+    # students can't mark someone else
+    assert api.request("POST", "/api/mark", {"class_name": "SWE1", "student": "student2"}, token)[0] == 403
+
+    staff = api.login("lecturer1")
+    status, data = api.request("POST", "/api/mark", {"class_name": "SWE1", "student": "student2", "status": "Late"}, staff)
+    assert data["ok"]
+    status, data = api.request("GET", "/api/roster?class=SWE1", token=staff)
+    assert data["marks"] == {"student1": "Present", "student2": "Late"}
+    if api.server.pipeline is not None:
+        api.server.pipeline.flush()
+    statuses = {r["student_username"]: r["status"] for r in database.load_attendance_records()}
+    assert statuses == {"student1": "Present", "student2": "Late"}
+
+
+def test_mark_bulk(api):
+    staff = api.login("lecturer1")
+    body = {"class_name": "SWE1", "statuses": {"student1": "Present", "student2": "Excused"}, "date": "2024-03-01"}
+    status, data = api.request("POST", "/api/mark_bulk", body, staff)
+    assert (status, data) == (200, {"ok": True, "message": "Marked 2 student(s)"})
+    status, data = api.request("POST", "/api/mark_bulk", body, staff)
+    assert data["ok"] is False
+    status, data = api.request("GET", "/api/attendance?date=2024-03-01", token=staff)
+    assert data["attendance"] == {"SWE1": {"student1": "Present", "student2": "Excused"}}
+    # students can't bulk mark
+    assert api.request("POST", "/api/mark_bulk", body, api.login("student1"))[0] == 403
+    body["date"] = "garbage"
+    assert api.request("POST", "/api/mark_bulk", body, staff) == (200, {"ok": False, "message": "Invalid date"})
+    body["date"] = 20240301
+    assert api.request("POST", "/api/mark_bulk", body, staff)[0] == 400
+
+
+def test_reads_are_answered_while_a_mutation_is_stuck(api):
+    staff = api.login("lecturer1")
+
+    async def slow_write():
+        # e.g. waiting for another kiosk's lock, or a full reload
+        return await api.server.write(time.sleep, 1.5)
+
+    pending = asyncio.run_coroutine_threadsafe(slow_write(), api.loop)
+    time.sleep(0.1)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(4) as pool:
+        replies = list(pool.map(lambda path: api.request("GET", path, token=staff),
+                                ["/api/stats?class=SWE1", "/api/classes", "/api/roster?class=SWE1", "/api/health"]))
+    assert time.perf_counter() - t0 < 1.0
+    assert all(status == 200 for status, _data in replies)
+    assert not pending.done()
+    pending.result(timeout=5)
@@ -0,0 +1,88 @@
+import os
+from datetime import date, timedelta
+
+import database
+from services import AttendanceService
+
+
+def _fill(days=150, students=3):
+    today = date.today()
+    rows = []
+    for d in range(days, 0, -1):
+        day = (today - timedelta(days=d)).isoformat()
+        rows += [(day, "SWE1", f"student{s}", "Present", "09:00:00") for s in range(students)]
+    database.append_attendance_rows(rows)
+    return rows
+
+
+def _keys(records):
+    return sorted((r["date"], r["class_name"], r["student_username"], r["status"]) for r in records)
+
+
+def test_archive_keeps_every_row_readable(data_dir):
+    rows = _fill()
+    before = _keys(database.load_attendance_records())
+    moved, months = database.archive_attendance(keep_months=2)
+    assert moved and months >= 3
+    assert _keys(database.load_attendance_records()) == before
+    hot = list(database.iter_attendance_records(archived=False))
+    assert len(hot) == len(rows) - moved
+    cutoff = min(r["date"] for r in hot)
+    assert all(p["last"] < cutoff for p in database.load_archive_manifest())
+    assert all(name.endswith(".csv.gz") or name == "manifest.json" for name in os.listdir(database.ARCHIVE_DIR))
+
+    # a range opens only the months that overlap it
+    start = (date.today() - timedelta(days=120)).isoformat()
+    end = (date.today() - timedelta(days=115)).isoformat()
+    assert len(database.archive_partitions(start, end)) <= 2
+    assert _keys(database.iter_attendance_records(start, end)) == [k for k in before if start <= k[0] <= end]
+
+
+def test_service_reads_archived_months_on_demand(data_dir):
+    _fill()
+    database.archive_attendance(keep_months=2)
+    service = AttendanceService(checkpoint=False)
+    hot = len(service.attendance_records)
+    old_day = (date.today() - timedelta(days=140)).isoformat()
+    assert service.get_attendance_map_for_date(old_day) == {"SWE1": {f"student{s}": "Present" for s in range(3)}}
+    assert hot < len(service.attendance_records)
+    assert service.get_class_attendance_stats("SWE1")["Present"] == 150 * 3
+
+
+def test_corrections_and_back_dated_rows_in_archived_months(data_dir):
+    _fill()
+    database.archive_attendance(keep_months=2)
+    old_day = (date.today() - timedelta(days=140)).isoformat()
+    service = AttendanceService(checkpoint=False)
+    assert service.update_attendance(old_day, "SWE1", "student1", "Excused")
+    database.compact_attendance()
+    assert not os.path.exists(database.ATTENDANCE_UPDATES_CSV)
+    statuses = {(r["date"], r["student_username"]): r["status"] for r in database.load_attendance_records()}
+    assert statuses[(old_day, "student1")] == "Excused"
+    # a paper roll for an archived day can't duplicate a row that is already in the archive
+    assert database.append_attendance_rows([(old_day, "SWE1", "student1", "Present", "")]) == []
+    assert len(database.append_attendance_rows([(old_day, "SWE1", "student9", "Present", "")])) == 1
+
+
+def test_interrupted_archive_is_finished_by_next_writer(data_dir):
+    rows = _fill()
+    before = _keys(database.load_attendance_records())
+    real_finish = database._finish_archive
+
+    def crash(plan, remaining=None):
+        raise KeyboardInterrupt  # killed right after the journal was written
+
+    database._finish_archive = crash
+    try:
+        database.archive_attendance(keep_months=2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        database._finish_archive = real_finish
+    assert os.path.exists(database.ARCHIVE_JOURNAL)
+
+    database.append_attendance(date.today().isoformat(), "SWE1", "student0", "Present", "10:00:00")
+    assert not os.path.exists(database.ARCHIVE_JOURNAL)
+    after = _keys(database.load_attendance_records())
+    assert len(after) == len(rows) + 1 and set(before) <= set(after)
+    assert len(list(database.iter_attendance_records(archived=False))) < len(rows)
@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+import database
+from services import AttendanceService
+
+
+@pytest.fixture
+def service(data_dir):
+    service = AttendanceService(checkpoint=False)
+    service.add_user("lecturer1", "pw", "lecturer")
+    for name in ("student1", "student2", "student3"):
+        service.add_user(name, "pw", "student")
+    service.add_class("SWE1", "lecturer1")
+    return service
+
+
+def _on_disk():
+    return sorted((r["date"], r["student_username"], r["status"], r["time_in"]) for r in database.load_attendance_records())
+
+
+def test_bulk_mark_past_date_and_skips_marked(service):
+    ok, msg = service.mark_attendance_bulk("SWE1", {"student1": "Present", "student2": "Excused"}, "2024-03-01")
+    assert (ok, msg) == (True, "Marked 2 student(s)")
+    ok, msg = service.mark_attendance_bulk("SWE1", {"student2": "Late", "student3": "Absent"}, date(2024, 3, 1))
+    assert (ok, msg) == (True, "Marked 1 student(s), 1 already marked")
+    # past dates have no check-in time
+    assert _on_disk() == [("2024-03-01", "student1", "Present", ""), ("2024-03-01", "student2", "Excused", ""),
+                          ("2024-03-01", "student3", "Absent", "")]
+    assert service.get_attendance_map_for_date("2024-03-01")["SWE1"]["student2"] == "Excused"
+
+
+def test_bulk_mark_today_by_default(service):
+    assert service.mark_attendance_bulk("SWE1", {"student1": "Present"})[0]
+    assert service.mark_attendance("SWE1", "student1") == (False, "Already marked")
+    assert _on_disk()[0][3] != ""
+
+
+@pytest.mark.parametrize("bad", ["garbage", "not-a-date", "2024-02-30", "", 20240301, ["2024-03-01"]])
+def test_bulk_mark_rejects_invalid_dates(service, bad):
+    assert service.mark_attendance_bulk("SWE1", {"student1": "Present"}, bad) == (False, "Invalid date")
+    assert _on_disk() == []
+
+
+def test_bulk_mark_only_marks_students(service):
+    ok, msg = service.mark_attendance_bulk("SWE1", {"student1": "Present", "lecturer1": "Present", "ghost": "Late"})
+    assert not ok and "lecturer1" in msg and "ghost" in msg
+    assert _on_disk() == []
@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+import database
+from services import AttendanceService
+from tests.conftest import run_other_process
+
+
+@pytest.fixture
+def full_loads(monkeypatch):
+    """Counts full attendance parses, so a test can tell a checkpoint start from a cold one."""
+    calls = []
+    original = AttendanceService._load_attendance
+
+    def spy(self, *args, **kwargs):
+        calls.append(1)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(AttendanceService, "_load_attendance", spy)
+    return calls
+
+
+def _seed():
+    today = time.strftime("%Y-%m-%d")
+    database.append_attendance_rows([(today, "SWE1", f"student{i}", "Present", "09:00:00") for i in range(20)])
+    assert AttendanceService().save_checkpoint()[0]  # as the GUI does on exit
+    return today
+
+
+def test_checkpoint_lives_outside_the_data_folder(data_dir):
+    _seed()
+    path = AttendanceService._checkpoint_path()
+    assert os.path.exists(path)
+    assert os.path.commonpath([path, data_dir]) != data_dir
+    assert not any(name.endswith(".checkpoint") for name in os.listdir(data_dir))
+
+
+def test_start_from_checkpoint_reads_only_new_rows(data_dir, full_loads):
+    today = _seed()
+    run_other_process(data_dir, f"""
+        database.append_attendance({today!r}, "SWE1", "late_kiosk", "Present", "09:30:00")
+    """)
+    full_loads.clear()
+    service = AttendanceService()
+    assert full_loads == []
+    assert service.find_status(today, "SWE1", "late_kiosk") == "Present"
+    assert len(service.attendance_records) == 21
+
+
+def test_rewritten_file_invalidates_checkpoint(data_dir, full_loads):
+    today = _seed()
+    database.update_attendance_record(today, "SWE1", "student3", "Late")
+    run_other_process(data_dir, "database.compact_attendance()")
+    full_loads.clear()
+    service = AttendanceService()
+    # the compaction replaced attendance.csv, so its saved offset no longer applies
+    assert full_loads == [1]
+    assert service.find_status(today, "SWE1", "student3") == "Late"
+    assert len(service.attendance_records) == 20
+
+
+def test_corrupt_checkpoint_falls_back_to_a_cold_load(data_dir, full_loads):
+    today = _seed()
+    with open(AttendanceService._checkpoint_path(), "wb") as f:
+        f.write(b"not a pickle")
+    full_loads.clear()
+    service = AttendanceService()
+    assert full_loads == [1]
+    assert service.find_status(today, "SWE1", "student0") == "Present"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="file modes")
+def test_checkpoint_others_can_write_is_ignored(data_dir, full_loads):
+    _seed()
+    os.chmod(AttendanceService._checkpoint_path(), 0o664)
+    full_loads.clear()
+    AttendanceService()
+    assert full_loads == [1]
+
+
+def test_lazy_start_loads_the_checkpoint_with_attendance(data_dir, monkeypatch):
+    today = _seed()
+    run_other_process(data_dir, f"""
+        database.append_attendance({today!r}, "SWE1", "late_kiosk", "Present", "09:30:00")
+        database.append_user("new_student", "pw", "student")
+    """)
+    reads, parses = [], []
+    original = AttendanceService._read_checkpoint
+    monkeypatch.setattr(AttendanceService, "_read_checkpoint", lambda self: reads.append(1) or original(self))
+    iter_records = database.iter_attendance_records
+    monkeypatch.setattr(database, "iter_attendance_records", lambda *a, **k: parses.append(1) or iter_records(*a, **k))
+    service = AttendanceService(lazy=True)
+    # nothing unpickled before login: users come from the files
+    assert reads == [] and "new_student" in service.users
+    service.load_attendance_in_background()
+    assert service.find_status(today, "SWE1", "late_kiosk") == "Present"
+    assert reads == [1] and len(service.attendance_records) == 21
+    # the checkpoint's store was caught up, not replaced by a full parse
+    assert parses == []
+    assert not service.refresh()
@@ -0,0 +1,71 @@
+import csv
+import os
+import multiprocessing
+from datetime import datetime, timedelta
+
+import database
+from tests.conftest import run_other_process
+
+
+def _rows():
+    with open(database.ATTENDANCE_CSV, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def test_duplicate_rejected_across_processes(data_dir):
+    today = _today()
+    assert database.append_attendance(today, "SWE1", "student1", "Present", "09:00:00")
+    run_other_process(data_dir, f"""
+        assert database.append_attendance({today!r}, "SWE1", "student2", "Present", "09:00:01")
+        assert not database.append_attendance({today!r}, "SWE1", "student1", "Present", "09:00:02")
+    """)
+    # our cached tail must pick up the other kiosk's row
+    assert not database.append_attendance(today, "SWE1", "student2", "Present", "09:00:03")
+    assert len(_rows()) == 2
+
+
+def test_duplicate_rejected_after_out_of_order_row(data_dir):
+    today = _today()
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    # another kiosk writes today's row, then a late 23:59:59 row for yesterday lands after it
+    run_other_process(data_dir, f"""
+        assert database.append_attendance({today!r}, "SWE1", "student1", "Present", "00:00:01")
+        assert database.append_attendance({yesterday!r}, "SWE1", "student9", "Present", "23:59:59")
+    """)
+    assert not database.append_attendance(today, "SWE1", "student1", "Present", "00:00:05")
+    assert len(_rows()) == 2
+
+
+def _append_many(data_dir, worker, n):
+    database.set_data_dir(data_dir)
+    today = _today()
+    for i in range(n):
+        database.append_attendance(today, "SWE1", f"w{worker}_{i}", "Present", "09:00:00")
+        # every worker also tries the same shared key; only one may win
+        database.append_attendance(today, "SWE1", f"shared{i}", "Present", "09:00:00")
+
+
+def test_concurrent_writers_lose_nothing(data_dir):
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_append_many, args=(data_dir, w, 50)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+        assert p.exitcode == 0
+    keys = [(r["date"], r["class_name"], r["student_username"]) for r in _rows()]
+    assert len(keys) == 4 * 50 + 50
+    assert len(set(keys)) == len(keys)
+
+
+def test_delete_rewrites_atomically(data_dir):
+    database.append_user("student1", "pw", "student")
+    database.append_user("student2", "pw", "student")
+    assert database.delete_user("student1")
+    users, students, _ = database.load_users()
+    assert "student1" not in users and students == ["student2"]
+    assert not any(name.endswith(".tmp") for name in os.listdir(data_dir))
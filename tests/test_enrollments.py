@@ -0,0 +1,111 @@
+import pytest
+
+import database
+from services import AttendanceService
+from tests.conftest import run_other_process
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def service(request, data_dir):
+    if request.param == "sqlite":
+        import sqlite_database
+        sqlite_database.reset_connections()
+        yield AttendanceService(backend="sqlite")
+        sqlite_database.reset_connections()
+    else:
+        yield AttendanceService(checkpoint=False)
+
+
+def _setup(service):
+    for name in ("student1", "student2", "student3"):
+        service.add_user(name, "pw", "student")
+    service.add_user("lecturer1", "pw", "lecturer")
+    service.add_class("SWE1", "lecturer1")
+    service.add_class("SWE2", "")
+
+
+def test_roster_and_lecturer_index(service):
+    _setup(service)
+    # nobody enrolled yet: every student is listed
+    assert service.roster("SWE1") == ["student1", "student2", "student3"]
+    ok, _ = service.enroll_students("SWE1", ["student2", "student1", "student1", "nobody"])
+    assert ok and service.roster("SWE1") == ["student2", "student1"]
+    assert service.is_enrolled("SWE1", "student1") and not service.is_enrolled("SWE1", "student3")
+    # own classes first, then unassigned ones
+    assert service.classes_for_lecturer("lecturer1") == ["SWE1", "SWE2"]
+    service.add_user("lecturer2", "pw", "lecturer")
+    assert service.set_class_lecturer("SWE2", "lecturer2")[0]
+    assert service.classes_for_lecturer("lecturer1") == ["SWE1"]
+    assert service.classes_for_lecturer("lecturer2") == ["SWE2"]
+    service.unenroll_students("SWE1", ["student2"])
+    assert service.roster("SWE1") == ["student1"]
+    # deleting the class drops its enrollments
+    service.delete_class("SWE1")
+    assert service.db.load_enrollments().get("SWE1") is None
+
+
+def test_enrollments_from_another_process(data_dir):
+    service = AttendanceService(checkpoint=False)
+    _setup(service)
+    run_other_process(data_dir, """
+        database.append_enrollments([("SWE2", "student3")])
+    """)
+    assert service.refresh()
+    assert service.roster("SWE2") == ["student3"]
+    assert database.load_enrollments() == {"SWE2": ["student3"]}
+    # a class whose roster another kiosk emptied doesn't go back to listing everyone
+    service.enroll_students("SWE1", ["student1"])
+    run_other_process(data_dir, """
+        database.delete_enrollments([("SWE1", "student1")])
+    """)
+    assert service.refresh()
+    assert service.roster("SWE1") == []
+
+
+def _reopen(service):
+    return AttendanceService(backend="sqlite" if service._pushdown else None, checkpoint=False)
+
+
+def test_marking_needs_enrollment(service):
+    _setup(service)
+    service.enroll_students("SWE1", ["student1"])
+    assert service.mark_attendance("SWE1", "student2") == (False, "Not enrolled in this class")
+    assert service.mark_attendance("SWE1", "student1") == (True, "Marked")
+    # SWE2 has no roster, so anyone can mark it
+    assert service.mark_attendance("SWE2", "student2") == (True, "Marked")
+    assert service.classes_for_student("student2") == ["SWE2"]
+    assert service.classes_for_student("student1") == ["SWE1", "SWE2"]
+    ok, msg = service.mark_attendance_bulk("SWE1", {"student1": "Late", "student3": "Absent"}, "2024-03-01")
+    assert not ok and msg == "Not enrolled in SWE1: student3"
+
+
+def test_roster_emptied_stays_empty(service):
+    _setup(service)
+    service.enroll_students("SWE1", ["student1", "student2"])
+    assert service.unenroll_students("SWE1", ["student1", "student2"])[0]
+    assert service.roster("SWE1") == [] and not service.is_enrolled("SWE1", "student1")
+    assert service.roster("SWE2") == ["student1", "student2", "student3"]
+    assert _reopen(service).roster("SWE1") == []
+    # the same when the last student is deleted rather than taken off
+    service.enroll_students("SWE2", ["student3"])
+    service.delete_user("student3")
+    assert service.roster("SWE2") == [] and _reopen(service).roster("SWE2") == []
+
+
+def test_roster_emptied_in_a_file_without_markers(data_dir):
+    service = AttendanceService(checkpoint=False)
+    _setup(service)
+    # as written before classes recorded that they have a roster
+    database.append_enrollments([("SWE1", "student1")])
+    assert service.refresh() and service.roster("SWE1") == ["student1"]
+    assert service.unenroll_students("SWE1", ["student1"])[0]
+    assert service.roster("SWE1") == []
+    assert database.load_enrollments() == {"SWE1": []}
+
+
+def test_changing_lecturer_keeps_class_order(service):
+    _setup(service)
+    service.add_class("SWE3", "")
+    assert service.set_class_lecturer("SWE1", "")[0]
+    assert service.classes == ["SWE1", "SWE2", "SWE3"]
+    assert _reopen(service).classes == ["SWE1", "SWE2", "SWE3"]
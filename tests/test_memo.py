@@ -0,0 +1,86 @@
+import time
+
+from services import AttendanceService
+from tests.conftest import run_other_process
+
+
+def test_memo_hit_and_invalidation_by_own_write(data_dir):
+    service = AttendanceService(checkpoint=False)
+    service.add_class("SWE1", "")
+    assert service.get_class_attendance_stats("SWE1")["Present"] == 0
+    assert service.get_class_attendance_stats("SWE1")["Present"] == 0
+    assert service.memo_stats()["hits"] == 1
+
+    assert service.mark_attendance("SWE1", "student1")[0]
+    assert service.get_class_attendance_stats("SWE1")["Present"] == 1
+
+
+def test_memo_sees_other_process_after_refresh(data_dir):
+    service = AttendanceService(checkpoint=False)
+    assert service.get_student_history("student1") == []
+    today = time.strftime("%Y-%m-%d")
+    run_other_process(data_dir, f"""
+        database.append_attendance({today!r}, "SWE1", "student1", "Present", "09:00:00")
+    """)
+    assert service.refresh()
+    assert [r["class_name"] for r in service.get_student_history("student1")] == ["SWE1"]
+
+
+def test_sqlite_queries_are_not_memoized(data_dir):
+    import sqlite_database
+    sqlite_database.reset_connections()
+    try:
+        service = AttendanceService(backend="sqlite")
+        assert service.get_class_attendance_stats("SWE1")["Present"] == 0
+        today = time.strftime("%Y-%m-%d")
+        run_other_process(data_dir, f"""
+            import sqlite_database
+            sqlite_database.append_attendance({today!r}, "SWE1", "student1", "Present", "09:00:00")
+            sqlite_database.reset_connections()
+        """)
+        # another kiosk's write shows up straight away, without a refresh()
+        assert service.get_class_attendance_stats("SWE1")["Present"] == 1
+        assert service.memo_stats()["entries"] == 0
+    finally:
+        sqlite_database.reset_connections()
+
+
+def test_sqlite_trend_chart_is_not_cached(data_dir):
+    import sqlite_database
+    sqlite_database.reset_connections()
+    try:
+        service = AttendanceService(backend="sqlite")
+        assert service.mark_attendance("SWE1", "student1")[0]
+        ok, first = service.get_trend_chart("SWE1")
+        assert ok
+        today = time.strftime("%Y-%m-%d")
+        run_other_process(data_dir, f"""
+            import sqlite_database
+            sqlite_database.append_attendance({today!r}, "SWE1", "student2", "Absent", "09:00:00")
+            sqlite_database.reset_connections()
+        """)
+        assert service.trend_chart_cached("SWE1") is None
+        ok, second = service.get_trend_chart("SWE1")
+        # 100% present before the other kiosk's write, 50% after
+        assert ok and second != first
+    finally:
+        sqlite_database.reset_connections()
+
+
+def test_read_during_a_mark_is_not_cached_as_current(data_dir, monkeypatch):
+    service = AttendanceService(checkpoint=False)
+    service.add_user("student2", "pw", "student")
+    service.add_class("SWE1", "")
+    store = service.attendance_records
+    append = store.append
+
+    def append_after_a_read(*row):
+        # e.g. a chart worker asking for stats while the kiosk records a check-in
+        service.get_class_attendance_stats("SWE1")
+        append(*row)
+
+    monkeypatch.setattr(store, "append", append_after_a_read)
+    assert service.mark_attendance("SWE1", "student1")[0]
+    assert service.get_class_attendance_stats("SWE1")["Present"] == 1
+    assert service.mark_attendance_bulk("SWE1", {"student2": "Present"})[0]
+    assert service.get_class_attendance_stats("SWE1")["Present"] == 2
@@ -0,0 +1,108 @@
+import time
+
+import database
+from checkin_pipeline import CheckinPipeline
+from services import AttendanceService
+from tests.conftest import run_other_process
+
+
+def test_pipeline_writes_and_rejects_duplicates(data_dir):
+    service = AttendanceService(checkpoint=False)
+    pipeline = CheckinPipeline(service)
+    assert pipeline.submit("SWE1", "student1") == (True, "Marked")
+    assert pipeline.submit("SWE1", "student1") == (False, "Already marked")
+    assert pipeline.close() == []
+    assert [r["student_username"] for r in database.load_attendance_records()] == ["student1"]
+
+
+def test_failing_writes_are_given_up_and_reported(data_dir, monkeypatch):
+    service = AttendanceService(checkpoint=False)
+
+    def disk_full(rows):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(service.db, "append_attendance_rows", disk_full)
+    pipeline = CheckinPipeline(service, retry_seconds=0.01, max_retries=2)
+    assert pipeline.submit("SWE1", "student1")[0]
+    t0 = time.perf_counter()
+    lost = pipeline.close(timeout=5)
+    assert time.perf_counter() - t0 < 5
+    assert [row[:3] for row in lost] == [(time.strftime("%Y-%m-%d"), "SWE1", "student1")]
+    stats = pipeline.stats()
+    assert stats["failed"] == 1 and stats["write_errors"] == 3 and stats["unwritten"] == 1
+
+
+def test_close_timeout_bounds_a_stuck_writer(data_dir, monkeypatch):
+    service = AttendanceService(checkpoint=False)
+    monkeypatch.setattr(service.db, "append_attendance_rows", lambda rows: time.sleep(2) or rows)
+    pipeline = CheckinPipeline(service)
+    pipeline.submit("SWE1", "student1")
+    t0 = time.perf_counter()
+    lost = pipeline.close(timeout=0.2)
+    assert time.perf_counter() - t0 < 1.5
+    assert len(lost) == 1
+
+
+def test_given_up_check_in_can_be_marked_again(data_dir, monkeypatch):
+    service = AttendanceService(checkpoint=False)
+    write = database.append_attendance_rows
+
+    def disk_full(rows):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(database, "append_attendance_rows", disk_full)
+    pipeline = CheckinPipeline(service, retry_seconds=0.01, max_retries=1)
+    assert pipeline.submit("SWE1", "student1") == (True, "Marked")
+    pipeline.flush()
+    assert len(pipeline.unwritten()) == 1
+    # nothing reached disk, so the cache must not claim the student is marked
+    assert service.find_status(time.strftime("%Y-%m-%d"), "SWE1", "student1") is None
+
+    monkeypatch.setattr(database, "append_attendance_rows", write)
+    assert pipeline.submit("SWE1", "student1") == (True, "Marked")
+    pipeline.close()
+    assert [r["student_username"] for r in database.load_attendance_records()] == ["student1"]
+
+
+def test_conflict_takes_the_other_kiosks_status(data_dir, monkeypatch):
+    service = AttendanceService(checkpoint=False)
+    today = time.strftime("%Y-%m-%d")
+    write = database.append_attendance_rows
+
+    def other_kiosk_first(rows):
+        run_other_process(data_dir, f"""
+            database.append_attendance({today!r}, "SWE1", "student1", "Late", "08:59:00")
+        """)
+        return write(rows)
+
+    monkeypatch.setattr(database, "append_attendance_rows", other_kiosk_first)
+    pipeline = CheckinPipeline(service)
+    assert pipeline.submit("SWE1", "student1") == (True, "Marked")
+    assert pipeline.close() == []
+    assert pipeline.stats()["conflicts"] == 1
+    assert service.find_status(today, "SWE1", "student1") == "Late"
+    assert service.mark_attendance("SWE1", "student1") == (False, "Already marked")
+
+
+def test_close_timeout_holds_with_a_full_queue(data_dir, monkeypatch):
+    service = AttendanceService(checkpoint=False)
+    monkeypatch.setattr(service.db, "append_attendance_rows", lambda rows: time.sleep(2) or rows)
+    pipeline = CheckinPipeline(service, max_pending=2, max_batch=1)
+    for student in ("student1", "student2", "student3"):
+        pipeline.submit("SWE1", student)
+        time.sleep(0.05)  # let the writer pick up the first one and stall on it
+    t0 = time.perf_counter()
+    pipeline.close(timeout=0.5)
+    assert time.perf_counter() - t0 < 1.5
+
+
+def test_pipeline_rejects_students_not_enrolled(data_dir):
+    service = AttendanceService(checkpoint=False)
+    service.add_user("student1", "pw", "student")
+    service.add_user("student2", "pw", "student")
+    service.add_class("SWE1", "")
+    service.enroll_students("SWE1", ["student1"])
+    pipeline = CheckinPipeline(service)
+    assert pipeline.submit("SWE1", "student2") == (False, "Not enrolled in this class")
+    assert pipeline.submit("SWE1", "student1") == (True, "Marked")
+    assert pipeline.close() == []
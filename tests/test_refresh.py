@@ -0,0 +1,79 @@
+import os
+from datetime import datetime
+
+import database
+from services import AttendanceService
+from tests.conftest import run_other_process
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def test_refresh_follows_rows_from_another_process(data_dir):
+    service = AttendanceService(checkpoint=False)
+    assert service.mark_attendance("SWE1", "student1")[0]
+    run_other_process(data_dir, f"""
+        database.append_user("student2", "pw", "student")
+        database.append_class("SWE2", "")
+        database.append_attendance({_today()!r}, "SWE1", "student2", "Present", "09:00:00")
+    """)
+    assert service.refresh()
+    assert "student2" in service.users and "SWE2" in service.classes
+    assert service.get_attendance_map_for_date()["SWE1"] == {"student1": "Present", "student2": "Present"}
+    assert not service.refresh()  # nothing new
+
+
+def test_update_log_and_compaction(data_dir):
+    today = _today()
+    service = AttendanceService(checkpoint=False)
+    service.mark_attendance("SWE1", "student1")
+    assert service.update_attendance(today, "SWE1", "student1", "Late")
+    assert os.path.exists(database.ATTENDANCE_UPDATES_CSV)
+    assert [r["status"] for r in database.load_attendance_records()] == ["Late"]
+
+    # another kiosk corrects it again and compacts: attendance.csv is replaced under us
+    run_other_process(data_dir, f"""
+        database.update_attendance_record({today!r}, "SWE1", "student1", "Excused")
+        assert database.compact_attendance() == 1  # one record, corrected twice
+    """)
+    assert not os.path.exists(database.ATTENDANCE_UPDATES_CSV)
+    assert service.refresh()
+    assert service.get_attendance_map_for_date()["SWE1"]["student1"] == "Excused"
+    assert [r["status"] for r in database.load_attendance_records()] == ["Excused"]
+
+
+def test_own_compaction_is_not_reparsed(data_dir, monkeypatch):
+    today = _today()
+    service = AttendanceService(checkpoint=False)
+    for student in ("student1", "student2"):
+        service.mark_attendance("SWE1", student)
+    # a row from another kiosk that this service hasn't read yet when it compacts
+    run_other_process(data_dir, f"""
+        database.append_attendance({today!r}, "SWE1", "student3", "Present", "09:00:00")
+    """)
+    loads = []
+    original = AttendanceService._load_attendance
+    monkeypatch.setattr(AttendanceService, "_load_attendance", lambda self: loads.append(1) or original(self))
+    monkeypatch.setattr(database, "COMPACT_THRESHOLD_BYTES", 0)  # every correction compacts
+
+    assert service.update_attendance(today, "SWE1", "student1", "Late")
+    assert not os.path.exists(database.ATTENDANCE_UPDATES_CSV)
+    assert service.compact() == 0
+    assert not service.refresh()
+    assert loads == []
+    assert service.get_attendance_map_for_date()["SWE1"] == {"student1": "Late", "student2": "Present",
+                                                              "student3": "Present"}
+
+
+def test_compact_command(data_dir, capsys):
+    import checkmein
+
+    today = _today()
+    service = AttendanceService(checkpoint=False)
+    service.mark_attendance("SWE1", "student1")
+    service.update_attendance(today, "SWE1", "student1", "Excused")
+    assert checkmein.main(["--data-dir", data_dir, "compact"]) == 0
+    assert "Folded 1" in capsys.readouterr().out
+    assert not os.path.exists(database.ATTENDANCE_UPDATES_CSV)
+    assert [r["status"] for r in database.load_attendance_records()] == ["Excused"]
@@ -0,0 +1,43 @@
+import types
+
+import main_gui
+
+
+class _Label:
+    def config(self, **kw):
+        self.__dict__.update(kw)
+
+
+def _page(marks, roster):
+    page = main_gui.LecturerPage.__new__(main_gui.LecturerPage)
+    page.controller = types.SimpleNamespace(service=types.SimpleNamespace(users={}))
+    for name in ("prev_btn", "next_btn", "page_label", "totals_label"):
+        setattr(page, name, _Label())
+    page.roster = roster
+    page.roster_members = set(roster)
+    page.roster_class = "SWE1"
+    page.roster_marks = marks
+    page.page = 0
+    return page
+
+
+def test_totals_count_only_present_marks():
+    page = _page({"s1": "Present", "s2": "Absent", "s3": "Late", "outsider": "Present"}, ["s1", "s2", "s3", "s4"])
+    page._update_nav()
+    assert page.totals_label.text == "Total Present: 1    Total Absent: 2    Late/Excused: 1"
+
+
+def test_marked_absent_is_tagged_apart_from_unmarked():
+    page = _page({"s1": "Present", "s2": "Absent"}, ["s1", "s2", "s3"])
+    assert page._row_values("s1")[1] == ("Present",)
+    assert page._row_values("s2")[1] == ("MarkedAbsent",)
+    assert page._row_values("s3") == (("s3", "Absent"), ("Absent",))
+
+
+def test_student_page_lists_only_classes_the_student_can_mark():
+    page = main_gui.StudentPage.__new__(main_gui.StudentPage)
+    page.class_combobox = {}
+    service = types.SimpleNamespace(classes_for_student=lambda user: ["SWE2"] if user == "student2" else [])
+    page.controller = types.SimpleNamespace(service=service, current_user="student2", classes=["SWE1", "SWE2"])
+    page.update_class_list()
+    assert page.class_combobox['values'] == ["SWE2"]
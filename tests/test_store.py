@@ -0,0 +1,53 @@
+from attendance_store import AttendanceStore
+
+
+def test_remove_keeps_indexes_and_rollups_in_step():
+    store = AttendanceStore()
+    store.append("2024-03-01", "SWE1", "student1", "Present", "09:00:00")
+    store.append("2024-03-01", "SWE1", "student2", "Late", "09:05:00")
+    store.append("2024-03-02", "SWE1", "student1", "Present", "09:00:00")
+    store.rows_for_student("student1")  # build the lazy per-student index too
+
+    store.remove(0)
+    assert len(store) == 2
+    assert store.find("2024-03-01", "SWE1", "student1") is None
+    moved = store.find("2024-03-02", "SWE1", "student1")
+    assert store.row(moved)["date"] == "2024-03-02"
+    assert [store.row(i)["student_username"] for i in store.rows_for_date("2024-03-01")] == ["student2"]
+    assert [store.row(i)["date"] for i in store.rows_for_student("student1")] == ["2024-03-02"]
+    cid = store.class_id("SWE1")
+    assert store.class_counts(cid)[store.status_ids_by_name["Present"]] == 1
+
+    store.remove(len(store) - 1)
+    store.remove(0)
+    assert len(store) == 0 and store.rows_for_date("2024-03-01") == ()
+
+
+def test_dates_and_times_that_do_not_parse_read_back_as_written():
+    rows = [
+        {"date": "garbage", "class_name": "SWE1", "student_username": "student1", "status": "Present", "time_in": "9am"},
+        {"date": "01/03/2024", "class_name": "SWE1", "student_username": "student1", "status": "Late", "time_in": "25:00:00"},
+        {"date": "20240301", "class_name": "SWE1", "student_username": "student1", "status": "Present", "time_in": "9:00:00"},
+        {"date": "2024-03-01", "class_name": "SWE1", "student_username": "student1", "status": "Absent", "time_in": ""},
+    ]
+    store = AttendanceStore.from_records(rows)
+    store.append("garbage", "SWE1", "student2", "Present", "noon")
+    assert [store.row(i) for i in range(4)] == rows
+    assert store.row(4)["time_in"] == "noon"
+    # every distinct string is its own key, so nothing collides in find()
+    assert [store.find(r["date"], "SWE1", "student1") for r in rows] == [0, 1, 2, 3]
+    assert store.find("xyz", "SWE1", "student1") is None
+    assert store.rows_for_date("xyz") == ()
+    assert list(store.rows_for_date("garbage")) == [0, 4]
+
+
+def test_service_keeps_garbage_dated_rows_apart(data_dir):
+    import database
+    from services import AttendanceService
+
+    database.append_attendance_rows([("garbage", "SWE1", "student1", "Present", "9am"),
+                                     ("not-a-date", "SWE1", "student2", "Present", "")])
+    service = AttendanceService(checkpoint=False)
+    assert service.get_attendance_map_for_date("xyz") == {}
+    assert service.get_attendance_map_for_date("garbage") == {"SWE1": {"student1": "Present"}}
+    assert [(r["date"], r["time_in"]) for r in service.get_student_history("student1")] == [("garbage", "9am")]
@@ -0,0 +1,64 @@
+import csv
+import os
+from datetime import datetime
+
+import database
+
+
+def _rows():
+    with open(database.ATTENDANCE_CSV, newline="", encoding="utf-8") as f:
+        return [tuple(r) for r in csv.reader(f)][1:]
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def test_journal_replayed_after_crash_mid_batch(data_dir):
+    today = _today()
+    database.append_attendance(today, "SWE1", "student0", "Present", "09:00:00")
+    size = os.path.getsize(database.ATTENDANCE_CSV)
+    batch = [(today, "SWE1", f"student{i}", "Present", "09:00:01") for i in (1, 2)]
+    # the writer journaled the batch, then died half way through the first row
+    with open(database.ATTENDANCE_JOURNAL, "w", newline="", encoding="utf-8") as j:
+        writer = csv.writer(j)
+        writer.writerow([size])
+        writer.writerows(batch)
+        writer.writerow(["END"])
+    with open(database.ATTENDANCE_CSV, "a", encoding="utf-8") as f:
+        f.write(f"{today},SWE1,stud")
+
+    database.ensure_data_dir()  # the next start-up (or writer) repairs the file
+    assert not os.path.exists(database.ATTENDANCE_JOURNAL)
+    assert _rows() == [(today, "SWE1", "student0", "Present", "09:00:00")] + batch
+
+
+def test_incomplete_journal_is_discarded(data_dir):
+    today = _today()
+    database.append_attendance(today, "SWE1", "student0", "Present", "09:00:00")
+    before = _rows()
+    # crashed while writing the journal: attendance.csv was never touched
+    with open(database.ATTENDANCE_JOURNAL, "w", newline="", encoding="utf-8") as j:
+        csv.writer(j).writerows([[os.path.getsize(database.ATTENDANCE_CSV)], [today, "SWE1", "student1"]])
+    database.ensure_data_dir()
+    assert not os.path.exists(database.ATTENDANCE_JOURNAL)
+    assert _rows() == before
+
+
+def test_buffered_rows_written_once_on_flush(data_dir):
+    today = _today()
+    database.configure_write_buffer(max_rows=100)
+    assert database.append_attendance(today, "SWE1", "student1", "Present", "09:00:00")
+    assert not database.append_attendance(today, "SWE1", "student1", "Present", "09:00:01")
+    assert _rows() == []
+    assert database.flush_attendance() == 1
+    assert _rows() == [(today, "SWE1", "student1", "Present", "09:00:00")]
+
+
+def test_fsync_without_batching(data_dir, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(fd), real_fsync(fd)))
+    database.configure_write_buffer(fsync=True)
+    assert database.append_attendance(_today(), "SWE1", "student1", "Present", "09:00:00")
+    assert synced